@@ -0,0 +1,162 @@
+import asyncio
+import time
+from typing import List, Set, Optional
+from config.settings import settings
+from agents.retrieval_agent import RetrievalAgent
+from agents.storage_agent import StorageAgent
+from tools.semantic_tools import SemanticScholarError
+from utils.graph_store import graph_store
+from utils.paper_stats import PaperStats
+from utils.telemetry import telemetry
+from utils.logger import setup_logger
+
+logger = setup_logger("expansion_agent")
+
+
+class ExpansionAgent:
+    """
+    多跳引用扩展引擎 (Step 4/5)。
+    按 BFS 逐跳扩展引用图谱：每一跳批量获取当前 frontier 的引文关系并累加频次，
+    下一跳只从当前频次最高、且尚未扩展过的论文中选取 Top-N 作为新的 frontier，
+    在达到深度、节点数或时间预算时停止。
+    启用本地引用图谱 (GRAPH_STORE_ENABLED) 时，未过期的邻接表直接从本地读取，
+    只有缺失或过期的论文才会请求 /batch，抓取结果写回本地图谱供后续查询复用（bounded 模式除外）。
+    启用流式解析 (EXPANSION_STREAM_PARSE) 时，/batch 响应逐篇解析并立即计数、写入 Redis，不再整体保存在内存中。
+    """
+
+    def __init__(self, retrieval_agent: Optional[RetrievalAgent] = None,
+                 storage_agent: Optional[StorageAgent] = None):
+        self.retrieval_agent = retrieval_agent or RetrievalAgent()
+        self.storage_agent = storage_agent or StorageAgent()
+
+    @staticmethod
+    def _next_frontier(stats: PaperStats, expanded: Set[str], size: int) -> List[str]:
+        """按当前频次选取下一跳 frontier，跳过已扩展的论文"""
+        frontier = []
+        for pid, _ in stats.get_top_k(size + len(expanded)):
+            if pid not in expanded:
+                frontier.append(pid)
+                if len(frontier) >= size:
+                    break
+        return frontier
+
+    def _stream_enabled(self) -> bool:
+        # bounded 模式的响应本身有上限，本地语料库不经过 HTTP，均无需流式解析
+        return (settings.EXPANSION_STREAM_PARSE and settings.EXPANSION_FETCH_MODE != "bounded"
+                and not self.retrieval_agent.local_provider)
+
+    async def _fetch_hop(self, frontier: List[str], stats: PaperStats):
+        """
+        获取一跳 frontier 的引文关系并累加频次。
+        本地图谱中命中的邻接表直接计数；其余论文请求 API，流式解析时逐篇计数，否则整体返回后计数。
+        """
+        # 本地语料库本身即持久化的引用图谱，无需再经过 graph_store；
+        # bounded 模式得到的是截断 / 抽样后的邻接表，写入后会被 full 模式当作完整邻接表复用，
+        # 读取完整邻接表又会与截断后的计数混在一起，因此 bounded 模式不读写本地图谱
+        use_store = (settings.GRAPH_STORE_ENABLED and not self.retrieval_agent.local_provider
+                     and settings.EXPANSION_FETCH_MODE != "bounded")
+        missing = frontier
+        if use_store:
+            try:
+                cached = await graph_store.aget_fresh(frontier)
+            except Exception as e:
+                logger.error(f"Graph store read error: {e}")
+                cached = {}
+            missing = [pid for pid in frontier if pid not in cached]
+            telemetry.cache_result("graph_store", len(cached), len(missing))
+            logger.info(f"Graph store: {len(cached)} neighborhoods reused, {len(missing)} to fetch from API.")
+            if cached:
+                self.storage_agent.count_neighborhoods(cached, stats)
+            if not missing:
+                return
+
+        if self._stream_enabled():
+            sink = self.storage_agent.expansion_sink(stats, graph_store if use_store else None)
+            try:
+                await self.retrieval_agent.stream_batch_details(missing, sink.add)
+            finally:
+                await sink.close()
+            return
+
+        detailed_papers = await self.retrieval_agent.batch_details_search(missing)
+        if use_store and detailed_papers:
+            try:
+                await graph_store.aput_neighborhoods(graph_store.neighborhoods_from_papers(detailed_papers))
+            except Exception as e:
+                logger.error(f"Graph store write error: {e}")
+        self.storage_agent.process_graph_expansion(detailed_papers, stats)
+
+    async def expand(self, seed_ids: List[str], stats: PaperStats,
+                     depth: Optional[int] = None,
+                     frontier_size: Optional[int] = None,
+                     max_nodes: Optional[int] = None,
+                     time_budget: Optional[float] = None,
+                     status_callback=None,
+                     on_hop=None) -> int:
+        """
+        从种子论文出发执行多跳扩展，频次直接累加到 stats 中。
+
+        Args:
+            seed_ids: 种子论文ID（第 1 跳的 frontier）
+            stats: 本次会话的频次统计对象
+            depth: 最大跳数，默认 settings.EXPANSION_DEPTH
+            frontier_size: 第 2 跳起每跳扩展的论文数 (Top-N)，默认 settings.EXPANSION_FRONTIER_SIZE
+            max_nodes: 统计表节点数上限，超过后停止继续扩展
+            time_budget: 时间预算（秒），第 1 跳不受限制，后续跳超时即停止
+            status_callback: 可选的异步回调，用于推送每一跳的进度
+            on_hop: 可选的异步回调 on_hop(hop, depth)，每一跳计数完成后调用（例如提前预取候选论文详情）
+
+        Returns:
+            int: 实际完成的跳数
+        """
+        depth = depth or settings.EXPANSION_DEPTH
+        frontier_size = frontier_size or settings.EXPANSION_FRONTIER_SIZE
+        max_nodes = max_nodes or settings.EXPANSION_MAX_NODES
+        time_budget = time_budget if time_budget is not None else settings.EXPANSION_TIME_BUDGET
+
+        start = time.monotonic()
+        expanded: Set[str] = set()
+        frontier = list(dict.fromkeys(pid for pid in seed_ids if pid))
+        hops_done = 0
+
+        for hop in range(1, depth + 1):
+            frontier = [pid for pid in frontier if pid not in expanded]
+            if not frontier:
+                logger.info(f"Expansion stopped at hop {hop}: frontier is empty.")
+                break
+
+            if status_callback and hop > 1:
+                await status_callback(f"第 {hop} 跳扩展：获取 {len(frontier)} 篇高频论文的引文关系...")
+
+            if hop == 1:
+                await self._fetch_hop(frontier, stats)
+            else:
+                remaining = time_budget - (time.monotonic() - start)
+                if remaining <= 0:
+                    logger.info(f"Expansion stopped before hop {hop}: time budget exhausted.")
+                    break
+                try:
+                    await asyncio.wait_for(self._fetch_hop(frontier, stats), timeout=remaining)
+                except asyncio.TimeoutError:
+                    logger.warning(f"Expansion hop {hop} exceeded time budget ({time_budget}s), stopping.")
+                    break
+                except SemanticScholarError as e:
+                    # 第 1 跳失败时向上抛出；后续跳失败时保留已有统计结果继续后续流程
+                    logger.error(f"Expansion hop {hop} failed, stopping: {e}")
+                    break
+
+            expanded.update(frontier)
+            hops_done = hop
+            logger.info(f"Expansion hop {hop} done: expanded={len(expanded)}, nodes={len(stats)}, "
+                        f"elapsed={time.monotonic() - start:.2f}s")
+
+            if on_hop:
+                await on_hop(hop, depth)
+
+            if len(stats) >= max_nodes:
+                logger.info(f"Expansion stopped after hop {hop}: node budget reached ({len(stats)} >= {max_nodes}).")
+                break
+
+            frontier = self._next_frontier(stats, expanded, frontier_size)
+
+        return hops_done
\ No newline at end of file
@@ -1,17 +1,67 @@
+import json
+import re
+import unicodedata
+from typing import Dict, Optional
 from langchain_community.chat_models import ChatTongyi
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+from langchain_core.output_parsers import JsonOutputParser
 from config.settings import settings
 from utils.logger import setup_logger
+from utils.redis_client import get_async_redis
+from utils.query_utils import query_digest
+from utils.single_flight import coalesced_ainvoke
+from utils.telemetry import LLMTelemetryCallback, telemetry
 from config import prompts
 
 logger = setup_logger("intent_agent")
 
+SEARCH_TYPES = ("keyword", "title", "id")
+
+# --- 本地规则预分类 (无需调用 LLM) ---
+# Semantic Scholar 40 位十六进制 paperId（可带 semanticscholar.org 链接前缀）
+_S2_ID_RE = re.compile(r"(?:https?://(?:www\.)?semanticscholar\.org/paper/(?:[^/\s]+/)?)?([0-9a-f]{40})", re.I)
+_CORPUS_ID_RE = re.compile(r"corpus\s*id\s*[:：]?\s*(\d+)", re.I)
+# DOI（可带 doi: 前缀或 doi.org 链接）
+_DOI_RE = re.compile(r"(?:doi\s*[:：]\s*|https?://(?:dx\.)?doi\.org/)?(10\.\d{4,9}/\S+)", re.I)
+# arXiv 新格式 ID（可带 arXiv: 前缀、abs/pdf 链接与版本号）
+_ARXIV_RE = re.compile(r"(?:arxiv\s*[:：]?\s*|https?://arxiv\.org/(?:abs|pdf)/)?(\d{4}\.\d{4,5})(?:v\d+)?(?:\.pdf)?", re.I)
+# 整句被引号/书名号包裹的输入视为论文标题
+_QUOTED_TITLE_RE = re.compile(r'"([^"]+)"|“([^“”]+)”|《([^《》]+)》|「([^「」]+)」|『([^『』]+)』')
+
+
+def classify_query_locally(query: str) -> Optional[Dict[str, str]]:
+    """
+    用正则识别明显的论文 ID / DOI / arXiv ID / 带引号的标题。
+    只有整个输入都是这些内容时才命中，否则返回 None 交给 LLM 判断。
+    """
+    text = unicodedata.normalize("NFKC", query or "").strip()
+    if not text:
+        return None
+
+    match = _S2_ID_RE.fullmatch(text)
+    if match:
+        return {"search_type": "id", "query": match.group(1).lower()}
+    match = _CORPUS_ID_RE.fullmatch(text)
+    if match:
+        return {"search_type": "id", "query": f"CorpusId:{match.group(1)}"}
+    match = _DOI_RE.fullmatch(text)
+    if match:
+        return {"search_type": "id", "query": f"DOI:{match.group(1).rstrip('.')}"}
+    match = _ARXIV_RE.fullmatch(text)
+    if match:
+        return {"search_type": "id", "query": f"ARXIV:{match.group(1)}"}
+    match = _QUOTED_TITLE_RE.fullmatch(text)
+    if match:
+        title = next(group for group in match.groups() if group).strip()
+        if title:
+            return {"search_type": "title", "query": title}
+    return None
+
 
 class IntentAgent:
-    def __init__(self):
-        # 初始化 Qwen-Max 模型
-        self.llm = ChatTongyi(
+    def __init__(self, llm=None):
+        # 初始化 Qwen-Max 模型（可注入其它聊天模型，例如基准测试使用的 Fake 模型）
+        self.llm = llm or ChatTongyi(
             dashscope_api_key=settings.DASHSCOPE_API_KEY,
             model_name=settings.MODEL_NAME,
             temperature=0.1  # 低温度以保证输出的确定性
@@ -23,19 +73,71 @@ class IntentAgent:
             ("user", "{query}")
         ])
 
-        self.chain = self.prompt | self.llm | StrOutputParser()
+        self.chain = (self.prompt | self.llm | JsonOutputParser()).with_config(
+            callbacks=[LLMTelemetryCallback("intent")])
+
+    @staticmethod
+    def _cache_key(user_query: str) -> str:
+        return f"intent:{prompts.INTENT_PROMPT_VERSION}:{query_digest(user_query)}"
 
-    def optimize_query(self, user_query: str) -> str:
+    @staticmethod
+    def _parse_result(result, user_query: str) -> Dict[str, str]:
+        """校验 LLM 输出，确保返回 {"search_type": ..., "query": ...}"""
+        if not isinstance(result, dict):
+            raise ValueError(f"Unexpected intent output: {result!r}")
+        search_type = str(result.get("search_type", "keyword")).strip().lower()
+        if search_type not in SEARCH_TYPES:
+            search_type = "keyword"
+        # 清理可能存在的引号（视模型输出情况而定，这里做简单的防御性清理）
+        query = str(result.get("query") or user_query).strip().strip('"')
+        return {"search_type": search_type, "query": query or user_query}
+
+    async def _get_cached(self, user_query: str) -> Optional[Dict[str, str]]:
+        if not settings.INTENT_CACHE_ENABLED:
+            return None
+        try:
+            raw = await get_async_redis().get(self._cache_key(user_query))
+        except Exception as e:
+            logger.error(f"Intent cache read error: {e}")
+            return None
+        telemetry.cache_result("intent", hits=int(bool(raw)), misses=int(not raw))
+        return json.loads(raw) if raw else None
+
+    async def _set_cached(self, user_query: str, result: Dict[str, str]):
+        if not settings.INTENT_CACHE_ENABLED:
+            return
+        try:
+            await get_async_redis().set(self._cache_key(user_query), json.dumps(result, ensure_ascii=False),
+                                        ex=settings.INTENT_CACHE_TTL)
+        except Exception as e:
+            logger.error(f"Intent cache write error: {e}")
+
+    async def optimize_query(self, user_query: str) -> Dict[str, str]:
         """
-        执行意图识别
+        执行意图识别，返回 {"search_type": "keyword" | "title" | "id", "query": str}
+        1. 本地规则命中明显的 ID / 标题时直接返回；
+        2. 其次查询 Redis 中缓存的 LLM 结果；
+        3. 最后才调用 LLM，并缓存解析成功的结果。
         """
+        local_result = classify_query_locally(user_query)
+        if local_result:
+            logger.info(f"Intent resolved locally: {local_result}")
+            return local_result
+
+        cached = await self._get_cached(user_query)
+        if cached:
+            logger.info(f"Intent cache hit: {cached}")
+            return cached
+
         try:
             logger.info(f"Optimizing query: {user_query}")
-            optimized_query = self.chain.invoke({"query": user_query})
-            logger.info(f"Optimized query result: {optimized_query}")
-            # 清理可能存在的引号（视模型输出情况而定，这里做简单的防御性清理）
-            return optimized_query.strip().strip('"')
+            # 多个会话同时提交相同查询时只调用一次 LLM
+            raw_result = await coalesced_ainvoke(f"intent:{prompts.INTENT_PROMPT_VERSION}", self.chain, {"query": user_query})
+            result = self._parse_result(raw_result, user_query)
+            logger.info(f"Optimized query result: {result}")
+            await self._set_cached(user_query, result)
+            return result
         except Exception as e:
             logger.error(f"Error in IntentAgent: {e}")
-            # 如果LLM失败，降级为返回原始查询
-            return user_query
\ No newline at end of file
+            # 如果LLM失败，降级为使用原始查询进行关键词检索（不写入缓存）
+            return {"search_type": "keyword", "query": user_query}
\ No newline at end of file
@@ -1,21 +1,32 @@
+import asyncio
+import hashlib
 import json
-from typing import List, Dict
+import math
+import statistics
+from typing import List, Dict, Optional, Tuple
 from langchain_community.chat_models import ChatTongyi
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
 from config.settings import settings
 from utils.logger import setup_logger
-from utils.global_state import global_stats
+from utils.paper_stats import PaperStats
+from utils.redis_client import get_async_redis
+from utils.query_utils import query_digest
+from utils.single_flight import coalesced_ainvoke
+from utils.telemetry import LLMTelemetryCallback, span, telemetry
+from utils import graph_scoring, relevance
+from utils.prompt_packer import PromptPacker, drop_empty, record_packing
 from agents.storage_agent import StorageAgent
 from agents.retrieval_agent import RetrievalAgent
+from tools.semantic_tools import SemanticScholarError
 from config import prompts
 
 logger = setup_logger("ranking_agent")
 
 
 class RankingAgent:
-    def __init__(self):
-        self.llm = ChatTongyi(
+    def __init__(self, llm=None):
+        self.llm = llm or ChatTongyi(
             dashscope_api_key=settings.DASHSCOPE_API_KEY,
             model_name=settings.MODEL_NAME,
             temperature=0.3
@@ -28,100 +39,304 @@ class RankingAgent:
 
         self.prompt = ChatPromptTemplate.from_messages([
             ("system", prompts.RANKING_AGENT_SYSTEM_PROMPT),
-            ("user", "Candidate Papers JSON:\n{papers_json}")
+            ("user", "Search Topic: {topic}\n\nCandidate Papers JSON:\n{papers_json}")
         ])
 
-        self.chain = self.prompt | self.llm | self.parser
+        self.chain = (self.prompt | self.llm | self.parser).with_config(
+            callbacks=[LLMTelemetryCallback("ranking")])
 
-    def _get_paper_details(self, paper_ids: List[str]) -> List[Dict]:
+    async def _get_paper_details(self, paper_ids: List[str]) -> List[Dict]:
         """
-        从 Redis 获取详情，如果缺失则调用 API 补全
+        从 Redis 获取详情（只读取元数据，不含引用列表），如果缺失则调用 API 补全
         """
-        papers = []
-        missing_ids = []
-
         # 1. 尝试从 Redis 读取
-        pipeline = self.storage_agent.r.pipeline()
-        for pid in paper_ids:
-            pipeline.get(pid)
-        results = pipeline.execute()
-
-        for pid, data_str in zip(paper_ids, results):
-            if data_str:
-                papers.append(json.loads(data_str))
-            else:
-                missing_ids.append(pid)
+        cached = await self.storage_agent.get_paper_meta(paper_ids)
+        papers = [cached[pid] for pid in paper_ids if pid in cached]
+        missing_ids = [pid for pid in paper_ids if pid not in cached]
 
         # 2. 补全缺失数据 (Step 6 关键点)
         if missing_ids:
             logger.info(f"Missing details for {len(missing_ids)} papers. Fetching from API...")
-            fetched_papers = self.retrieval_agent.fetch_missing_papers(missing_ids)
+            try:
+                fetched_papers = await self.retrieval_agent.fetch_missing_papers(missing_ids)
+            except SemanticScholarError as e:
+                # 补全失败时只使用已有的论文详情参与评分
+                logger.error(f"Failed to fetch missing paper details: {e}")
+                return papers
             # 存入 Redis 以便下次使用
-            self.storage_agent.store_paper_data(fetched_papers)
-            papers.extend(fetched_papers)
+            await self.storage_agent.store_paper_data(fetched_papers)
+            papers.extend(self.storage_agent.split_paper(p)[0] for p in fetched_papers if p)
 
         return papers
 
-    def rank_papers(self) -> List[Dict]:
-        """
-        主逻辑：获取 Top IDs -> 补全数据 -> LLM 排序
-        """
-        # 1. 获取 Top-10 IDs
-        top_items = global_stats.get_top_k(10)  # List[Tuple[id, count]]
-        if not top_items:
-            logger.warning("No papers found in global stats.")
-            return []
-
-        top_ids = [item[0] for item in top_items]
-        logger.info(f"Ranking Top-10 papers: {top_ids}")
-
-        # 2. 获取完整信息
-        papers_data = self._get_paper_details(top_ids)
-
-        # 3. 构建 LLM 输入 (精简字段以节省 Token)
+    @staticmethod
+    def _build_llm_input(papers: List[Dict]) -> List[Dict]:
+        """构建 LLM 输入 (精简字段以节省 Token)"""
         llm_input = []
-        for p in papers_data:
+        for p in papers:
             # 使用 (p.get(...) or "Default") 确保结果一定是字符串
             abstract_text = (p.get("abstract") or "No abstract available.")
 
-            llm_input.append({
+            llm_input.append(drop_empty({
                 "paperId": p.get("paperId"),
                 "title": p.get("title"),
                 "abstract": abstract_text,
                 "year": p.get("year"),
                 "citationCount": p.get("citationCount", 0)
-            })
+            }))
+        return llm_input
+
+    def _build_papers_json(self, topic: str, papers: List[Dict]) -> str:
+        """
+        构建一个分块的候选论文 JSON。
+        开启 Prompt 打包时按 RANKING_PROMPT_TOKEN_BUDGET 分配摘要预算（分块内按排名），超出的摘要抽取关键句压缩。
+        """
+        llm_input = self._build_llm_input(papers)
+        if not settings.PROMPT_PACKING_ENABLED:
+            return json.dumps(llm_input)
+
+        packer = PromptPacker(settings.RANKING_PROMPT_TOKEN_BUDGET, settings.PROMPT_MIN_ABSTRACT_TOKENS,
+                              settings.PROMPT_RANK_DECAY)
+        blocks, stats = packer.pack(llm_input, topic, lambda item, abstract: json.dumps({**item, "abstract": abstract}),
+                                    overhead=prompts.RANKING_AGENT_SYSTEM_PROMPT)
+        record_packing("ranking", stats)
+        return "[" + ", ".join(blocks) + "]"
+
+    @staticmethod
+    def _split_chunks(papers: List[Dict], chunk_size: int) -> List[List[Dict]]:
+        """
+        按频次排名轮询分配到各个分块（第 i 篇进入第 i % n 块），
+        使每块的候选质量分布相近，便于之后对各块分数做归一化。
+        """
+        chunk_count = max(1, math.ceil(len(papers) / max(1, chunk_size)))
+        return [papers[i::chunk_count] for i in range(chunk_count) if papers[i::chunk_count]]
+
+    @staticmethod
+    def _score_cache_key(topic: str, paper_id: str) -> str:
+        # 缓存的是 LLM 给出的原始分数（未归一化），归一化在每次排序合并后进行
+        return f"rankscore:raw:{prompts.RANKING_PROMPT_VERSION}:{query_digest(topic)[:16]}:{paper_id}"
 
-        # 4. 调用 LLM 进行语义打分
+    async def _get_cached_scores(self, topic: str, paper_ids: List[str]) -> Dict[str, Dict]:
+        """读取 (主题, 论文) 维度缓存的原始评分结果，返回 {paperId: {"score", "reason", "batch"}}"""
+        if not settings.RANKING_CACHE_ENABLED or not paper_ids:
+            return {}
         try:
-            response = self.chain.invoke({"papers_json": json.dumps(llm_input)})
-            ranking_list = response.get("ranking", [])
+            raws = await get_async_redis().mget([self._score_cache_key(topic, pid) for pid in paper_ids])
+        except Exception as e:
+            logger.error(f"Ranking cache read error: {e}")
+            return {}
+        scores = {pid: json.loads(raw) for pid, raw in zip(paper_ids, raws) if raw}
+        telemetry.cache_result("ranking_score", hits=len(scores), misses=len(paper_ids) - len(scores))
+        return scores
+
+    async def _set_cached_scores(self, topic: str, scores: Dict[str, Dict]):
+        if not settings.RANKING_CACHE_ENABLED or not scores:
+            return
+        try:
+            with span("redis_pipeline", op="ranking_scores") as trace:
+                pipeline = get_async_redis().pipeline(transaction=False)
+                for pid, result in scores.items():
+                    value = json.dumps(result, ensure_ascii=False)
+                    pipeline.set(self._score_cache_key(topic, pid), value, ex=settings.RANKING_CACHE_TTL)
+                    trace.record(payload_bytes=len(value))
+                trace.record(commands=len(scores))
+                await pipeline.execute()
+        except Exception as e:
+            logger.error(f"Ranking cache write error: {e}")
+
+    async def _score_chunks(self, topic: str, chunks: List[List[Dict]]) -> List[Optional[Dict[str, Dict]]]:
+        """
+        并发调用 LLM 为每个分块打分（并发数受 RANKING_CONCURRENCY 限制）。
+        其它会话正在对完全相同的分块打分时直接共享其结果。
+        返回与 chunks 对齐的列表：成功为 {paperId: {"score", "reason", "batch"}}（只含本块的论文），失败为 None，
+        batch 标识给出该分数的那次 LLM 调用（分块内容的摘要），用于之后按调用归一化。
+        """
+        inputs = [{"topic": topic, "papers_json": self._build_papers_json(topic, chunk)} for chunk in chunks]
+        semaphore = asyncio.Semaphore(max(1, settings.RANKING_CONCURRENCY))
+
+        async def score(llm_input: Dict) -> Dict:
+            async with semaphore:
+                return await coalesced_ainvoke(f"ranking:{prompts.RANKING_PROMPT_VERSION}", self.chain, llm_input)
+
+        responses = await asyncio.gather(*(score(llm_input) for llm_input in inputs), return_exceptions=True)
 
-            # 5. 根据 LLM 结果重组数据
-            # 创建一个 lookup 字典
-            paper_map = {p["paperId"]: p for p in papers_data if p.get("paperId")}
-            ordered_papers = []
+        results: List[Optional[Dict[str, Dict]]] = []
+        for index, (chunk, llm_input, response) in enumerate(zip(chunks, inputs, responses)):
+            if isinstance(response, Exception) or not isinstance(response, dict):
+                logger.error(f"Error during LLM ranking of chunk {index}: {response}")
+                results.append(None)
+                continue
 
-            for rank_item in ranking_list:
+            batch = hashlib.sha1(llm_input["papers_json"].encode("utf-8")).hexdigest()[:16]
+            chunk_ids = {p.get("paperId") for p in chunk if p.get("paperId")}
+            scores = {}
+            for rank_item in response.get("ranking", []) or []:
+                if not isinstance(rank_item, dict):
+                    continue
                 pid = rank_item.get("paperId")
-                if pid and pid in paper_map:
-                    paper = paper_map[pid]
-                    # 注入评分理由供报告使用
-                    paper["ai_score"] = rank_item.get("score")
-                    paper["ai_reason"] = rank_item.get("reason")
-                    ordered_papers.append(paper)
-
-            # 如果LLM漏掉了某些文章，为保证核心论文完整，需要将遗漏的paper_id补在ordered_papers后面
-            processed_ids = set(p["paperId"] for p in ordered_papers if p.get("paperId"))
-            for p in papers_data:
-                pid = p.get("paperId")
-                if pid and pid not in processed_ids:
-                    ordered_papers.append(p)
-
-            return ordered_papers
+                try:
+                    score = float(rank_item.get("score"))
+                except (TypeError, ValueError):
+                    continue
+                # 只接受本块中的论文，LLM 编造或写错的 ID 不参与归一化，也不写入评分缓存
+                if pid in chunk_ids:
+                    scores[pid] = {"score": score, "reason": rank_item.get("reason"), "batch": batch}
+            dropped = sum(1 for item in response.get("ranking", []) or []
+                          if isinstance(item, dict) and item.get("paperId") not in chunk_ids)
+            if dropped:
+                logger.warning(f"Ignored {dropped} ranking results with paperIds outside chunk {index}")
+            results.append(scores)
+        return results
 
-        except Exception as e:
-            logger.error(f"Error during LLM ranking: {e}")
-            # 应急措施，直接返回按引用数排序的结果
-            papers_data.sort(key=lambda x: x.get("citationCount", 0), reverse=True)
-            return papers_data
\ No newline at end of file
+    @staticmethod
+    def _normalize_scores(scores: Dict[str, Dict]) -> Dict[str, float]:
+        """
+        分数来自多次 LLM 调用（本次分块打分与缓存中以往的调用）时，各次调用的分数尺度可能不一致。
+        按 batch 分组，将每组原始分数做 z-score 标准化后映射回全部分数的均值/标准差（结果限制在 0-100）。
+        返回 {paperId: 归一化后的分数}，不修改传入的原始分数。
+        """
+        normalized = {pid: item["score"] for pid, item in scores.items()}
+        groups: Dict[Optional[str], List[str]] = {}
+        for pid, item in scores.items():
+            groups.setdefault(item.get("batch"), []).append(pid)
+        if len(groups) < 2:
+            return normalized
+
+        global_mean = statistics.fmean(normalized.values())
+        global_std = statistics.pstdev(normalized.values())
+
+        for pids in groups.values():
+            values = [normalized[pid] for pid in pids]
+            if len(values) < 2:
+                continue
+            mean = statistics.fmean(values)
+            std = statistics.pstdev(values)
+            for pid, value in zip(pids, values):
+                z = (value - mean) / std if std > 0 else 0.0
+                normalized[pid] = min(100.0, max(0.0, global_mean + z * global_std))
+        return normalized
+
+    @staticmethod
+    async def _candidate_pool(stats: PaperStats) -> List[Tuple[str, float]]:
+        """
+        当前统计下的候选池 [(paper_id, score), ...]（开启相关性预筛选时为 Top-RELEVANCE_POOL_SIZE，否则为 Top-RANKING_CANDIDATES）。
+        CANDIDATE_MODE=graph 时按引用子图的图评分排序（在线程中计算，不阻塞事件循环），否则按引用频次排序。
+        """
+        candidate_count = settings.RANKING_CANDIDATES
+        pool_size = max(settings.RELEVANCE_POOL_SIZE, candidate_count) if settings.RELEVANCE_FILTER_ENABLED else candidate_count
+
+        if stats.graph is not None and len(stats.graph):
+            try:
+                with span("graph_scoring") as s:
+                    nodes, seeds, src, dst = stats.graph.snapshot()
+                    s.record(nodes=len(nodes), edges=len(src))
+                    pool = await asyncio.to_thread(
+                        graph_scoring.score_snapshot, nodes, seeds, src, dst,
+                        graph_scoring.parse_weights(settings.GRAPH_SCORE_WEIGHTS),
+                        alpha=settings.GRAPH_PAGERANK_ALPHA, top_k=pool_size)
+                if pool:
+                    return pool
+            except ImportError as e:
+                logger.warning(f"Graph scoring unavailable ({e}), falling back to frequency ranking.")
+            except Exception as e:
+                logger.error(f"Graph scoring failed, falling back to frequency ranking: {e}")
+        return stats.get_top_k(pool_size)
+
+    async def prefetch_candidates(self, stats: PaperStats):
+        """
+        按当前频次预取候选池的论文详情（写入 Redis），与后续的扩展/计数并行执行，
+        正式排序时 _get_paper_details 即可直接命中缓存。
+        """
+        pool_ids = [pid for pid, _ in await self._candidate_pool(stats)]
+        if pool_ids:
+            await self._get_paper_details(pool_ids)
+            logger.info(f"Prefetched details for {len(pool_ids)} candidate papers.")
+
+    async def select_candidates(self, stats: PaperStats, relevance_query: str) -> List[Dict]:
+        """
+        选取进入 LLM 评分的候选论文 (RANKING_CANDIDATES 篇)。
+        开启本地相关性预筛选时，先取频次（或图评分）Top-RELEVANCE_POOL_SIZE 的论文，
+        用 BM25（标题 + 摘要）与查询计算相关性，再与频次（或图评分）加权组合后截取，
+        避免高被引但偏题的枢纽论文占用 LLM 评分名额。
+        """
+        candidate_count = settings.RANKING_CANDIDATES
+        pool = await self._candidate_pool(stats)
+        if not pool:
+            return []
+
+        # 获取完整信息（按候选池排名排序）
+        top_ids = [pid for pid, _ in pool]
+        pool_scores = dict(pool)
+        rank_of = {pid: i for i, pid in enumerate(top_ids)}
+        papers_data = await self._get_paper_details(top_ids)
+        papers_data.sort(key=lambda p: rank_of.get(p.get("paperId"), len(rank_of)))
+
+        if not settings.RELEVANCE_FILTER_ENABLED or len(papers_data) <= candidate_count:
+            return papers_data[:candidate_count]
+
+        frequencies = [pool_scores.get(p.get("paperId"), 0) for p in papers_data]
+        order = relevance.rerank(relevance_query, papers_data, frequencies, settings.RELEVANCE_WEIGHT)
+        selected = [papers_data[i] for i in order[:candidate_count]]
+        logger.info(f"Relevance pre-filter kept {len(selected)}/{len(papers_data)} candidates for query: {relevance_query}")
+        return selected
+
+    async def rank_papers(self, stats: PaperStats, topic: str, relevance_query: Optional[str] = None,
+                          candidates: Optional[List[Dict]] = None) -> List[Dict]:
+        """
+        主逻辑：选取候选 (频次 + 本地相关性预筛选) -> 读取评分缓存 -> 分块并发 LLM 打分 -> 合并排序
+        stats: 本次会话的频次统计对象
+        topic: 用户的调研主题，参与评分并作为评分缓存 Key 的一部分
+        relevance_query: 本地相关性预筛选使用的查询（通常为优化后的英文检索式），默认使用 topic
+        candidates: 已通过 select_candidates 选出的候选论文（传入时跳过候选选取）
+        已在相同主题下评过分的论文直接复用缓存结果，只有未缓存的论文才会发送给 LLM；
+        候选数不超过 RANKING_CHUNK_SIZE 时只发起一次 LLM 调用；
+        某一块打分失败时，只有该块的论文降级为按引用数排在已打分论文之后。
+        """
+        # 1-2. 选取候选论文并获取完整信息
+        papers_data = candidates if candidates is not None else await self.select_candidates(stats, relevance_query or topic)
+        if not papers_data:
+            logger.warning("No papers found in session stats.")
+            return []
+        logger.info(f"Ranking Top-{len(papers_data)} papers: {[p.get('paperId') for p in papers_data]}")
+
+        # 3. 读取评分缓存，仅对未缓存的论文分块并发调用 LLM 进行语义打分
+        merged = await self._get_cached_scores(topic, [p["paperId"] for p in papers_data if p.get("paperId")])
+        uncached_papers = [p for p in papers_data if p.get("paperId") not in merged]
+        logger.info(f"Ranking cache hit for {len(merged)}/{len(papers_data)} papers")
+
+        if uncached_papers:
+            chunks = self._split_chunks(uncached_papers, settings.RANKING_CHUNK_SIZE)
+            logger.info(f"Scoring {len(uncached_papers)} papers in {len(chunks)} chunks")
+            chunk_scores = await self._score_chunks(topic, chunks)
+
+            fresh_scores: Dict[str, Dict] = {}
+            for scores in chunk_scores:
+                if scores:
+                    fresh_scores.update(scores)
+            await self._set_cached_scores(topic, fresh_scores)
+            merged.update(fresh_scores)
+
+        # 合并缓存与本次打分后，再对所有分数按 LLM 调用统一归一化
+        candidate_ids = {p.get("paperId") for p in papers_data}
+        normalized = self._normalize_scores({pid: item for pid, item in merged.items() if pid in candidate_ids})
+
+        # 4. 根据 LLM 结果重组数据
+        scored_papers = []
+        unscored_papers = []
+        for paper in papers_data:
+            result = merged.get(paper.get("paperId"))
+            if result:
+                # 注入评分理由供报告使用
+                paper["ai_score"] = round(normalized[paper["paperId"]])
+                paper["ai_reason"] = result["reason"]
+                scored_papers.append(paper)
+            else:
+                unscored_papers.append(paper)
+
+        scored_papers.sort(key=lambda p: p["ai_score"], reverse=True)
+        # 如果LLM漏掉了某些文章或该块打分失败，为保证核心论文完整，按引用数补在已打分论文后面
+        unscored_papers.sort(key=lambda p: p.get("citationCount") or 0, reverse=True)
+        if unscored_papers:
+            logger.warning(f"{len(unscored_papers)} papers were not scored by LLM, appended by citation count.")
+
+        return (scored_papers + unscored_papers)[:settings.RANKING_TOP_N]
\ No newline at end of file
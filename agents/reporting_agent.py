@@ -1,17 +1,36 @@
-from typing import List, Dict, Any
+import hashlib
+import json
+import time
+from typing import List, Dict, Any, AsyncIterator, Optional
 from langchain_community.chat_models import ChatTongyi
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from config.settings import settings
 from config import prompts
+from utils.concurrency import llm_limiter
+from utils.query_utils import query_digest
+from utils.redis_client import get_async_redis
 from utils.logger import setup_logger
+from utils.prompt_packer import PromptPacker, record_packing
+from utils.single_flight import coalesced_ainvoke
+from utils.telemetry import LLMTelemetryCallback, telemetry
 
 logger = setup_logger("reporting_agent")
 
 
+class ReportGenerationError(Exception):
+    """报告生成失败（没有可用论文或 LLM 调用出错），异常信息为展示给用户的提示"""
+
+
 class ReportingAgent:
-    def __init__(self):
-        self.llm = ChatTongyi(
+    """
+    调研报告生成 Agent。
+    成功生成的报告按 (Prompt 版本, 规范化查询, 候选论文集合) 缓存在 Redis 中，
+    并为每个查询记录最近一次报告对应的候选集合，用于重复查询的快速返回与候选集合未变时的复用。
+    """
+
+    def __init__(self, llm=None):
+        self.llm = llm or ChatTongyi(
             dashscope_api_key=settings.DASHSCOPE_API_KEY,
             model_name=settings.MODEL_NAME,  # Qwen-Max for high quality writing
             temperature=0.5
@@ -22,7 +41,61 @@ class ReportingAgent:
             ("user", "Papers Data:\n{papers_text}\n\nSearch Topic: {topic}")
         ])
 
-        self.chain = self.prompt | self.llm | StrOutputParser()
+        self.chain = (self.prompt | self.llm | StrOutputParser()).with_config(
+            callbacks=[LLMTelemetryCallback("reporting")])
+
+    @staticmethod
+    def candidates_digest(candidate_ids: List[str]) -> str:
+        """候选论文集合的摘要（与顺序无关）"""
+        return hashlib.sha1(",".join(sorted(set(candidate_ids))).encode("utf-8")).hexdigest()[:16]
+
+    @staticmethod
+    def _report_cache_key(topic: str, candidates_digest: str) -> str:
+        return f"report:{prompts.REPORTING_PROMPT_VERSION}:{query_digest(topic)}:{candidates_digest}"
+
+    @staticmethod
+    def _latest_cache_key(topic: str) -> str:
+        return f"report:latest:{prompts.REPORTING_PROMPT_VERSION}:{query_digest(topic)}"
+
+    async def get_cached_report(self, topic: str, candidate_ids: Optional[List[str]] = None,
+                                max_age: Optional[float] = None) -> Optional[str]:
+        """
+        读取缓存的报告。
+        传入 candidate_ids 时按 (查询, 候选集合) 精确查找；
+        否则返回该查询最近一次生成的报告（仅当生成时间在 max_age 秒以内）。
+        """
+        if not settings.REPORT_CACHE_ENABLED:
+            return None
+        try:
+            redis = get_async_redis()
+            if candidate_ids is None:
+                raw = await redis.get(self._latest_cache_key(topic))
+                latest = json.loads(raw) if raw else None
+                if not latest or (max_age is not None and time.time() - latest["created_at"] > max_age):
+                    telemetry.cache_result("report_latest", hits=0, misses=1)
+                    return None
+                digest, cache = latest["candidates"], "report_latest"
+            else:
+                digest, cache = self.candidates_digest(candidate_ids), "report"
+            raw = await redis.get(self._report_cache_key(topic, digest))
+        except Exception as e:
+            logger.error(f"Report cache read error: {e}")
+            return None
+        telemetry.cache_result(cache, hits=int(bool(raw)), misses=int(not raw))
+        return raw.decode("utf-8") if raw else None
+
+    async def _set_cached_report(self, topic: str, candidate_ids: Optional[List[str]], report: str):
+        if not settings.REPORT_CACHE_ENABLED or candidate_ids is None:
+            return
+        digest = self.candidates_digest(candidate_ids)
+        latest = json.dumps({"candidates": digest, "created_at": time.time()})
+        try:
+            pipeline = get_async_redis().pipeline(transaction=False)
+            pipeline.set(self._report_cache_key(topic, digest), report.encode("utf-8"), ex=settings.REPORT_CACHE_TTL)
+            pipeline.set(self._latest_cache_key(topic), latest, ex=settings.REPORT_CACHE_TTL)
+            await pipeline.execute()
+        except Exception as e:
+            logger.error(f"Report cache write error: {e}")
 
     def _format_authors(self, authors: List[Any]) -> str:
         """辅助函数：格式化作者列表"""
@@ -47,72 +120,128 @@ class ReportingAgent:
             return ", ".join(author_names[:3]) + " et al"
         return ", ".join(author_names)
 
-    async def generate_report(self, topic: str, papers: List[Dict]) -> str:
+    @staticmethod
+    def _render_paper(p: Dict, abstract_text: str) -> str:
+        """单篇论文的上下文（不含 "Paper i:" 序号行），空字段不输出"""
+        # 提取第一作者用于 [Response_Start] 标记
+        authors = p.get('authors', [])
+        first_author = "Unknown"
+        if authors:
+            first_obj = authors[0]
+            if isinstance(first_obj, dict):
+                first_author = first_obj.get('name', 'Unknown')
+            else:
+                first_author = str(first_obj)
+
+        lines = [
+            f"PaperID: {p.get('paperId')}",
+            f"URL: {p.get('url')}",
+            f"FirstAuthor: {first_author}",
+            f"Title: {p.get('title')}",
+            f"Year: {p.get('year')}",
+        ]
+        if p.get('citationCount') is not None:
+            lines.append(f"Citations: {p.get('citationCount')}")
+        if p.get('ai_reason'):
+            lines.append(f"Reason for selection: {p.get('ai_reason')}")
+        if abstract_text:
+            lines.append(f"Abstract: {abstract_text}")
+        return "\n".join(lines) + "\n---"
+
+    def _build_papers_text(self, papers: List[Dict], topic: str = "") -> str:
+        """
+        构建 LLM 输入上下文。
+        开启 Prompt 打包时按 REPORT_PROMPT_TOKEN_BUDGET 分配摘要预算（排名越靠前保留越完整），
+        否则沿用固定的 800 字符截断。
+        """
+        headers = [f"Paper {i}:" for i in range(1, len(papers) + 1)]
+        if settings.PROMPT_PACKING_ENABLED:
+            packer = PromptPacker(settings.REPORT_PROMPT_TOKEN_BUDGET, settings.PROMPT_MIN_ABSTRACT_TOKENS,
+                                  settings.PROMPT_RANK_DECAY)
+            blocks, stats = packer.pack(papers, topic, self._render_paper,
+                                        overhead=prompts.REPORTING_AGENT_SYSTEM_PROMPT + "\n".join(headers))
+            record_packing("reporting", stats)
+        else:
+            blocks = [self._render_paper(p, (p.get('abstract') or "")[:800]) for p in papers]
+
+        return "\n".join(f"{header}\n{block}" for header, block in zip(headers, blocks))
+
+    def _build_references(self, papers: List[Dict]) -> str:
+        """拼接参考文献列表"""
+        references_section = ["\n\n## 5. 参考文献 (References)"]
+
+        for p in papers:
+            title = p.get('title', 'Unknown Title')
+            url = p.get('url', '#')
+            year = p.get('year', 'N.A.')
+            venue = p.get('venue', 'Unknown Venue')
+            authors_str = self._format_authors(p.get('authors', []))
+
+            # Markdown 格式: - [Title](URL). Authors. Year. Venue.
+            # 点击标题可跳转
+            ref_line = f"- [**{title}**]({url}). {authors_str}. {year}. {venue}."
+            references_section.append(ref_line)
+
+        return "\n".join(references_section)
+
+    async def generate_report(self, topic: str, papers: List[Dict], candidate_ids: Optional[List[str]] = None) -> str:
         """
         生成 Markdown 报告
+        candidate_ids: 本次排序的候选论文集合，传入时成功生成的报告会写入报告缓存
+        失败时抛出 ReportGenerationError，不会把错误提示当作报告返回
         """
         if not papers:
-            return "## 未找到相关论文，无法生成报告。"
+            raise ReportGenerationError("未找到相关论文，无法生成报告。")
 
         logger.info("Generating final report...")
 
         # 1. 构建 LLM 输入上下文
-        papers_text_list = []
-        for i, p in enumerate(papers, 1):
-            abstract_text = (p.get('abstract') or "")
-
-            # 提取第一作者用于 [Response_Start] 标记
-            authors = p.get('authors', [])
-            first_author = "Unknown"
-            if authors:
-                first_obj = authors[0]
-                if isinstance(first_obj, dict):
-                    first_author = first_obj.get('name', 'Unknown')
-                else:
-                    first_author = str(first_obj)
-
-            papers_text_list.append(
-                f"Paper {i}:\n"
-                f"PaperID: {p.get('paperId')}\n"
-                f"URL: {p.get('url')}\n"
-                f"FirstAuthor: {first_author}\n"
-                f"Title: {p.get('title')}\n"
-                f"Year: {p.get('year')}\n"
-                f"Citations: {p.get('citationCount')}\n"
-                f"Reason for selection: {p.get('ai_reason', 'High relevance')}\n"
-                f"Abstract: {abstract_text[:800]}\n"
-                "---"
-            )
-
-        papers_text = "\n".join(papers_text_list)
+        papers_text = self._build_papers_text(papers, topic)
 
         try:
-            # 2. 调用 LLM 生成报告主体 (Section 1-4)
-            report_body = await self.chain.ainvoke({
+            # 2. 调用 LLM 生成报告主体 (Section 1-4)，相同主题与论文的并发请求共享一次生成
+            report_body = await coalesced_ainvoke("report", self.chain, {
                 "papers_text": papers_text,
                 "topic": topic
             })
 
-            # 3. 拼接参考文献列表
-            references_section = ["\n\n## 5. 参考文献 (References)"]
+            # 3. 参考文献拼接
+            final_report = report_body + self._build_references(papers)
+            await self._set_cached_report(topic, candidate_ids, final_report)
 
-            for p in papers:
-                title = p.get('title', 'Unknown Title')
-                url = p.get('url', '#')
-                year = p.get('year', 'N.A.')
-                venue = p.get('venue', 'Unknown Venue')
-                authors_str = self._format_authors(p.get('authors', []))
+            return final_report
 
-                # Markdown 格式: - [Title](URL). Authors. Year. Venue.
-                # 点击标题可跳转
-                ref_line = f"- [**{title}**]({url}). {authors_str}. {year}. {venue}."
-                references_section.append(ref_line)
+        except Exception as e:
+            logger.error(f"Error generating report: {e}")
+            raise ReportGenerationError(f"生成报告时发生错误: {str(e)}") from e
 
-            # 参考文献拼接
-            final_report = report_body + "\n".join(references_section)
+    async def stream_report(self, topic: str, papers: List[Dict],
+                            candidate_ids: Optional[List[str]] = None) -> AsyncIterator[str]:
+        """
+        流式生成 Markdown 报告：报告主体通过 chain.astream 逐块产出，结束后再产出参考文献章节。
+        各块按顺序拼接后与 generate_report 的返回结果格式一致，完整生成后写入报告缓存。
+        失败时抛出 ReportGenerationError（此前已产出的部分内容由调用方丢弃）。
+        """
+        if not papers:
+            raise ReportGenerationError("未找到相关论文，无法生成报告。")
 
-            return final_report
+        logger.info("Streaming final report...")
+        papers_text = self._build_papers_text(papers, topic)
 
+        chunks = []
+        try:
+            async with llm_limiter:
+                async for chunk in self.chain.astream({
+                    "papers_text": papers_text,
+                    "topic": topic
+                }):
+                    if chunk:
+                        chunks.append(chunk)
+                        yield chunk
         except Exception as e:
-            logger.error(f"Error generating report: {e}")
-            return f"生成报告时发生错误: {str(e)}"
\ No newline at end of file
+            logger.error(f"Error streaming report: {e}")
+            raise ReportGenerationError(f"生成报告时发生错误: {str(e)}") from e
+
+        references = self._build_references(papers)
+        yield references
+        await self._set_cached_report(topic, candidate_ids, "".join(chunks) + references)
\ No newline at end of file
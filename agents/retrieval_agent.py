@@ -1,5 +1,8 @@
-from typing import List, Dict
-from tools.semantic_tools import tool_search_by_keyword, tool_search_batch_details, tool_search_by_title
+from typing import List, Dict, Optional, Callable, Awaitable
+from config.settings import settings
+from tools.local_corpus_tools import LocalCorpusProvider
+from tools.semantic_tools import (SemanticScholarAPI, tool_search_by_keyword, tool_search_batch_details,
+                                  tool_search_by_title, tool_fetch_citation_edges)
 from utils.logger import setup_logger
 
 logger = setup_logger("retrieval_agent")
@@ -8,28 +11,64 @@ logger = setup_logger("retrieval_agent")
 class RetrievalAgent:
     """
     论文检索 Agent，负责调用原子工具。
-    修正说明：LangChain Tool 必须使用 .invoke(input_dict) 进行调用
+    修正说明：LangChain Tool 必须使用 .ainvoke(input_dict) 进行调用（工具均为异步实现，共享连接池）
+    RETRIEVAL_PROVIDER=local 时改为从本地导入的语料库 (LocalCorpusProvider) 检索。
     """
 
+    def __init__(self, local_provider: Optional[LocalCorpusProvider] = None):
+        if local_provider is None and settings.RETRIEVAL_PROVIDER == "local":
+            local_provider = LocalCorpusProvider()
+        self.local_provider = local_provider
+
     # 按标题搜索种子
-    def search_seed_by_title(self, title: str) -> List[Dict]:
+    async def search_seed_by_title(self, title: str) -> List[Dict]:
         logger.info(f"RetrievalAgent: Searching seed by title '{title}'")
         # tool_search_by_title返回的是单篇Dict，为兼容后续流程，把它包装成List
-        paper = tool_search_by_title.invoke({"title": title})
+        if self.local_provider:
+            paper = await self.local_provider.match_title(title)
+        else:
+            paper = await tool_search_by_title.ainvoke({"title": title})
         return [paper] if paper else []
 
-    def initial_search(self, query: str, limit: int = 10) -> List[Dict]:
+    # 按论文 ID (S2 paperId / DOI:xxx / ARXIV:xxx / CorpusId:xxx) 获取种子
+    async def search_seed_by_id(self, paper_id: str) -> List[Dict]:
+        logger.info(f"RetrievalAgent: Fetching seed by id '{paper_id}'")
+        if self.local_provider:
+            return await self.local_provider.get_batch_details([paper_id])
+        return await tool_search_batch_details.ainvoke({"paper_ids": [paper_id]})
+
+    async def initial_search(self, query: str, limit: int = 10) -> List[Dict]:
         """执行 Step 2: Seed Search"""
         logger.info(f"RetrievalAgent: Performing initial search for '{query}'")
-        return tool_search_by_keyword.invoke({"query": query, "limit": limit})
+        if self.local_provider:
+            return await self.local_provider.search_papers(query, limit=limit)
+        return await tool_search_by_keyword.ainvoke({"query": query, "limit": limit})
 
-    def batch_details_search(self, paper_ids: List[str]) -> List[Dict]:
-        """执行 Step 4: Batch Graph Expansion"""
+    async def batch_details_search(self, paper_ids: List[str]) -> List[Dict]:
+        """
+        执行 Step 4: Batch Graph Expansion
+        EXPANSION_FETCH_MODE=bounded 时只获取有上限的引用关系（论文ID），不含论文元数据
+        """
         logger.info(f"RetrievalAgent: Fetching batch details for {len(paper_ids)} papers")
-        return tool_search_batch_details.invoke({"paper_ids": paper_ids})
+        if self.local_provider:
+            return await self.local_provider.get_batch_details(paper_ids)
+        if settings.EXPANSION_FETCH_MODE == "bounded":
+            return await tool_fetch_citation_edges.ainvoke({"paper_ids": paper_ids})
+        return await tool_search_batch_details.ainvoke({"paper_ids": paper_ids})
+
+    async def stream_batch_details(self, paper_ids: List[str], on_paper: Callable[[Dict], Awaitable[None]]) -> int:
+        """
+        执行 Step 4 的流式版本：逐篇解析 /batch 响应并交给 on_paper 处理，返回处理的论文数。
+        需要传入回调，无法通过 LangChain Tool 调用，直接使用 SemanticScholarAPI。
+        """
+        logger.info(f"RetrievalAgent: Streaming batch details for {len(paper_ids)} papers")
+        return await SemanticScholarAPI.stream_batch_details(paper_ids, on_paper)
 
-    def fetch_missing_papers(self, paper_ids: List[str]) -> List[Dict]:
+    async def fetch_missing_papers(self, paper_ids: List[str]) -> List[Dict]:
         """
         辅助功能：用于在 Step 6 阅读阶段，如果发现 Redis 缺数据，进行补全下载
+        阅读阶段只需要元数据，因此不请求引用列表
         """
-        return tool_search_batch_details.invoke({"paper_ids": paper_ids})
\ No newline at end of file
+        if self.local_provider:
+            return await self.local_provider.get_batch_details(paper_ids, include_edges=False)
+        return await tool_search_batch_details.ainvoke({"paper_ids": paper_ids, "include_edges": False})
\ No newline at end of file
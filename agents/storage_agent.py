@@ -1,63 +1,146 @@
-import redis
-import json
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 from config.settings import settings
 from utils.logger import setup_logger
-from utils.global_state import global_stats
+from utils.graph_store import CitationGraphStore
+from utils.paper_stats import PaperStats
+from utils.redis_client import get_async_redis
+from utils import paper_codec
+from utils.telemetry import span, telemetry
 
 logger = setup_logger("storage_agent")
 
+# 引用关系字段，与元数据分开存储
+EDGE_FIELDS = ("references", "citations")
+
 
 class StorageAgent:
-    def __init__(self):
-        # 初始化 Redis 连接
-        self.r = redis.Redis(
-            host=settings.REDIS_HOST,
-            port=settings.REDIS_PORT,
-            password=settings.REDIS_PASSWORD,
-            db=settings.REDIS_DB,
-            decode_responses=True
-        )
-
-    def store_paper_data(self, papers: List[Dict]):
+    """
+    论文存储与统计 Agent。
+    Redis 中每篇论文拆分为三个 Key，均为紧凑二进制编码 (paper_codec) 并设置 TTL：
+    - paper:{id}:meta  论文元数据（标题、摘要、年份等，不含引用列表）
+    - paper:{id}:refs  参考文献 ID 列表
+    - paper:{id}:cites 被引文献 ID 列表
+    排序与报告阶段只读取 meta，不再反序列化体积庞大的引用列表。
+    """
+
+    @staticmethod
+    def meta_key(paper_id: str) -> str:
+        return f"paper:{paper_id}:meta"
+
+    @staticmethod
+    def edges_key(paper_id: str, field: str) -> str:
+        return f"paper:{paper_id}:{'refs' if field == 'references' else 'cites'}"
+
+    @staticmethod
+    def split_paper(paper: Dict) -> Tuple[Dict, Dict[str, List[str]]]:
+        """
+        将 API 返回的论文拆分为元数据与引用 ID 列表。
+        若论文不含引用字段（例如检索接口返回的种子论文），对应的列表不会出现在返回值中。
+        """
+        meta = {k: v for k, v in paper.items() if k not in EDGE_FIELDS}
+        edges = {}
+        for field in EDGE_FIELDS:
+            if field in paper:
+                edges[field] = [item.get("paperId") for item in (paper.get(field) or []) if item and item.get("paperId")]
+        return meta, edges
+
+    async def store_paper_data(self, papers: List[Dict]):
         """
-        将论文数据存入 Redis。
+        将论文数据存入 Redis（元数据与引用列表分开存储，均带 TTL）。
         """
         if not papers:
             return
 
-        pipeline = self.r.pipeline()
-        for paper in papers:
-            if not paper: continue
-            paper_id = paper.get("paperId")
-            if paper_id:
-                # 序列化为 JSON 字符串
-                pipeline.set(paper_id, json.dumps(paper))
-
+        with span("redis_pipeline", op="store_papers") as trace:
+            pipeline = get_async_redis().pipeline(transaction=False)
+            stored = 0
+            for paper in papers:
+                if not paper: continue
+                paper_id = paper.get("paperId")
+                if paper_id:
+                    meta, edges = self.split_paper(paper)
+                    payload_bytes, commands = self.queue_paper(pipeline, paper_id, meta, edges)
+                    trace.record(payload_bytes=payload_bytes, commands=commands)
+                    stored += 1
+
+            try:
+                await pipeline.execute()
+                logger.info(f"Stored {stored} papers into Redis.")
+            except Exception as e:
+                trace.set_label(result="error")
+                logger.error(f"Redis pipeline error: {e}")
+
+    def queue_paper(self, pipeline, paper_id: str, meta: Dict, edges: Dict[str, List[str]]) -> Tuple[int, int]:
+        """将一篇论文的元数据与引用 ID 列表编码后加入 Redis Pipeline，返回 (写入字节数, 命令数)"""
+        encoded = paper_codec.encode(meta)
+        pipeline.set(self.meta_key(paper_id), encoded, ex=settings.PAPER_META_TTL)
+        payload_bytes, commands = len(encoded), 1
+        for field, ids in edges.items():
+            encoded = paper_codec.encode(ids)
+            pipeline.set(self.edges_key(paper_id, field), encoded, ex=settings.PAPER_EDGES_TTL)
+            payload_bytes, commands = payload_bytes + len(encoded), commands + 1
+        return payload_bytes, commands
+
+    def expansion_sink(self, stats: PaperStats, store: Optional[CitationGraphStore] = None) -> "ExpansionSink":
+        """创建流式扩展的逐篇处理器，见 ExpansionSink"""
+        return ExpansionSink(self, stats, store)
+
+    async def get_paper_meta(self, paper_ids: List[str]) -> Dict[str, Dict]:
+        """
+        批量读取论文元数据，返回命中的 {paper_id: meta}。
+        """
+        if not paper_ids:
+            return {}
         try:
-            pipeline.execute()
-            logger.info(f"Stored {len(papers)} papers into Redis.")
+            raws = await get_async_redis().mget([self.meta_key(pid) for pid in paper_ids])
         except Exception as e:
-            logger.error(f"Redis pipeline error: {e}")
+            logger.error(f"Redis read error: {e}")
+            return {}
+
+        papers = {}
+        for pid, raw in zip(paper_ids, raws):
+            if raw:
+                try:
+                    papers[pid] = paper_codec.decode(raw)
+                except Exception as e:
+                    logger.error(f"Failed to decode paper {pid}: {e}")
+        telemetry.cache_result("paper_meta", hits=len(papers), misses=len(paper_ids) - len(papers))
+        return papers
+
+    async def get_paper_edges(self, paper_id: str) -> Dict[str, List[str]]:
+        """读取单篇论文的引用 ID 列表，缺失的字段不会出现在返回值中"""
+        try:
+            raws = await get_async_redis().mget([self.edges_key(paper_id, f) for f in EDGE_FIELDS])
+        except Exception as e:
+            logger.error(f"Redis read error: {e}")
+            return {}
+        return {field: paper_codec.decode(raw) for field, raw in zip(EDGE_FIELDS, raws) if raw}
 
-    def process_seed_papers(self, papers: List[Dict]):
+    def count_seed_papers(self, papers: List[Dict], stats: PaperStats):
         """
-        处理 Step 3: Initial Storage & Counting
+        种子论文频次初始化（纯内存操作，可在存储完成前先行执行，供后续扩展阶段立即使用）
         """
-        self.store_paper_data(papers)
-
         if not papers: return
 
         for paper in papers:
             if not paper: continue
             pid = paper.get("paperId")
             if pid:
-                global_stats.set_initial_count(pid)
-        logger.info(f"Processed seed papers stats. Global map size: {len(global_stats.stats)}")
+                stats.set_initial_count(pid)
+        logger.info(f"Processed seed papers stats. Session map size: {len(stats)}")
+
+    async def process_seed_papers(self, papers: List[Dict], stats: PaperStats):
+        """
+        处理 Step 3: Initial Storage & Counting
+        stats: 本次会话的频次统计对象
+        """
+        self.count_seed_papers(papers, stats)
+        await self.store_paper_data(papers)
 
-    def process_graph_expansion(self, detailed_papers: List[Dict]):
+    def process_graph_expansion(self, detailed_papers: List[Dict], stats: PaperStats):
         """
         处理 Step 5: Recursive Counting & Update
+        stats: 本次会话的频次统计对象
         """
         # 1. 顶层防御：防止传入 None
         if not detailed_papers:
@@ -69,25 +152,94 @@ class StorageAgent:
         for paper in detailed_papers:
             if not paper: continue
 
-            # 使用 'or []' 强制将 None 转换为空列表
+            # 使用 'or []' 强制将 None 转换为空列表（references / citations 均可能为 null）
             refs = paper.get("references") or []
+            cites = paper.get("citations") or []
 
-            for ref in refs:
-                # 防御列表内部可能存在的空对象
-                if not ref: continue
-                ref_id = ref.get("paperId")
-                if ref_id:
-                    global_stats.increment_count(ref_id)
-                    count_updates += 1
+            # 防御列表内部可能存在的空对象，收集该论文的全部关联 ID 后一次性累加
+            ref_ids = [item["paperId"] for item in refs if item and item.get("paperId")]
+            cite_ids = [item["paperId"] for item in cites if item and item.get("paperId")]
 
-            # 同理，处理 citations 为 null 的情况
-            cites = paper.get("citations") or []
+            if ref_ids or cite_ids:
+                stats.add_edges(paper.get("paperId"), ref_ids, cite_ids)
+                count_updates += len(ref_ids) + len(cite_ids)
 
-            for cite in cites:
-                if not cite: continue
-                cite_id = cite.get("paperId")
-                if cite_id:
-                    global_stats.increment_count(cite_id)
-                    count_updates += 1
+        logger.info(f"Graph expansion complete. Updated counts for {count_updates} related nodes.")
 
-        logger.info(f"Graph expansion complete. Updated counts for {count_updates} related nodes.")
\ No newline at end of file
+    def count_neighborhoods(self, neighborhoods: Dict[str, Dict[str, List[str]]], stats: PaperStats):
+        """
+        与 process_graph_expansion 相同的频次累加，输入为本地引用图谱中的邻接表
+        ({"references": [id...], "citations": [id...]})，无需经过完整的论文对象
+        """
+        count_updates = 0
+        for paper_id, edges in neighborhoods.items():
+            ref_ids = [pid for pid in edges.get("references") or [] if pid]
+            cite_ids = [pid for pid in edges.get("citations") or [] if pid]
+            if ref_ids or cite_ids:
+                stats.add_edges(paper_id, ref_ids, cite_ids)
+                count_updates += len(ref_ids) + len(cite_ids)
+
+        logger.info(f"Graph store expansion complete. Updated counts for {count_updates} related nodes.")
+
+
+class ExpansionSink:
+    """
+    流式扩展 (EXPANSION_STREAM_PARSE) 的逐篇处理器，与 process_graph_expansion 的频次累加一致：
+    每解析出一篇论文，引用 ID 直接累加到频次统计，元数据与引用列表加入 Redis Pipeline，
+    每 STREAM_PIPELINE_BATCH 篇执行一次 Pipeline（同时写入本地引用图谱），之后不再持有该论文。
+    """
+
+    def __init__(self, storage: StorageAgent, stats: PaperStats, store: Optional[CitationGraphStore] = None):
+        self.storage = storage
+        self.stats = stats
+        self.store = store
+        self.papers = 0
+        self.count_updates = 0
+        self._pipeline = None
+        self._pending: Dict[str, Dict[str, List[str]]] = {}
+        self._payload_bytes = 0
+        self._commands = 0
+
+    async def add(self, paper: Dict):
+        paper_id = paper.get("paperId") if paper else None
+        if not paper_id:
+            return
+        meta, edges = self.storage.split_paper(paper)
+        ref_ids = edges.get("references") or []
+        cite_ids = edges.get("citations") or []
+        if ref_ids or cite_ids:
+            self.stats.add_edges(paper_id, ref_ids, cite_ids)
+            self.count_updates += len(ref_ids) + len(cite_ids)
+
+        if self._pipeline is None:
+            self._pipeline = get_async_redis().pipeline(transaction=False)
+        payload_bytes, commands = self.storage.queue_paper(self._pipeline, paper_id, meta, edges)
+        self._payload_bytes += payload_bytes
+        self._commands += commands
+        self._pending[paper_id] = {field: edges.get(field) or [] for field in EDGE_FIELDS}
+        self.papers += 1
+        if len(self._pending) >= max(1, settings.STREAM_PIPELINE_BATCH):
+            await self.flush()
+
+    async def flush(self):
+        """执行已排队的 Redis 写入与本地图谱写入（写入失败只记录日志）"""
+        pipeline, pending = self._pipeline, self._pending
+        payload_bytes, commands = self._payload_bytes, self._commands
+        self._pipeline, self._pending, self._payload_bytes, self._commands = None, {}, 0, 0
+        if pipeline is not None:
+            try:
+                with span("redis_pipeline", op="store_expansion") as trace:
+                    trace.record(payload_bytes=payload_bytes, commands=commands)
+                    await pipeline.execute()
+            except Exception as e:
+                logger.error(f"Redis pipeline error: {e}")
+        if self.store is not None and pending:
+            try:
+                await self.store.aput_neighborhoods(pending)
+            except Exception as e:
+                logger.error(f"Graph store write error: {e}")
+
+    async def close(self):
+        await self.flush()
+        logger.info(f"Streamed graph expansion complete. {self.papers} papers, "
+                    f"updated counts for {self.count_updates} related nodes.")
\ No newline at end of file
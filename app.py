@@ -1,42 +1,33 @@
 import chainlit as cl
-import re
-from main import SearchWorkflow
+from main import SearchWorkflow, WorkflowError
 from config.settings import settings
+from utils.citation_parser import CitationStreamRewriter, process_citations
+from utils.telemetry import start_metrics_server, telemetry
 
 # 初始化工作流实例
 workflow_engine = SearchWorkflow()
-
-
-def process_citations(text: str) -> str:
-    """
-    后处理函数：将 LLM 生成的引用标记替换为 Chainlit 可渲染的 Markdown 超链接。
-
-    原始格式: [Response_Start]PaperID|Year|URL|FirstAuthor[Response_End]
-    目标格式: [(FirstAuthor et al. Year)](URL)
-    """
-    # 正则表达式匹配 [Response_Start]...[Response_End]
-    # 捕获组: 1=ID, 2=Year, 3=URL, 4=Author
-    pattern = r"\[Response_Start\](.*?)\|(.*?)\|(.*?)\|(.*?)\[Response_End\]"
-
-    def replace_func(match):
-        try:
-            # 提取字段
-            # paper_id = match.group(1)
-            year = match.group(2).strip()
-            url = match.group(3).strip()
-            author = match.group(4).strip()
-
-            # 构造学术引用格式 (Author et al. Year)
-            citation_text = f"({author} et al. {year})"
-
-            # 构造 Markdown 链接: [显示文本](链接地址)
-            return f"[{citation_text}]({url})"
-        except Exception:
-            # 如果解析失败，返回原文本或空串，防止崩溃
-            return ""
-
-    # 执行替换
-    return re.sub(pattern, replace_func, text)
+REFRESH_PREFIX = "/refresh"
+
+# 暴露 Prometheus 指标：默认在独立端口（METRICS_HTTP_HOST:METRICS_HTTP_PORT）上提供，
+# METRICS_HTTP_PORT=0 时挂在 Chainlit 的 FastAPI 服务上（与应用同一公开端口）
+if settings.METRICS_ENABLED and settings.METRICS_HTTP_ENABLED and settings.METRICS_ENDPOINT:
+    if settings.METRICS_HTTP_PORT:
+        start_metrics_server(settings.METRICS_HTTP_HOST, settings.METRICS_HTTP_PORT, settings.METRICS_ENDPOINT)
+    else:
+        from chainlit.server import app as chainlit_server
+        from fastapi.responses import PlainTextResponse
+
+        async def metrics_endpoint():
+            return PlainTextResponse(telemetry.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+        chainlit_server.add_api_route(settings.METRICS_ENDPOINT, metrics_endpoint, methods=["GET"])
+        # Chainlit 注册了兜底的前端页面路由，需要把指标路由移到最前面才能匹配
+        routes = chainlit_server.router.routes
+        metrics_route = next(route for route in routes
+                             if getattr(route, "path", None) == settings.METRICS_ENDPOINT
+                             and getattr(route, "endpoint", None) is metrics_endpoint)
+        routes.remove(metrics_route)
+        routes.insert(0, metrics_route)
 
 
 @cl.on_chat_start
@@ -50,6 +41,13 @@ async def start():
 async def main(message: cl.Message):
     """主消息循环"""
     user_query = message.content
+    # 以 /refresh 开头的消息忽略报告缓存，强制重新检索与生成
+    refresh = user_query.startswith(REFRESH_PREFIX)
+    if refresh:
+        user_query = user_query[len(REFRESH_PREFIX):].strip()
+    if not user_query.strip():
+        await cl.Message(content=f"请输入研究方向，例如：'AI Agent最新研究'；如需忽略缓存重新生成，请输入：{REFRESH_PREFIX} AI Agent最新研究").send()
+        return
 
     # 创建一个空的 Step 用于显示进度
     msg = cl.Message(content="")
@@ -60,17 +58,33 @@ async def main(message: cl.Message):
         async with cl.Step(name="Agent Thinking", type="run") as step:
             step.output = log_text
 
+    # 流式输出：引用标记在完整到达后再替换为超链接，避免前端出现半截标记
+    citation_rewriter = CitationStreamRewriter()
+
+    async def token_callback(token):
+        """回调函数，将报告正文逐块推送到消息中"""
+        text = citation_rewriter.feed(token)
+        if text:
+            await msg.stream_token(text)
+
     try:
         # 运行工作流
-        raw_report = await workflow_engine.run(user_query, status_callback)
+        raw_report = await workflow_engine.run(user_query, status_callback, token_callback, refresh=refresh)
+        tail = citation_rewriter.flush()
+        if tail:
+            await msg.stream_token(tail)
 
-        # 对报告进行正则替换，渲染超链接
+        # 对完整报告进行正则替换，渲染超链接（与流式内容一致，并覆盖未走流式输出的提前返回结果）
         final_report = process_citations(raw_report)
 
         # 发送最终报告
         msg.content = final_report
         await msg.update()
 
+    except WorkflowError as e:
+        # 未找到论文、检索服务不可用或报告生成失败：用提示替换已推送的部分内容
+        msg.content = str(e)
+        await msg.update()
     except Exception as e:
         await cl.Message(content=f"系统运行出错: {str(e)}").send()
 
@@ -0,0 +1,179 @@
+"""
+无界面批量运行：从文件读取多个调研主题，在同一事件循环中并发执行 SearchWorkflow，
+所有查询共享同一个工作流实例、HTTP 连接池、Redis 连接池与缓存，
+将每个主题的报告写入输出目录，并生成包含各阶段耗时的汇总 (summary.json)。
+
+输入文件：每行一个主题（空行与 # 开头的行忽略），或每行一个 JSON 对象 {"id": ..., "query": ...}。
+
+用法：python batch_runner.py queries.txt --output data/reports --concurrency 8 --llm-concurrency 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import time
+from typing import Dict, List, Optional
+from config.settings import settings
+from utils.logger import setup_logger
+
+logger = setup_logger("batch_runner")
+
+
+def load_queries(path: str) -> List[Dict]:
+    """读取查询文件，返回 [{"id": ..., "query": ...}, ...]"""
+    queries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            item = json.loads(line) if line.startswith("{") else {"query": line}
+            if item.get("query"):
+                item.setdefault("id", f"{len(queries) + 1:03d}")
+                queries.append(item)
+    return queries
+
+
+def _slug(text: str, max_length: int = 60) -> str:
+    slug = re.sub(r"[^\w一-鿿]+", "_", text).strip("_")
+    return slug[:max_length] or "query"
+
+
+class BatchRunner:
+    """
+    批量执行多个查询。
+    concurrency 限制同时运行的工作流数量；LLM / S2 / Redis 的并发上限分别由
+    LLM_MAX_CONCURRENCY、S2_MAX_CONCURRENCY (及 S2_RATE_LIMIT)、REDIS_MAX_CONNECTIONS 控制，所有工作流共享。
+    """
+
+    def __init__(self, workflow=None, concurrency: int = 4, output_dir: Optional[str] = None, refresh: bool = False):
+        if workflow is None:
+            from main import SearchWorkflow
+            workflow = SearchWorkflow()
+        self.workflow = workflow
+        self.concurrency = max(1, concurrency)
+        self.output_dir = output_dir
+        self.refresh = refresh
+
+    async def _run_one(self, item: Dict, semaphore: asyncio.Semaphore) -> Dict:
+        from main import WorkflowError
+        from utils.citation_parser import process_citations
+
+        stage_timings: Dict = {}
+
+        async def on_timings(timings):
+            stage_timings.update(timings)
+
+        result = {"id": item["id"], "query": item["query"], "status": "ok"}
+        async with semaphore:
+            logger.info(f"[{item['id']}] Running: {item['query']}")
+            start = time.perf_counter()
+            try:
+                report = await self.workflow.run(item["query"], timing_callback=on_timings, refresh=self.refresh)
+            except Exception as e:
+                logger.error(f"[{item['id']}] Failed: {e}")
+                result.update(status="error", error=f"{type(e).__name__}: {e}")
+                if isinstance(e, WorkflowError):
+                    result["reason"] = e.reason
+                report = None
+            result["seconds"] = round(time.perf_counter() - start, 3)
+
+        result["stages"] = {name: round(end - begin, 3) for name, (begin, end) in stage_timings.items()}
+        if report is not None:
+            result["report_chars"] = len(report)
+            if self.output_dir:
+                path = os.path.join(self.output_dir, f"{item['id']}_{_slug(item['query'])}.md")
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(f"# {item['query']}\n\n{process_citations(report)}\n")
+                result["report_path"] = path
+        logger.info(f"[{item['id']}] Finished in {result['seconds']}s ({result['status']})")
+        return result
+
+    async def run(self, queries: List[Dict]) -> Dict:
+        """并发执行全部查询，返回汇总 {"results": [...], "wall_seconds", "throughput_per_min", ...}"""
+        if self.output_dir:
+            os.makedirs(self.output_dir, exist_ok=True)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(self._run_one(item, semaphore) for item in queries))
+        wall = time.perf_counter() - start
+
+        succeeded = [r for r in results if r["status"] == "ok"]
+        stage_names = sorted({name for r in succeeded for name in r["stages"]})
+        summary = {
+            "queries": len(results),
+            "succeeded": len(succeeded),
+            "failed": len(results) - len(succeeded),
+            "concurrency": self.concurrency,
+            "wall_seconds": round(wall, 3),
+            "throughput_per_min": round(len(succeeded) / wall * 60, 2) if wall > 0 else 0.0,
+            "mean_seconds": round(sum(r["seconds"] for r in succeeded) / len(succeeded), 3) if succeeded else 0.0,
+            "stage_mean_seconds": {
+                name: round(sum(r["stages"].get(name, 0) for r in succeeded) / len(succeeded), 3)
+                for name in stage_names
+            },
+            "results": list(results),
+        }
+        if self.output_dir:
+            with open(os.path.join(self.output_dir, "summary.json"), "w", encoding="utf-8") as f:
+                json.dump(summary, f, ensure_ascii=False, indent=2)
+        return summary
+
+
+def _print_summary(summary: Dict):
+    print("=" * 78)
+    print(f"{'id':<8} {'status':<7} {'seconds':>8}  query")
+    for r in summary["results"]:
+        print(f"{r['id']:<8} {r['status']:<7} {r['seconds']:>8.2f}  {r['query'][:50]}")
+    print("-" * 78)
+    print(f"{summary['succeeded']}/{summary['queries']} succeeded in {summary['wall_seconds']:.1f}s "
+          f"(concurrency={summary['concurrency']}, {summary['throughput_per_min']:.1f} reports/min)")
+    for name, value in summary["stage_mean_seconds"].items():
+        print(f"  {name:<20} mean={value:7.3f}s")
+    print("=" * 78)
+
+
+async def main(args) -> Dict:
+    # 并发上限在首次使用时读取，需在创建连接池 / 信号量之前设置
+    if args.llm_concurrency is not None:
+        settings.LLM_MAX_CONCURRENCY = args.llm_concurrency
+    if args.api_concurrency is not None:
+        settings.S2_MAX_CONCURRENCY = args.api_concurrency
+    if args.redis_connections is not None:
+        settings.REDIS_MAX_CONNECTIONS = args.redis_connections
+
+    from utils.http_client import close_async_client
+    from utils.redis_client import close_async_redis
+    from utils.response_archive import response_archive
+    from utils.telemetry import telemetry
+
+    queries = load_queries(args.queries)
+    logger.info(f"Loaded {len(queries)} queries from {args.queries}")
+    try:
+        summary = await BatchRunner(concurrency=args.concurrency, output_dir=args.output, refresh=args.refresh).run(queries)
+    finally:
+        await close_async_client()
+        await close_async_redis()
+        response_archive.close()
+        telemetry.write_file()
+
+    _print_summary(summary)
+    return summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run SearchWorkflow for a batch of queries without the UI")
+    parser.add_argument("queries", help="查询文件（每行一个主题，或每行一个 JSON 对象）")
+    parser.add_argument("--output", default=os.path.join(settings.DATA_DIR, "reports"), help="报告与汇总的输出目录")
+    parser.add_argument("--concurrency", type=int, default=4, help="同时运行的工作流数量")
+    parser.add_argument("--llm-concurrency", type=int, default=None, help="同时进行的 LLM 调用数（覆盖 LLM_MAX_CONCURRENCY）")
+    parser.add_argument("--api-concurrency", type=int, default=None, help="同时进行的 S2 请求数（覆盖 S2_MAX_CONCURRENCY）")
+    parser.add_argument("--redis-connections", type=int, default=None, help="Redis 连接池大小（覆盖 REDIS_MAX_CONNECTIONS）")
+    parser.add_argument("--refresh", action="store_true", help="忽略报告缓存，强制重新检索与生成")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
\ No newline at end of file
@@ -0,0 +1,88 @@
+import asyncio
+import hashlib
+import json
+import re
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# 报告 Prompt 中每篇论文的字段（与 ReportingAgent._build_papers_text 的格式对应）
+_PAPER_BLOCK_RE = re.compile(
+    r"PaperID: (?P<id>.*)\nURL: (?P<url>.*)\nFirstAuthor: (?P<author>.*)\nTitle: (?P<title>.*)\nYear: (?P<year>.*)\n")
+
+
+def _stable_int(*parts: Any) -> int:
+    return int(hashlib.md5("|".join(map(str, parts)).encode("utf-8")).hexdigest()[:8], 16)
+
+
+class FakeChatTongyi(BaseChatModel):
+    """
+    离线基准测试用的确定性聊天模型，可替代 ChatTongyi 注入 SearchWorkflow。
+    根据最后一条用户消息判断调用方并返回格式正确的输出：
+    - 意图识别：原样返回关键词检索 JSON；
+    - 论文评分 (Candidate Papers JSON)：按 (主题, paperId) 哈希给出固定分数；
+    - 报告生成 (Papers Data)：为每篇论文生成一段带引用标记的正文。
+    latency 模拟首个 token 前的等待时间，token_interval 模拟流式输出中每块之间的间隔。
+    """
+
+    latency: float = 0.0
+    token_interval: float = 0.0
+    chunk_size: int = 16
+    report_repeat: int = 3
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-tongyi"
+
+    def _respond(self, messages: List[BaseMessage]) -> str:
+        user_text = str(messages[-1].content) if messages else ""
+
+        if "Candidate Papers JSON:" in user_text:
+            topic = user_text.split("\n", 1)[0].replace("Search Topic:", "").strip()
+            papers = json.loads(user_text.split("Candidate Papers JSON:", 1)[1])
+            ranking = [{"paperId": p.get("paperId"),
+                        "score": 40 + _stable_int(topic, p.get("paperId")) % 61,
+                        "reason": f"Synthetic relevance for '{(p.get('title') or '')[:40]}'"}
+                       for p in papers]
+            return json.dumps({"ranking": ranking}, ensure_ascii=False)
+
+        if "Papers Data:" in user_text:
+            topic = user_text.rsplit("Search Topic:", 1)[-1].strip()
+            sections = [f"## 1. 研究概述\n关于「{topic}」的合成调研报告。"]
+            for index, match in enumerate(_PAPER_BLOCK_RE.finditer(user_text), 1):
+                marker = (f"[Response_Start]{match['id']}|{match['year']}|{match['url']}|"
+                          f"{match['author']}[Response_End]")
+                body = " ".join(f"{match['title']} 的第 {n} 个要点。" for n in range(1, self.report_repeat + 1))
+                sections.append(f"### 2.{index} {match['title']}\n{body}{marker}")
+            sections.append("## 4. 总结\n以上内容由离线基准测试模型生成。")
+            return "\n\n".join(sections)
+
+        return json.dumps({"search_type": "keyword", "query": user_text.strip()}, ensure_ascii=False)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._respond(messages)))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self._respond(messages)))])
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        text = self._respond(messages)
+        for start in range(0, len(text), max(1, self.chunk_size)):
+            if self.token_interval:
+                await asyncio.sleep(self.token_interval)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=text[start:start + self.chunk_size]))
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"latency": self.latency, "token_interval": self.token_interval}
\ No newline at end of file
@@ -0,0 +1,322 @@
+"""
+离线 Semantic Scholar (ai4scholar) 模拟服务，仅依赖标准库。
+实现 /search、/search/match、/batch 与 /{paper_id}/citations|references 接口：
+- 默认使用确定性的合成语料（论文ID即编号的 40 位十六进制，引用关系按幂律分布偏向少数枢纽论文）；
+- 可加载 ResponseArchive 归档的真实响应作为录制数据，未录制的请求回退到合成语料；
+- 可配置固定延迟、每篇论文的额外延迟、引用/被引列表长度以及 503 错误注入比例；
+- 支持嵌套字段投影（如 citations.paperId,citations.year）。
+
+单独运行：python -m benchmarks.mock_s2_server --port 8765
+"""
+import argparse
+import glob
+import gzip
+import io
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+BASE_PATH = "/graph/v1/paper"
+
+_WORDS = [
+    "agent", "memory", "reasoning", "retrieval", "graph", "neural", "network", "language", "model", "planning",
+    "transformer", "attention", "learning", "reinforcement", "multimodal", "benchmark", "alignment", "tool",
+    "knowledge", "citation", "embedding", "vision", "diffusion", "optimization", "evaluation", "robust",
+]
+
+
+def _normalize(query: str) -> str:
+    return " ".join((query or "").lower().split())
+
+
+class SyntheticCorpus:
+    """确定性的合成论文语料，同一参数下每次生成的内容完全相同"""
+
+    def __init__(self, size: int = 100000, citations: int = 200, references: int = 40, seed: int = 42):
+        self.size = size
+        self.citations = citations
+        self.references = references
+        self.seed = seed
+
+    @staticmethod
+    def paper_id(index: int) -> str:
+        return f"{index:040x}"
+
+    def index_of(self, paper_id: str) -> Optional[int]:
+        try:
+            index = int(paper_id, 16)
+        except (TypeError, ValueError):
+            return None
+        return index if 0 <= index < self.size else None
+
+    def _rng(self, *parts) -> random.Random:
+        return random.Random(":".join(map(str, (self.seed,) + parts)))
+
+    def _neighbors(self, index: int, kind: str, count: int) -> List[int]:
+        # 幂律采样：编号越小的论文被选中的概率越高，形成被大量引用的枢纽论文
+        rng = self._rng(index, kind)
+        return [int(self.size * rng.random() ** 3) for _ in range(count)]
+
+    def _title(self, index: int) -> str:
+        rng = self._rng(index, "title")
+        return " ".join(rng.sample(_WORDS, 5)).title() + f" ({index})"
+
+    def _edge(self, index: int, sub_fields: Optional[set]) -> Dict:
+        """引用列表中的一项；sub_fields 为 None 时返回默认的 paperId + title"""
+        item = {"paperId": self.paper_id(index)}
+        if sub_fields is None or "title" in sub_fields:
+            item["title"] = self._title(index)
+        if sub_fields and "year" in sub_fields:
+            item["year"] = 2000 + index % 25
+        return item
+
+    def edges(self, paper_id: str, field: str, offset: int, limit: int, fields: str) -> Optional[List[Dict]]:
+        """单篇论文的被引 / 参考文献列表的一页，论文不存在时返回 None"""
+        index = self.index_of(paper_id)
+        if index is None:
+            return None
+        count = self.citations if field == "citations" else self.references
+        sub_fields = set(filter(None, (fields or "").split(","))) or {"paperId", "title"}
+        return [self._edge(n, sub_fields) for n in self._neighbors(index, field, count)[offset:offset + limit]]
+
+    def paper(self, index: int, fields: str) -> Dict:
+        rng = self._rng(index, "meta")
+        requested = set(filter(None, (fields or "").split(",")))
+        paper = {
+            "paperId": self.paper_id(index),
+            "title": self._title(index),
+            "abstract": " ".join(rng.choice(_WORDS) for _ in range(120)),
+            "year": 2000 + index % 25,
+            "citationCount": int(self.size / (index + 1)) % 50000,
+            "referenceCount": self.references,
+            "influentialCitationCount": index % 17,
+            "venue": rng.choice(["NeurIPS", "ICML", "ACL", "ICLR", "arXiv"]),
+            "url": f"https://www.semanticscholar.org/paper/{self.paper_id(index)}",
+            "publicationDate": f"{2000 + index % 25}-01-01",
+            "openAccessPdf": None,
+            "authors": [{"authorId": str(rng.randrange(10 ** 6)), "name": f"Author {rng.randrange(10 ** 4)}"}
+                        for _ in range(rng.randint(1, 6))],
+        }
+        for field, count in (("citations", self.citations), ("references", self.references)):
+            nested = {name.split(".", 1)[1] for name in requested if name.startswith(field + ".")}
+            if field in requested or nested:
+                sub_fields = None if field in requested else nested
+                paper[field] = [self._edge(n, sub_fields) for n in self._neighbors(index, field, count)]
+        return paper
+
+    def search(self, query: str, limit: int, offset: int, fields: str) -> List[Dict]:
+        rng = self._rng("search", _normalize(query))
+        indices = [int(self.size * rng.random() ** 2) for _ in range(offset + limit)]
+        return [self.paper(index, fields) for index in indices[offset:]]
+
+    def match(self, title: str, fields: str) -> Optional[Dict]:
+        index = self._rng("match", _normalize(title)).randrange(self.size)
+        return self.paper(index, fields)
+
+    def batch(self, paper_ids: List[str], fields: str) -> List[Optional[Dict]]:
+        results = []
+        for pid in paper_ids:
+            index = self.index_of(pid)
+            results.append(self.paper(index, fields) if index is not None else None)
+        return results
+
+
+class RecordedCorpus:
+    """从 ResponseArchive 归档文件 (.jsonl.gz / .jsonl.zst) 中加载录制的响应，未命中时回退到合成语料"""
+
+    def __init__(self, fallback: SyntheticCorpus):
+        self.fallback = fallback
+        self.searches: Dict[str, List[Dict]] = {}
+        self.papers: Dict[str, Dict] = {}
+
+    @staticmethod
+    def _open(path: str):
+        if path.endswith(".zst"):
+            import zstandard  # 可选依赖，仅读取 zstd 归档时需要
+            return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(path, "rb")), encoding="utf-8")
+        return gzip.open(path, "rt", encoding="utf-8")
+
+    def load(self, pattern: str) -> int:
+        count = 0
+        for path in sorted(glob.glob(pattern)):
+            with self._open(path) as f:
+                for line in f:
+                    record = json.loads(line)
+                    kind, request, response = record.get("kind"), record.get("request") or {}, record.get("response")
+                    if kind == "search_papers" and isinstance(response, dict):
+                        self.searches[_normalize(request.get("query"))] = response.get("data") or []
+                    elif kind == "batch_details":
+                        papers = response if isinstance(response, list) else (response or {}).get("data", [])
+                        for pid, paper in zip(request.get("ids") or [], papers):
+                            if paper:
+                                self.papers[pid] = paper
+                    count += 1
+        return count
+
+    def search(self, query: str, limit: int, offset: int, fields: str) -> List[Dict]:
+        recorded = self.searches.get(_normalize(query))
+        if recorded is not None:
+            return recorded[offset:offset + limit]
+        return self.fallback.search(query, limit, offset, fields)
+
+    def match(self, title: str, fields: str) -> Optional[Dict]:
+        for paper in self.papers.values():
+            if _normalize(paper.get("title")) == _normalize(title):
+                return paper
+        return self.fallback.match(title, fields)
+
+    def edges(self, paper_id: str, field: str, offset: int, limit: int, fields: str) -> Optional[List[Dict]]:
+        return self.fallback.edges(paper_id, field, offset, limit, fields)
+
+    def batch(self, paper_ids: List[str], fields: str) -> List[Optional[Dict]]:
+        missing = [pid for pid in paper_ids if pid not in self.papers]
+        fallback = dict(zip(missing, self.fallback.batch(missing, fields)))
+        return [self.papers.get(pid) or fallback.get(pid) for pid in paper_ids]
+
+
+class MockS2Server:
+    """在后台线程中运行的模拟服务，记录各接口的请求次数"""
+
+    def __init__(self, corpus, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 per_paper_latency: float = 0.0, error_rate: float = 0.0):
+        self.corpus = corpus
+        self.latency = latency
+        self.per_paper_latency = per_paper_latency
+        self.error_rate = error_rate
+        self.request_counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}{BASE_PATH}"
+
+    def _count(self, endpoint: str):
+        with self._lock:
+            self.request_counts[endpoint] = self.request_counts.get(endpoint, 0) + 1
+
+    def reset_counts(self) -> Dict[str, int]:
+        with self._lock:
+            counts, self.request_counts = self.request_counts, {}
+        return counts
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, body):
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _handle(self, method: str):
+                url = urlparse(self.path)
+                params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                endpoint = url.path[len(BASE_PATH):] if url.path.startswith(BASE_PATH) else url.path
+                server._count(endpoint)
+
+                body = {}
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+
+                ids = body.get("ids") or []
+                delay = server.latency + server.per_paper_latency * len(ids)
+                if delay:
+                    time.sleep(delay)
+                if server.error_rate and random.random() < server.error_rate:
+                    return self._send_json(503, {"error": "Injected failure"})
+
+                fields = params.get("fields", "")
+                if method == "GET" and endpoint == "/search":
+                    limit, offset = int(params.get("limit", 10)), int(params.get("offset", 0))
+                    papers = server.corpus.search(params.get("query", ""), limit, offset, fields)
+                    return self._send_json(200, {"total": len(papers), "offset": offset, "data": papers})
+                if method == "GET" and endpoint == "/search/match":
+                    paper = server.corpus.match(params.get("query", ""), fields)
+                    if not paper:
+                        return self._send_json(404, {"error": "Title match not found"})
+                    return self._send_json(200, {"data": [paper]})
+                if method == "POST" and endpoint == "/batch":
+                    return self._send_json(200, server.corpus.batch(ids, fields))
+                parts = endpoint.strip("/").split("/")
+                if method == "GET" and len(parts) == 2 and parts[1] in ("citations", "references"):
+                    limit, offset = int(params.get("limit", 100)), int(params.get("offset", 0))
+                    items = server.corpus.edges(parts[0], parts[1], offset, limit, fields)
+                    if items is None:
+                        return self._send_json(404, {"error": "Paper not found"})
+                    key = "citingPaper" if parts[1] == "citations" else "citedPaper"
+                    body = {"offset": offset, "data": [{key: item} for item in items]}
+                    if len(items) == limit:
+                        body["next"] = offset + limit
+                    return self._send_json(200, body)
+                return self._send_json(404, {"error": f"Unknown endpoint {endpoint}"})
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+        return Handler
+
+    def start(self) -> "MockS2Server":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-s2", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+def build_corpus(args) -> SyntheticCorpus:
+    corpus = SyntheticCorpus(size=args.corpus_size, citations=args.citations, references=args.references,
+                             seed=args.seed)
+    if args.fixtures:
+        recorded = RecordedCorpus(corpus)
+        print(f"Loaded {recorded.load(args.fixtures)} recorded responses from {args.fixtures}")
+        return recorded
+    return corpus
+
+
+def add_server_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--corpus-size", type=int, default=100000, help="合成语料的论文数量")
+    parser.add_argument("--citations", type=int, default=200, help="每篇论文返回的被引列表长度")
+    parser.add_argument("--references", type=int, default=40, help="每篇论文返回的参考文献列表长度")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--fixtures", default="", help="录制数据（ResponseArchive 文件的 glob 模式）")
+    parser.add_argument("--latency", type=float, default=0.05, help="每个请求的固定延迟（秒）")
+    parser.add_argument("--per-paper-latency", type=float, default=0.001, help="/batch 中每篇论文的额外延迟（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="随机返回 503 的比例")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock Semantic Scholar server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = MockS2Server(build_corpus(args), host=args.host, port=args.port, latency=args.latency,
+                          per_paper_latency=args.per_paper_latency, error_rate=args.error_rate)
+    print(f"Mock Semantic Scholar serving at {server.base_url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
\ No newline at end of file
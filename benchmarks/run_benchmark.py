@@ -0,0 +1,250 @@
+"""
+SearchWorkflow 离线基准测试：启动本地模拟 Semantic Scholar 服务，并注入确定性的 Fake 聊天模型，
+在不需要 ai4scholar / DashScope Key 的情况下，按 1..N 的并发度重复运行完整工作流，
+统计端到端与各阶段耗时、内存峰值 (tracemalloc) 与吞吐量。
+
+用法：python -m benchmarks.run_benchmark --concurrency 1,4,16 --runs 16 --output data/bench.json
+"""
+import argparse
+import asyncio
+import atexit
+import json
+import logging
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.mock_s2_server import MockS2Server, add_server_arguments, build_corpus
+
+_TOPICS = [
+    "LLM agent memory mechanism", "graph neural network reasoning", "retrieval augmented generation",
+    "multimodal transformer alignment", "reinforcement learning planning", "diffusion model evaluation",
+]
+
+
+def _configure_environment(args):
+    """在导入项目模块之前设置（config.settings 在导入时读取环境变量）"""
+    cache = "true" if args.cache else "false"
+    # 本地引用图谱写入临时目录，避免模拟服务的合成邻接表写入正式的 data/citation_graph.sqlite3
+    graph_dir = tempfile.mkdtemp(prefix="academic_bench_")
+    atexit.register(shutil.rmtree, graph_dir, ignore_errors=True)
+    os.environ.update({
+        "S2_RATE_LIMIT": "0",  # 模拟服务无需客户端限流
+        "S2_CACHE_ENABLED": cache,
+        "RANKING_CACHE_ENABLED": cache,
+        "INTENT_CACHE_ENABLED": cache,
+        "REPORT_CACHE_ENABLED": cache,
+        "GRAPH_STORE_ENABLED": cache,
+        "GRAPH_STORE_PATH": os.path.join(graph_dir, "citation_graph.sqlite3"),
+        "RESPONSE_ARCHIVE_ENABLED": "false",
+    })
+    if args.redis != "fake":
+        # 真实 Redis 使用独立的 DB，避免基准测试的合成论文与缓存写入正式数据使用的 Key
+        if str(args.redis_db) == os.getenv("REDIS_DB", "0"):
+            raise SystemExit(f"--redis-db {args.redis_db} is the configured REDIS_DB; pick a dedicated benchmark DB")
+        os.environ["REDIS_DB"] = str(args.redis_db)
+    if args.depth:
+        os.environ["EXPANSION_DEPTH"] = str(args.depth)
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+async def _use_redis(mode: str) -> str:
+    """
+    选择 Redis 后端：fake（默认）使用 fakeredis（需安装）；real 连接配置中的 Redis 的 --redis-db，
+    auto 优先尝试该真实 Redis，不可用时退回 fakeredis
+    """
+    from utils import redis_client
+
+    if mode in ("auto", "real"):
+        try:
+            await redis_client.get_async_redis().ping()
+            return "real"
+        except Exception as e:
+            if mode == "real":
+                raise
+            await redis_client.close_async_redis()
+            logging.getLogger("benchmark").warning(f"Redis unavailable ({e}), falling back to fakeredis")
+
+    import fakeredis  # 可选依赖，仅离线基准测试使用
+    redis_client._clients[asyncio.get_running_loop()] = fakeredis.aioredis.FakeRedis()
+    return "fake"
+
+
+async def _reset_redis():
+    """
+    清空基准测试使用的 Redis（fakeredis 或 --redis-db 指定的独立 DB），
+    使各并发度都从相同的冷状态开始（StorageAgent 的 paper:{id}:meta 等数据不受 --cache 控制）
+    """
+    from utils.redis_client import get_async_redis
+
+    await get_async_redis().flushdb()
+
+
+async def _run_level(workflow, server: MockS2Server, concurrency: int, runs: int, args) -> Dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    records: List[Dict] = []
+    errors: List[str] = []
+
+    async def run_once(index: int):
+        query = _TOPICS[0] if args.identical else f"{_TOPICS[index % len(_TOPICS)]} {index}"
+        stage_timings: Dict = {}
+
+        async def on_timings(timings):
+            stage_timings.update(timings)
+
+        async def on_token(_chunk):
+            pass
+
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                report = await workflow.run(query, timing_callback=on_timings,
+                                            token_callback=on_token if args.stream else None)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+                return
+            records.append({
+                "latency": time.perf_counter() - start,
+                "stages": {name: end - begin for name, (begin, end) in stage_timings.items()},
+                "report_chars": len(report or ""),
+            })
+
+    server.reset_counts()
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(run_once(i) for i in range(runs)))
+    wall = time.perf_counter() - wall_start
+    peak = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else 0
+
+    latencies = [r["latency"] for r in records]
+    stage_names = sorted({name for r in records for name in r["stages"]})
+    stages = {}
+    for name in stage_names:
+        durations = [r["stages"][name] for r in records if name in r["stages"]]
+        stages[name] = {"mean": statistics.fmean(durations), "p95": _percentile(durations, 0.95)}
+
+    return {
+        "concurrency": concurrency,
+        "runs": runs,
+        "errors": len(errors),
+        "error_samples": errors[:3],
+        "wall_seconds": wall,
+        "throughput_rps": len(records) / wall if wall > 0 else 0.0,
+        "latency": {
+            "mean": statistics.fmean(latencies) if latencies else 0.0,
+            "p50": _percentile(latencies, 0.5),
+            "p95": _percentile(latencies, 0.95),
+            "max": max(latencies, default=0.0),
+        },
+        "stages": stages,
+        "memory_peak_mb": peak / 1024 / 1024,
+        "s2_requests": server.reset_counts(),
+    }
+
+
+def _print_summary(results: List[Dict]):
+    print("\n" + "=" * 78)
+    print(f"{'conc':>5} {'runs':>5} {'err':>4} {'rps':>8} {'p50(s)':>8} {'p95(s)':>8} {'max(s)':>8} {'peakMB':>8}  s2 requests")
+    for r in results:
+        lat = r["latency"]
+        print(f"{r['concurrency']:>5} {r['runs']:>5} {r['errors']:>4} {r['throughput_rps']:>8.2f} "
+              f"{lat['p50']:>8.3f} {lat['p95']:>8.3f} {lat['max']:>8.3f} {r['memory_peak_mb']:>8.1f}  {r['s2_requests']}")
+    for r in results:
+        print(f"\n[concurrency={r['concurrency']}] stage durations (seconds):")
+        for name, value in r["stages"].items():
+            print(f"  {name:<20} mean={value['mean']:7.3f}  p95={value['p95']:7.3f}")
+        for sample in r["error_samples"]:
+            print(f"  error: {sample}")
+    print("=" * 78)
+
+
+async def main(args) -> List[Dict]:
+    _configure_environment(args)
+
+    # 以下模块依赖上面设置的环境变量，必须在此之后导入
+    from main import SearchWorkflow
+    from benchmarks.fake_llm import FakeChatTongyi
+    from config.settings import settings
+    from utils.http_client import close_async_client
+    from utils.redis_client import close_async_redis
+
+    for name, logger in list(logging.Logger.manager.loggerDict.items()):
+        if isinstance(logger, logging.Logger):
+            logger.setLevel(args.log_level)
+
+    server = MockS2Server(build_corpus(args), latency=args.latency, per_paper_latency=args.per_paper_latency,
+                          error_rate=args.error_rate).start()
+    settings.API_BASE_URL = server.base_url
+    backend = await _use_redis(args.redis)
+    print(f"Mock Semantic Scholar at {server.base_url}, redis={backend}, depth={settings.EXPANSION_DEPTH}")
+
+    llm = FakeChatTongyi(latency=args.llm_latency, token_interval=args.token_interval)
+    workflow = SearchWorkflow(llm=llm)
+
+    results = []
+    try:
+        for i in range(args.warmup):
+            await workflow.run(f"warmup {i}")
+        if args.tracemalloc:
+            tracemalloc.start()
+        for concurrency in args.concurrency:
+            runs = max(args.runs, concurrency)
+            print(f"Running concurrency={concurrency} runs={runs} ...")
+            if not args.cache:
+                await _reset_redis()
+            results.append(await _run_level(workflow, server, concurrency, runs, args))
+    finally:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        await close_async_client()
+        await close_async_redis()
+        server.stop()
+
+    _print_summary(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"Results written to {args.output}")
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark for SearchWorkflow")
+    parser.add_argument("--concurrency", type=lambda v: [int(x) for x in v.split(",") if x],
+                        default=[1, 4, 8], help="逗号分隔的并发度列表，例如 1,4,16")
+    parser.add_argument("--runs", type=int, default=8, help="每个并发度的运行次数（至少等于并发度）")
+    parser.add_argument("--warmup", type=int, default=1, help="正式测量前的预热运行次数")
+    parser.add_argument("--depth", type=int, default=0, help="引用扩展跳数，默认使用 EXPANSION_DEPTH")
+    parser.add_argument("--identical", action="store_true", help="所有运行使用同一查询（测试请求合并）")
+    parser.add_argument("--stream", action="store_true", help="以流式模式生成报告")
+    parser.add_argument("--cache", action="store_true", help="启用 Redis 响应/评分/意图缓存（默认关闭以测量完整路径）")
+    parser.add_argument("--redis", choices=["auto", "real", "fake"], default="fake",
+                        help="Redis 后端，默认 fakeredis；real / auto 只写入 --redis-db 指定的独立 DB")
+    parser.add_argument("--redis-db", type=int, default=15,
+                        help="real / auto 模式使用的 Redis DB（不能与 REDIS_DB 相同，未开启 --cache 时每个并发度开始前清空）")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Fake 模型每次调用的延迟（秒）")
+    parser.add_argument("--token-interval", type=float, default=0.0, help="Fake 模型流式输出每块的间隔（秒）")
+    parser.add_argument("--no-tracemalloc", dest="tracemalloc", action="store_false",
+                        help="关闭 tracemalloc（其本身会显著拖慢运行）")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--output", default="", help="结果 JSON 输出路径")
+    add_server_arguments(parser)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
\ No newline at end of file
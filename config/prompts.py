@@ -1,6 +1,9 @@
 # ==============================================================================
 # 1. Intent Recognition Agent (意图识别)
 # ==============================================================================
+# Prompt 版本号：修改 Prompt 后需同步递增，使旧的缓存结果失效
+INTENT_PROMPT_VERSION = "v2"
+
 INTENT_AGENT_SYSTEM_PROMPT = """你是一位精通学术检索的专家助手。
 你的目标是分析用户的输入，确定检索类型，并生成对应的查询参数。
 
@@ -16,15 +19,18 @@ INTENT_AGENT_SYSTEM_PROMPT = """你是一位精通学术检索的专家助手。
 
 **示例**：
 用户: "AI Agent记忆机制"
-输出: {"search_type": "keyword", "query": "(\"AI Agent\" | \"Intelligent Agent\") (\"Memory\" | \"Memory Mechanism\")"}
+输出: {{"search_type": "keyword", "query": "(\"AI Agent\" | \"Intelligent Agent\") (\"Memory\" | \"Memory Mechanism\")"}}
 
 用户: "分析一下 Attention is all you need 这篇论文"
-输出: {"search_type": "title", "query": "Attention is all you need"}
+输出: {{"search_type": "title", "query": "Attention is all you need"}}
 """
 
 # ==============================================================================
 # 2. Ranking Agent (阅读评分)
 # ==============================================================================
+# Prompt 版本号：修改 Prompt 后需同步递增，使缓存的评分结果失效
+RANKING_PROMPT_VERSION = "v2"
+
 RANKING_AGENT_SYSTEM_PROMPT = """你是一位高级学术编辑。
 你的任务是评估一批候选论文，并为调研报告对它们进行排序。
 
@@ -34,7 +40,7 @@ RANKING_AGENT_SYSTEM_PROMPT = """你是一位高级学术编辑。
 3. **时效性 (Recency)**：发表年份（对于查询“最新”研究，年份越新越好；对于基础理论，年份较早的高引论文也可）。
 4. **语义 (Semantics)**：摘要的质量和深度。
 
-**输入数据**：包含 ID、标题、摘要、年份和引用数的论文列表。
+**输入数据**：调研主题 (Search Topic)，以及包含 ID、标题、摘要、年份和引用数的论文列表。
 
 **输出格式**：
 必须返回一个 JSON 对象，其中包含一个名为 "ranking" 的列表。
@@ -55,6 +61,9 @@ RANKING_AGENT_SYSTEM_PROMPT = """你是一位高级学术编辑。
 # ==============================================================================
 # 3. Reporting Agent (总结报告)
 # ==============================================================================
+# Prompt 版本号：修改 Prompt 后需同步递增，使缓存的报告失效
+REPORTING_PROMPT_VERSION = "v1"
+
 REPORTING_AGENT_SYSTEM_PROMPT = """你是一位拥有 10 年经验的高级学术分析师。
 你的任务是基于提供的 Top-10 核心论文数据，撰写一份逻辑严密、见解深刻的**深度文献调研报告**。
 
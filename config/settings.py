@@ -10,20 +10,140 @@ class Settings:
     REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
     REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", "redis.123456")
     REDIS_DB = int(os.getenv("REDIS_DB", 0))
+    REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+    REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", 5))
 
     # API Configuration
     API_BASE_URL = "https://ai4scholar.net/graph/v1/paper"
     AI4SCHOLAR_API_KEY = os.getenv("AI4SCHOLAR_API_KEY", "")
+    # /batch 接口单次请求的 ID 数量上限与并发分片数
+    BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", 20))
+    BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", 4))
+
+    # Paper Storage (Redis 紧凑编码存储，TTL 单位: 秒)
+    PAPER_META_TTL = int(os.getenv("PAPER_META_TTL", 7 * 24 * 3600))
+    PAPER_EDGES_TTL = int(os.getenv("PAPER_EDGES_TTL", 3 * 24 * 3600))
+
+    # Semantic Scholar Response Cache (Redis 读穿缓存，TTL 单位: 秒)
+    S2_CACHE_ENABLED = os.getenv("S2_CACHE_ENABLED", "true").lower() == "true"
+    S2_CACHE_SEARCH_TTL = int(os.getenv("S2_CACHE_SEARCH_TTL", 6 * 3600))
+    S2_CACHE_PAPER_TTL = int(os.getenv("S2_CACHE_PAPER_TTL", 24 * 3600))
+
+    # Semantic Scholar Rate Limit & Retry (令牌桶限流、指数退避重试与熔断)
+    S2_RATE_LIMIT = float(os.getenv("S2_RATE_LIMIT", 5))  # 每秒请求数，按 API Key 配额设置，<=0 表示不限流
+    S2_RATE_BURST = int(os.getenv("S2_RATE_BURST", 5))  # 允许的突发请求数
+    S2_MAX_RETRIES = int(os.getenv("S2_MAX_RETRIES", 3))
+    S2_BACKOFF_BASE = float(os.getenv("S2_BACKOFF_BASE", 1.0))  # 退避基数，单位: 秒
+    S2_BACKOFF_MAX = float(os.getenv("S2_BACKOFF_MAX", 30))  # 单次退避上限（Retry-After 超过该值时不再重试）
+    S2_BREAKER_THRESHOLD = int(os.getenv("S2_BREAKER_THRESHOLD", 5))  # 连续失败多少次后熔断
+    S2_BREAKER_RECOVERY = float(os.getenv("S2_BREAKER_RECOVERY", 30))  # 熔断持续时间，单位: 秒
+    S2_MAX_CONCURRENCY = int(os.getenv("S2_MAX_CONCURRENCY", 0))  # 同时进行的请求数上限，<=0 表示只受连接池限制
+
+    # HTTP Client Configuration (共享连接池)
+    HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 20))
+    HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 30))
+    HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 60))
+    HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 10))
+    HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+
+    # Citation Expansion Configuration (多跳引用扩展)
+    EXPANSION_DEPTH = int(os.getenv("EXPANSION_DEPTH", 1))
+    EXPANSION_FRONTIER_SIZE = int(os.getenv("EXPANSION_FRONTIER_SIZE", 10))
+    EXPANSION_MAX_NODES = int(os.getenv("EXPANSION_MAX_NODES", 50000))
+    EXPANSION_TIME_BUDGET = float(os.getenv("EXPANSION_TIME_BUDGET", 30))
+    # 扩展阶段的引文获取方式：
+    # full: /batch 一次返回完整论文字段与全部引用/被引列表；
+    # bounded: 引用列表只请求论文ID，单篇超过上限的列表改为分页请求 /{paper_id}/citations|references 并截断
+    EXPANSION_FETCH_MODE = os.getenv("EXPANSION_FETCH_MODE", "full")
+    EXPANSION_MAX_CITATIONS = int(os.getenv("EXPANSION_MAX_CITATIONS", 500))  # bounded 模式下单篇论文保留的被引数上限
+    EXPANSION_MAX_REFERENCES = int(os.getenv("EXPANSION_MAX_REFERENCES", 500))  # bounded 模式下单篇论文保留的参考文献数上限
+    # 列表超过上限时按发表年份加权抽样的半衰期（年），越新的论文权重越高；0 表示按接口返回顺序截取
+    EXPANSION_RECENCY_HALF_LIFE = float(os.getenv("EXPANSION_RECENCY_HALF_LIFE", 0))
+    EXPANSION_EDGE_SCAN_LIMIT = int(os.getenv("EXPANSION_EDGE_SCAN_LIMIT", 2000))  # 抽样时单个列表最多分页读取的条数
+    # 流式解析扩展阶段的 /batch 响应：逐篇累加频次并写入 Redis，内存占用与单篇论文成正比
+    # （仅 full 模式生效；流式请求不经过 S2 响应缓存，重复抓取由本地引用图谱避免）
+    EXPANSION_STREAM_PARSE = os.getenv("EXPANSION_STREAM_PARSE", "false").lower() == "true"
+    STREAM_PIPELINE_BATCH = int(os.getenv("STREAM_PIPELINE_BATCH", 50))  # 流式解析时每多少篇论文执行一次 Redis Pipeline
 
     # LLM Configuration (Qwen-Max)
     DASHSCOPE_API_KEY = os.getenv("DASHSCOPE_API_KEY")
     MODEL_NAME = "qwen-max"
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 0))  # 进程内同时进行的 LLM 调用数上限，<=0 表示不限制
+
+    # Ranking Configuration (分块并发 LLM 评分)
+    RANKING_CANDIDATES = int(os.getenv("RANKING_CANDIDATES", 10))  # 参与 LLM 评分的候选论文数
+    RANKING_CHUNK_SIZE = int(os.getenv("RANKING_CHUNK_SIZE", 10))  # 每次 LLM 调用评估的论文数
+    RANKING_CONCURRENCY = int(os.getenv("RANKING_CONCURRENCY", 4))  # 同时进行的 LLM 调用数
+    RANKING_TOP_N = int(os.getenv("RANKING_TOP_N", 10))  # 进入报告的论文数
+    RANKING_CACHE_ENABLED = os.getenv("RANKING_CACHE_ENABLED", "true").lower() == "true"
+    RANKING_CACHE_TTL = int(os.getenv("RANKING_CACHE_TTL", 7 * 24 * 3600))  # (主题, 论文) 评分缓存 TTL，单位: 秒
+
+    # Prompt Packing (按 Token 预算打包评分 / 报告 Prompt：按排名分配摘要预算，超出部分抽取关键句压缩)
+    PROMPT_PACKING_ENABLED = os.getenv("PROMPT_PACKING_ENABLED", "true").lower() == "true"
+    RANKING_PROMPT_TOKEN_BUDGET = int(os.getenv("RANKING_PROMPT_TOKEN_BUDGET", 3000))  # 每次评分调用的 Prompt 预算
+    REPORT_PROMPT_TOKEN_BUDGET = int(os.getenv("REPORT_PROMPT_TOKEN_BUDGET", 8000))  # 报告生成的 Prompt 预算
+    PROMPT_MIN_ABSTRACT_TOKENS = int(os.getenv("PROMPT_MIN_ABSTRACT_TOKENS", 40))  # 每篇摘要至少保留的 Token 数
+    PROMPT_RANK_DECAY = float(os.getenv("PROMPT_RANK_DECAY", 0.5))  # 摘要预算权重 1 / (rank + 1)^decay
+
+    # Candidate Selection (frequency: 引用频次 | graph: 个性化 PageRank + 共被引 + 文献耦合)
+    CANDIDATE_MODE = os.getenv("CANDIDATE_MODE", "frequency")
+    GRAPH_SCORE_WEIGHTS = os.getenv("GRAPH_SCORE_WEIGHTS", "pagerank:0.6,cocitation:0.2,coupling:0.2")
+    GRAPH_PAGERANK_ALPHA = float(os.getenv("GRAPH_PAGERANK_ALPHA", 0.85))  # 阻尼系数，1 - alpha 为回到种子论文的概率
+
+    # Relevance Pre-filter (LLM 评分前的本地 BM25 相关性预筛选)
+    RELEVANCE_FILTER_ENABLED = os.getenv("RELEVANCE_FILTER_ENABLED", "true").lower() == "true"
+    RELEVANCE_POOL_SIZE = int(os.getenv("RELEVANCE_POOL_SIZE", 200))  # 参与预筛选的高频论文数
+    RELEVANCE_WEIGHT = float(os.getenv("RELEVANCE_WEIGHT", 0.6))  # 相关性权重，其余为频次权重
+
+    # Intent Cache (LLM 意图识别结果缓存，TTL 单位: 秒)
+    INTENT_CACHE_ENABLED = os.getenv("INTENT_CACHE_ENABLED", "true").lower() == "true"
+    INTENT_CACHE_TTL = int(os.getenv("INTENT_CACHE_TTL", 7 * 24 * 3600))
+
+    # Report Cache (端到端报告缓存，Key 为规范化查询 + 候选论文集合 + Prompt 版本)
+    REPORT_CACHE_ENABLED = os.getenv("REPORT_CACHE_ENABLED", "true").lower() == "true"
+    REPORT_CACHE_TTL = int(os.getenv("REPORT_CACHE_TTL", 3 * 24 * 3600))
+    # 在此时间内重复的查询直接返回最近一次的报告；超过后重新检索，候选论文集合不变时复用报告，单位: 秒
+    REPORT_CACHE_TRUST_SECONDS = int(os.getenv("REPORT_CACHE_TRUST_SECONDS", 3600))
+
+    # Workflow Pipeline (意图识别期间用原始查询提前发起关键词检索)
+    SPECULATIVE_SEARCH_ENABLED = os.getenv("SPECULATIVE_SEARCH_ENABLED", "true").lower() == "true"
 
     # Project Paths
     BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     LOG_DIR = os.path.join(BASE_DIR, "logs")
     DATA_DIR = os.path.join(BASE_DIR, "data")
 
+    # Response Archive (调试用 API 响应归档，生产环境可通过 RESPONSE_ARCHIVE_ENABLED=false 关闭)
+    RESPONSE_ARCHIVE_ENABLED = os.getenv("RESPONSE_ARCHIVE_ENABLED", "true").lower() == "true"
+    RESPONSE_ARCHIVE_DIR = os.getenv("RESPONSE_ARCHIVE_DIR", os.path.join(DATA_DIR, "archive"))
+    RESPONSE_ARCHIVE_CODEC = os.getenv("RESPONSE_ARCHIVE_CODEC", "gzip")  # gzip | zstd
+    RESPONSE_ARCHIVE_MAX_FILE_MB = int(os.getenv("RESPONSE_ARCHIVE_MAX_FILE_MB", 64))
+    RESPONSE_ARCHIVE_ROTATE_SECONDS = int(os.getenv("RESPONSE_ARCHIVE_ROTATE_SECONDS", 3600))
+    RESPONSE_ARCHIVE_RETENTION_DAYS = float(os.getenv("RESPONSE_ARCHIVE_RETENTION_DAYS", 7))
+    RESPONSE_ARCHIVE_MAX_TOTAL_MB = int(os.getenv("RESPONSE_ARCHIVE_MAX_TOTAL_MB", 1024))
+    RESPONSE_ARCHIVE_QUEUE_SIZE = int(os.getenv("RESPONSE_ARCHIVE_QUEUE_SIZE", 1000))
+
+    # Telemetry (各阶段 span 耗时与指标，Prometheus 文本格式)
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    # 指标 HTTP 接口与指标采集分开控制，默认不对外提供
+    METRICS_HTTP_ENABLED = os.getenv("METRICS_HTTP_ENABLED", "false").lower() == "true"
+    METRICS_HTTP_HOST = os.getenv("METRICS_HTTP_HOST", "127.0.0.1")  # 独立指标服务的监听地址
+    METRICS_HTTP_PORT = int(os.getenv("METRICS_HTTP_PORT", 9464))  # 独立指标服务端口；0 表示挂在 Chainlit 服务上（公开端口，无鉴权）
+    METRICS_ENDPOINT = os.getenv("METRICS_ENDPOINT", "/metrics")  # 指标路由路径
+    METRICS_FILE = os.getenv("METRICS_FILE", "")  # 每次工作流结束后写入的指标文件，留空则不写
+    TELEMETRY_LOG_SPANS = os.getenv("TELEMETRY_LOG_SPANS", "false").lower() == "true"  # 是否将每个 span 以 JSON 写入日志
+
+    # Citation Graph Store (本地持久化引用图谱，跨查询复用已抓取的引文关系)
+    GRAPH_STORE_ENABLED = os.getenv("GRAPH_STORE_ENABLED", "true").lower() == "true"
+    GRAPH_STORE_PATH = os.getenv("GRAPH_STORE_PATH", os.path.join(DATA_DIR, "citation_graph.sqlite3"))
+    GRAPH_STORE_MAX_AGE = float(os.getenv("GRAPH_STORE_MAX_AGE", 7 * 24 * 3600))  # 节点邻接表的有效期，过期后重新抓取，单位: 秒
+    GRAPH_STORE_MMAP_MB = int(os.getenv("GRAPH_STORE_MMAP_MB", 256))  # SQLite 内存映射大小
+
+    # Local Corpus (由 Semantic Scholar 数据集导入的本地论文库；RETRIEVAL_PROVIDER=local 时检索不再请求 API)
+    RETRIEVAL_PROVIDER = os.getenv("RETRIEVAL_PROVIDER", "s2")  # s2 | local
+    LOCAL_CORPUS_PATH = os.getenv("LOCAL_CORPUS_PATH", os.path.join(DATA_DIR, "s2_corpus.sqlite3"))
+    INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 5000))  # 导入时每个事务写入的记录数（同时也是断点粒度）
+
     # Ensure directories exist
     os.makedirs(LOG_DIR, exist_ok=True)
     os.makedirs(DATA_DIR, exist_ok=True)
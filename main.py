@@ -1,39 +1,69 @@
-from agents.intent_agent import IntentAgent
+import asyncio
+from agents.intent_agent import IntentAgent, classify_query_locally
 from agents.retrieval_agent import RetrievalAgent
 from agents.storage_agent import StorageAgent
+from agents.expansion_agent import ExpansionAgent
 from agents.ranking_agent import RankingAgent
-from agents.reporting_agent import ReportingAgent
-from utils.global_state import global_stats
+from agents.reporting_agent import ReportingAgent, ReportGenerationError
+from config.settings import settings
+from tools.semantic_tools import SemanticScholarError
+from utils.paper_stats import PaperStats
+from utils.pipeline import StagePipeline
+from utils.query_utils import normalize_query
+from utils.telemetry import span, telemetry
 from utils.logger import setup_logger
 
 # 初始化工作流日志记录器
 logger = setup_logger("workflow")
 
 
+class WorkflowError(Exception):
+    """
+    工作流未能生成报告。reason 为失败类型（no_papers / s2_unavailable / report_failed），
+    异常信息为展示给用户的提示。
+    """
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
 class SearchWorkflow:
     """
     搜索工作流引擎
     负责编排和调度各个Agent去执行学术调研任务。
     """
 
-    def __init__(self):
+    def __init__(self, llm=None):
+        """
+        Args:
+            llm (optional): 注入所有 Agent 共用的聊天模型（例如离线基准测试的 Fake 模型），默认各自创建 ChatTongyi
+        """
         # 初始化各个功能 Agent
-        self.intent_agent = IntentAgent()  # 意图识别 Agent
+        self.intent_agent = IntentAgent(llm)  # 意图识别 Agent
         self.retrieval_agent = RetrievalAgent()  # 论文检索 Agent
         self.storage_agent = StorageAgent()  # 存储与统计 Agent
-        self.ranking_agent = RankingAgent()  # 阅读与评分 Agent
-        self.reporting_agent = ReportingAgent()  # 总结报告 Agent
+        self.expansion_agent = ExpansionAgent(self.retrieval_agent, self.storage_agent)  # 多跳引用扩展引擎
+        self.ranking_agent = RankingAgent(llm)  # 阅读与评分 Agent
+        self.reporting_agent = ReportingAgent(llm)  # 总结报告 Agent
 
-    async def run(self, user_query: str, status_callback=None):
+    async def run(self, user_query: str, status_callback=None, token_callback=None, timing_callback=None,
+                  refresh: bool = False):
         """
         核心调度入口：执行完整的学术搜索工作流。
 
         Args:
             user_query (str): 用户输入的原始自然语言问题
             status_callback (func, optional): 用于向前端 UI 推送实时进度的异步回调函数
+            token_callback (func, optional): 流式输出回调，传入时报告正文逐块推送（原始文本，含引用标记）
+            timing_callback (func, optional): 运行结束后接收各阶段耗时 {stage: (start, end)} 的异步回调（用于基准测试）
+            refresh (bool): 为 True 时忽略报告缓存，强制重新检索与生成（生成结果仍会写入缓存）
 
         Returns:
             str: 最终生成的 Markdown 格式调研报告
+
+        Raises:
+            WorkflowError: 未找到种子论文、检索服务不可用或报告生成失败
         """
 
         # 定义内部辅助函数：用于同时打印日志并推送到前端UI
@@ -43,118 +73,256 @@ class SearchWorkflow:
                 await status_callback(msg)
 
         # ------------------------------------------------------------------
-        # Step 0: 状态重置
+        # 报告缓存快速路径：REPORT_CACHE_TRUST_SECONDS 内重复的查询直接返回最近一次生成的报告
         # ------------------------------------------------------------------
-        # 清空上一轮会话的全局论文频次统计数据，确保本次搜索的数据纯净
-        global_stats.clear()
+        if not refresh:
+            cached_report = await self.reporting_agent.get_cached_report(
+                user_query, max_age=settings.REPORT_CACHE_TRUST_SECONDS)
+            if cached_report:
+                await update_status("命中报告缓存，直接返回最近生成的调研报告。")
+                if token_callback:
+                    await token_callback(cached_report)
+                return cached_report
+
+        # ------------------------------------------------------------------
+        # Step 0: 会话状态初始化
+        # ------------------------------------------------------------------
+        # 为本次搜索创建独立的论文频次统计，避免并发会话之间互相清空或污染数据
+        # 图评分模式下同时记录扩展得到的引用边
+        stats = PaperStats(record_graph=settings.CANDIDATE_MODE == "graph")
+        # 以阶段依赖图的形式组织工作流：没有依赖关系的阶段并行执行
+        pipeline = StagePipeline("workflow")
+        prefetch_tasks = []
 
         # ------------------------------------------------------------------
         # Step 1: 意图识别与查询优化 (已升级为路由模式)
         # ------------------------------------------------------------------
-        await update_status("Step 1/7: 正在识别用户意图并优化查询...")
+        async def intent_stage():
+            await update_status("Step 1/7: 正在识别用户意图并优化查询...")
 
-        # 获取意图识别结果 (字典格式)
-        intent_data = self.intent_agent.optimize_query(user_query)
+            # 获取意图识别结果 (字典格式，明显的 ID/标题由本地规则直接识别，无需调用 LLM)
+            intent_data = await self.intent_agent.optimize_query(user_query)
+            await update_status(f"意图识别结果: 类型=[{intent_data.get('search_type', 'keyword')}], "
+                                f"内容=[{intent_data.get('query', user_query)}]")
+            return intent_data
 
-        # 解析意图数据 (兼容性处理：防止旧版返回字符串)
-        if isinstance(intent_data, dict):
-            search_type = intent_data.get("search_type", "keyword")
-            query_content = intent_data.get("query", user_query)
-        else:
-            search_type = "keyword"
-            query_content = intent_data
+        pipeline.add_stage("intent", intent_stage)
 
-        await update_status(f"意图识别结果: 类型=[{search_type}], 内容=[{query_content}]")
+        # 推测执行：本地规则无法判断意图（需要调用 LLM）时，同时用原始查询发起关键词检索，
+        # 若 LLM 最终给出的检索式与原始查询一致（或优化后的检索无结果），直接复用该结果
+        if settings.SPECULATIVE_SEARCH_ENABLED and classify_query_locally(user_query) is None:
+            async def speculative_search_stage():
+                return await self.retrieval_agent.initial_search(user_query, limit=10)
+
+            pipeline.add_stage("speculative_search", speculative_search_stage)
 
         # ------------------------------------------------------------------
         # Step 2: 种子论文检索 (动态路由)
         # ------------------------------------------------------------------
-        await update_status(f"Step 2/7: 执行核心论文检索 (类型: {search_type})...")
+        async def seed_search_stage(intent_data):
+            search_type = intent_data.get("search_type", "keyword")
+            query_content = intent_data.get("query", user_query)
+            await update_status(f"Step 2/7: 执行核心论文检索 (类型: {search_type})...")
 
-        seed_papers = []
+            seed_papers = []
+            speculative = pipeline.has_stage("speculative_search")
 
-        # 核心路由逻辑
-        if search_type == "title":
-            # 分支A: 用户给了标题，精确查单篇
-            await update_status(f"检测到论文标题，正在进行精确匹配...")
-            # 调用RetrievalAgent的标题精确搜索方法
-            seed_papers = self.retrieval_agent.search_seed_by_title(query_content)
+            # 核心路由逻辑
+            if search_type == "title":
+                # 分支A: 用户给了标题，精确查单篇
+                pipeline.cancel("speculative_search")
+                await update_status(f"检测到论文标题，正在进行精确匹配...")
+                # 调用RetrievalAgent的标题精确搜索方法
+                seed_papers = await self.retrieval_agent.search_seed_by_title(query_content)
 
-        else:
-            # 分支B: 默认根据关键词进行相关性搜索
-            await update_status(f"执行相关性检索...")
-            seed_papers = self.retrieval_agent.initial_search(query_content, limit=10)
-        # --------------------
+            elif search_type == "id":
+                # 分支B: 用户给了论文 ID / DOI / arXiv ID，直接按 ID 获取
+                pipeline.cancel("speculative_search")
+                await update_status(f"检测到论文ID，正在获取论文详情...")
+                seed_papers = await self.retrieval_agent.search_seed_by_id(query_content)
 
-        # 若种子检索为空，直接中断流程并反馈
-        if not seed_papers:
-            return f"未找到相关论文（类型：{search_type}），请检查输入内容是否准确。"
+            elif speculative and normalize_query(query_content) == normalize_query(user_query):
+                # 分支C1: 优化后的检索式与原始查询一致，复用推测执行的检索结果
+                await update_status(f"执行相关性检索 (复用预检索结果)...")
+                seed_papers = await pipeline.get("speculative_search")
 
-        # ------------------------------------------------------------------
-        # Step 3: 种子论文存储与初始化
-        # ------------------------------------------------------------------
-        # 将种子论文的基础信息存入 Redis，并在全局变量中初始化其频次
-        await update_status("Step 3/7: 正在存储核心论文信息...")
-        self.storage_agent.process_seed_papers(seed_papers)
+            else:
+                # 分支C2: 默认根据关键词进行相关性搜索
+                await update_status(f"执行相关性检索...")
+                seed_papers = await self.retrieval_agent.initial_search(query_content, limit=10)
+                if not seed_papers and speculative:
+                    # 优化后的检索式无结果时，退回原始查询的检索结果
+                    logger.info("Optimized query returned no papers, falling back to speculative search.")
+                    try:
+                        seed_papers = await pipeline.get("speculative_search")
+                    except SemanticScholarError as e:
+                        logger.error(f"Speculative search failed: {e}")
+                pipeline.cancel("speculative_search")
+            # --------------------
+
+            # 若种子检索为空，直接中断流程并反馈
+            if not seed_papers:
+                raise WorkflowError("no_papers", f"未找到相关论文（类型：{search_type}），请检查输入内容是否准确。")
+
+            # 先在内存中初始化种子论文频次，扩展阶段无需等待 Redis 写入完成
+            self.storage_agent.count_seed_papers(seed_papers, stats)
+
+            # [DEBUG START] 调试日志：打印种子论文清单
+            # 用于确认检索到的初始论文ID和标题是否符合预期
+            log_buffer = ["\n" + "-" * 20 + " [DEBUG] Seed Papers List " + "-" * 20]
+            for i, p in enumerate(seed_papers, 1):
+                pid = p.get('paperId', 'Unknown')
+                # 截取标题前80个字符以保持日志整洁
+                title = p.get('title', 'No Title')[:80] + "..."
+                log_buffer.append(f"Seed #{i:02d} | ID: {pid} | Title: {title}")
+            log_buffer.append("-" * 50 + "\n")
+            logger.info("\n".join(log_buffer))
+            # [DEBUG END]
+
+            return search_type, query_content, seed_papers
 
-        # [DEBUG START] 调试日志：打印种子论文清单
-        # 用于确认检索到的初始论文ID和标题是否符合预期
-        log_buffer = ["\n" + "-" * 20 + " [DEBUG] Seed Papers List " + "-" * 20]
-        for i, p in enumerate(seed_papers, 1):
-            pid = p.get('paperId', 'Unknown')
-            # 截取标题前80个字符以保持日志整洁
-            title = p.get('title', 'No Title')[:80] + "..."
-            log_buffer.append(f"Seed #{i:02d} | ID: {pid} | Title: {title}")
-        log_buffer.append("-" * 50 + "\n")
-        logger.info("\n".join(log_buffer))
-        # [DEBUG END]
+        pipeline.add_stage("seed_search", seed_search_stage, deps=["intent"])
 
         # ------------------------------------------------------------------
-        # Step 4: 引用扩展与批量详情检索
+        # Step 3: 种子论文存储 (与 Step 4 的批量详情请求并行)
         # ------------------------------------------------------------------
-        # 提取种子论文ID，批量请求 API 获取详细的引用关系 (References) 和被引关系 (Citations)
-        seed_ids = [p['paperId'] for p in seed_papers if p.get('paperId')]
-        await update_status(f"Step 4/7: 正在扩展引用信息，批量获取 {len(seed_ids)} 篇论文的详细引文关系...")
-        detailed_papers = self.retrieval_agent.batch_details_search(seed_ids)
+        # 将种子论文的基础信息存入 Redis
+        async def store_seeds_stage(seed_result):
+            _, _, seed_papers = seed_result
+            await update_status("Step 3/7: 正在存储核心论文信息...")
+            await self.storage_agent.store_paper_data(seed_papers)
+
+        pipeline.add_stage("store_seeds", store_seeds_stage, deps=["seed_search"])
 
         # ------------------------------------------------------------------
-        # Step 5: 递归引用统计与核心挖掘
+        # Step 4 & 5: 引用扩展、批量详情检索与递归引用统计
         # ------------------------------------------------------------------
-        # 遍历详细引文关系，计算所有相关节点的出现频次，挖掘潜在的核心论文
-        await update_status("Step 5/7: 递归计算论文引用频次，挖掘潜在的核心论文...")
-        self.storage_agent.process_graph_expansion(detailed_papers)
+        # 提取种子论文ID，按跳批量请求 API 获取详细的引用关系 (References) 和被引关系 (Citations)，
+        # 每一跳获取后立即累加频次，下一跳只扩展当前频次最高的 Top-N 论文
+        async def expand_stage(seed_result):
+            _, _, seed_papers = seed_result
+            seed_ids = [p['paperId'] for p in seed_papers if p.get('paperId')]
+
+            async def on_hop(hop, depth):
+                # 非最后一跳时，按当前频次在后台预取候选论文详情，与下一跳扩展并行
+                if hop < depth:
+                    prefetch_tasks.append(asyncio.create_task(self.ranking_agent.prefetch_candidates(stats)))
+
+            await update_status(f"Step 4/7: 正在扩展引用信息，批量获取 {len(seed_ids)} 篇论文的详细引文关系...")
+            hops = await self.expansion_agent.expand(seed_ids, stats, status_callback=update_status, on_hop=on_hop)
+
+            # 频次已在扩展过程中逐跳累计，这里汇总统计结果，挖掘潜在的核心论文
+            await update_status(f"Step 5/7: 已完成 {hops} 跳引用统计，挖掘潜在的核心论文...")
 
-        # [DEBUG START] 调试日志：监控全局频次统计状态
-        # 批量构建日志信息并一次性输出，避免频繁IO导致控制台刷屏
-        log_buffer = ["\n" + "=" * 50, "[DEBUG] Global State 数据监控",
-                      f"全局文献总数量 (Total Papers): {len(global_stats.stats)}",
-                      "引用频次最高的 Top-20 论文 (Top-20 Frequent Papers):"]
+            # [DEBUG START] 调试日志：监控本次会话的频次统计状态
+            # 批量构建日志信息并一次性输出，避免频繁IO导致控制台刷屏
+            log_buffer = ["\n" + "=" * 50, "[DEBUG] Session State 数据监控",
+                          f"会话文献总数量 (Total Papers): {len(stats)}",
+                          "引用频次最高的 Top-20 论文 (Top-20 Frequent Papers):"]
 
-        # 提取频次最高的 Top-20 论文用于分析
-        top_debug = global_stats.get_top_k(20)
-        for rank, (pid, count) in enumerate(top_debug, 1):
-            log_buffer.append(f"  Rank {rank:02d} | Count: {count} | PaperID: {pid}")
+            # 提取频次最高的 Top-20 论文用于分析
+            top_debug = stats.get_top_k(20)
+            for rank, (pid, count) in enumerate(top_debug, 1):
+                log_buffer.append(f"  Rank {rank:02d} | Count: {count} | PaperID: {pid}")
 
-        log_buffer.append("=" * 50 + "\n")
+            log_buffer.append("=" * 50 + "\n")
 
-        # 执行一次性日志输出
-        logger.info("\n".join(log_buffer))
-        # [DEBUG END]
+            # 执行一次性日志输出
+            logger.info("\n".join(log_buffer))
+            # [DEBUG END]
+            return hops
+
+        pipeline.add_stage("expand", expand_stage, deps=["seed_search"])
 
         # ------------------------------------------------------------------
         # Step 6: 深度阅读与智能评分
         # ------------------------------------------------------------------
-        # 1. 从全局统计中截取 Top-10 高频论文
-        # 2. 检查 Redis 缺失数据并自动补全
-        # 3. 调用大模型阅读摘要并进行多维度打分
-        await update_status("Step 6/7: 获取 Top-10 核心论文，进行 AI 深度阅读与评分...")
-        ranked_papers = self.ranking_agent.rank_papers()
+        # 1. 从会话统计中截取高频论文，经本地 BM25 相关性预筛选后保留 Top-N (RANKING_CANDIDATES)
+        # 2. 检查 Redis 缺失数据并自动补全（扩展期间已预取的论文直接命中）
+        # 3. 候选论文集合与缓存的报告一致时（检索数据未变化），跳过评分与报告生成
+        # 4. 分块并发调用大模型阅读摘要并进行多维度打分，合并后截取 RANKING_TOP_N 篇
+        async def candidates_stage(_hops, _stored):
+            # 预取失败不影响排序，缺失的详情会在排序时重新获取
+            await asyncio.gather(*prefetch_tasks, return_exceptions=True)
+            search_type, query_content, seed_papers = await pipeline.get("seed_search")
+
+            await update_status(f"Step 6/7: 获取 Top-{settings.RANKING_CANDIDATES} 核心论文，进行 AI 深度阅读与评分...")
+            # 按 ID 检索时检索式只是一个 ID，改用种子论文标题计算相关性
+            if search_type == "id":
+                relevance_query = " ".join(p.get("title") or "" for p in seed_papers)
+            else:
+                relevance_query = query_content
+            candidates = await self.ranking_agent.select_candidates(stats, relevance_query)
+            candidate_ids = [p["paperId"] for p in candidates if p.get("paperId")]
+
+            cached_report = None
+            if not refresh:
+                cached_report = await self.reporting_agent.get_cached_report(user_query, candidate_ids)
+                if cached_report:
+                    await update_status("候选论文与缓存的报告一致，复用已生成的调研报告。")
+            return candidates, candidate_ids, cached_report
+
+        pipeline.add_stage("candidates", candidates_stage, deps=["expand", "store_seeds"])
+
+        async def rank_stage(candidate_result):
+            candidates, _, cached_report = candidate_result
+            if cached_report:
+                return []
+            return await self.ranking_agent.rank_papers(stats, user_query, candidates=candidates)
+
+        pipeline.add_stage("rank", rank_stage, deps=["candidates"])
 
         # ------------------------------------------------------------------
         # Step 7: 调研报告生成 (Reporting)
         # ------------------------------------------------------------------
         # 将评分排序后的论文列表交给大模型，生成最终的 Markdown 深度综述报告
-        await update_status("Step 7/7: 正在生成深度调研报告...")
-        report = await self.reporting_agent.generate_report(user_query, ranked_papers)
+        async def report_stage(ranked_papers):
+            _, candidate_ids, cached_report = await pipeline.get("candidates")
+            if cached_report:
+                if token_callback:
+                    await token_callback(cached_report)
+                return cached_report
+
+            await update_status("Step 7/7: 正在生成深度调研报告...")
+            # 有论文未经 LLM 评分（评分失败后按引用数补位）时报告质量降级，不写入报告缓存，
+            # 避免快速路径在 REPORT_CACHE_TRUST_SECONDS 内直接返回降级的报告
+            if not all("ai_score" in p for p in ranked_papers):
+                logger.warning("Ranking fell back to citation order for some papers, report will not be cached.")
+                candidate_ids = None
+            if token_callback:
+                # 流式模式：边生成边推送到前端，同时拼接完整报告用于返回
+                report_chunks = []
+                async for chunk in self.reporting_agent.stream_report(user_query, ranked_papers, candidate_ids):
+                    report_chunks.append(chunk)
+                    await token_callback(chunk)
+                return "".join(report_chunks)
+            return await self.reporting_agent.generate_report(user_query, ranked_papers, candidate_ids)
+
+        pipeline.add_stage("report", report_stage, deps=["rank"])
 
-        return report
\ No newline at end of file
+        try:
+            # 整个工作流作为根 span，各阶段、API 调用、Redis 写入与 LLM 调用均记录在同一 trace 下
+            with span("workflow") as trace:
+                try:
+                    return await pipeline.run("report")
+                except SemanticScholarError as e:
+                    # 检索服务限流或不可用时明确告知用户，而不是误报为“未找到相关论文”
+                    trace.set_label(result="s2_unavailable")
+                    logger.error(f"Workflow aborted by Semantic Scholar error: {e}")
+                    raise WorkflowError("s2_unavailable", "论文检索服务暂时不可用（请求受限或上游故障），请稍后重试。") from e
+                except ReportGenerationError as e:
+                    trace.set_label(result="report_failed")
+                    raise WorkflowError("report_failed", str(e)) from e
+                except WorkflowError as e:
+                    trace.set_label(result=e.reason)
+                    raise
+                finally:
+                    for task in prefetch_tasks:
+                        task.cancel()
+                    # 输出各阶段耗时与关键路径
+                    logger.info(pipeline.format_timings("report"))
+                    if timing_callback:
+                        await timing_callback(dict(pipeline.timings))
+        finally:
+            # 配置了 METRICS_FILE 时刷新指标文件
+            telemetry.write_file()
\ No newline at end of file
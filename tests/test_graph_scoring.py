@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from utils.graph_scoring import CitationGraph, parse_weights, score_snapshot
+
+pytest.importorskip("scipy")
+
+
+def _graph(duplicate: bool = False) -> CitationGraph:
+    """
+    S 为种子：P1 同时引用 S 与 X（X 与 S 共被引），S 与 Q 都引用 R（Q 与 S 文献耦合）
+    """
+    graph = CitationGraph()
+    graph.add_seed("S")
+    graph.add_edges("S", references=["R"], citations=["P1"])
+    graph.add_edges("P1", references=["X"], citations=[])
+    graph.add_edges("Q", references=["R"], citations=[])
+    if duplicate:
+        graph.add_edges("P1", references=["X"], citations=[])
+    return graph
+
+
+def _scores(graph: CitationGraph, **weights) -> dict:
+    return dict(score_snapshot(*graph.snapshot(), weights=weights))
+
+
+def test_snapshot_edges():
+    nodes, seeds, src, dst = _graph().snapshot()
+    assert nodes == ["S", "R", "P1", "X", "Q"]
+    assert seeds == [0]
+    edges = {(nodes[s], nodes[d]) for s, d in zip(src, dst)}
+    assert edges == {("S", "R"), ("P1", "S"), ("P1", "X"), ("Q", "R")}
+
+
+def test_cocitation():
+    assert _scores(_graph(), cocitation=1.0) == {"S": 1.0, "X": 1.0}
+
+
+def test_coupling():
+    assert _scores(_graph(), coupling=1.0) == {"S": 1.0, "Q": 1.0}
+
+
+def test_duplicate_edges_are_merged():
+    assert _scores(_graph(duplicate=True), cocitation=1.0) == {"S": 1.0, "X": 1.0}
+
+
+def test_pagerank_favours_seed_neighbourhood():
+    scores = _scores(_graph(), pagerank=1.0)
+    assert set(scores) == {"S", "R", "P1", "X", "Q"}
+    assert scores["S"] == 1.0
+    # 与种子直接相连的论文高于两跳之外的论文
+    assert min(scores["R"], scores["P1"]) > max(scores["X"], scores["Q"])
+
+
+def test_pagerank_converged_ranking_starts_with_seed():
+    nodes, seeds, src, dst = _graph().snapshot()
+    ranked = score_snapshot(nodes, seeds, src, dst, weights={"pagerank": 1.0}, tol=1e-12, max_iter=500)
+    assert [pid for pid, _ in ranked][0] == "S"
+    assert all(score > 0 for _, score in ranked)
+
+
+def test_combined_weights_and_top_k():
+    graph = _graph()
+    combined = _scores(graph, cocitation=0.5, coupling=0.5)
+    assert combined == pytest.approx({"S": 1.0, "X": 0.5, "Q": 0.5})
+    top = score_snapshot(*graph.snapshot(), weights={"cocitation": 0.5, "coupling": 0.5}, top_k=1)
+    assert top == [("S", 1.0)]
+
+
+def test_empty_inputs():
+    assert score_snapshot([], [], np.array([], dtype=np.int32), np.array([], dtype=np.int32), {"pagerank": 1}) == []
+    graph = CitationGraph()
+    graph.add_edges("A", ["B"], [])
+    assert score_snapshot(*graph.snapshot(), weights={"pagerank": 1.0}) == []
+
+
+def test_parse_weights():
+    assert parse_weights("pagerank:0.6, cocitation:0.2,coupling") == {"pagerank": 0.6, "cocitation": 0.2, "coupling": 1.0}
\ No newline at end of file
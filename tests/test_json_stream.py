@@ -0,0 +1,86 @@
+import asyncio
+import json
+import random
+
+import pytest
+
+from utils.json_stream import iter_array_items
+
+DOCUMENTS = [
+    [],
+    [1],
+    [1.5e10, -0.25, 0, 12345678901234567890, 1e-7],
+    [True, False, None, "", "é中文☃", "escaped \" \\ quote"],
+    [{"paperId": "a" * 40, "citations": [{"paperId": str(i)} for i in range(50)]}, None, [1, [2, [3]]]],
+    [{"nested": {"numbers": [1.0, 2e3, -3], "text": "ends with ]"}}, "[not a container]"],
+]
+
+
+def _split(data: bytes, sizes):
+    chunks, pos = [], 0
+    for size in sizes:
+        if pos >= len(data):
+            break
+        chunks.append(data[pos:pos + size])
+        pos += size
+    if pos < len(data):
+        chunks.append(data[pos:])
+    return chunks
+
+
+def _collect(chunks):
+    async def gen():
+        for chunk in chunks:
+            yield chunk
+
+    async def run():
+        return [item async for item in iter_array_items(gen())]
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("document", DOCUMENTS)
+@pytest.mark.parametrize("separators", [(",", ":"), (", ", ": ")])
+def test_byte_at_a_time_round_trip(document, separators):
+    raw = json.dumps(document, ensure_ascii=False, separators=separators).encode("utf-8")
+    assert _collect([raw[i:i + 1] for i in range(len(raw))]) == document
+
+
+@pytest.mark.parametrize("document", DOCUMENTS)
+def test_random_split_round_trip(document):
+    raw = json.dumps(document, ensure_ascii=False, indent=1).encode("utf-8")
+    rng = random.Random(len(raw))
+    for _ in range(50):
+        sizes = [rng.randint(1, 16) for _ in range(len(raw))]
+        assert _collect(_split(raw, sizes)) == document
+
+
+def test_single_chunk_round_trip():
+    document = DOCUMENTS[-2]
+    assert _collect([json.dumps(document).encode("utf-8")]) == document
+
+
+def test_number_split_at_chunk_boundary():
+    assert _collect([b"[1", b".", b"5", b"e", b"1", b"0", b"]"]) == [1.5e10]
+    assert _collect([b"[12", b"3, 4", b"5]"]) == [123, 45]
+
+
+def test_object_body_yields_data_items():
+    assert _collect([b'  {"da', b'ta": [1, 2]}']) == [1, 2]
+
+
+@pytest.mark.parametrize("raw", [
+    b"[1 2]",
+    b'[{"a": 1} {"b": 2}]',
+    b"[1,]",
+    b"[,1]",
+    b"[1.]",
+    b"[1.5",
+    b'[{"a": 1}',
+    b"",
+    b"1",
+])
+def test_invalid_documents_raise(raw):
+    for chunks in ([raw], [raw[i:i + 1] for i in range(len(raw))]):
+        with pytest.raises(json.JSONDecodeError):
+            _collect(chunks)
\ No newline at end of file
@@ -0,0 +1,71 @@
+from utils.paper_stats import PaperStats
+
+
+def _buckets_consistent(stats: PaperStats) -> bool:
+    rebuilt = {}
+    for paper_id, count in stats.stats.items():
+        rebuilt.setdefault(count, set()).add(paper_id)
+    return {count: set(bucket) for count, bucket in stats._buckets.items()} == rebuilt
+
+
+def test_increment_many_matches_repeated_increment_count():
+    ids = ["a", "b", "a", "c", "a", "b", "", None]
+    batched, single = PaperStats(), PaperStats()
+    batched.increment_many(ids)
+    for paper_id in ids:
+        if paper_id:
+            single.increment_count(paper_id)
+    assert batched.stats == single.stats == {"a": 3, "b": 2, "c": 1}
+    assert _buckets_consistent(batched)
+
+
+def test_increment_many_amount():
+    stats = PaperStats()
+    stats.increment_many(["a", "a", "b"], amount=3)
+    assert stats.stats == {"a": 6, "b": 3}
+
+
+def test_buckets_follow_count_changes():
+    stats = PaperStats()
+    stats.increment_count("a")
+    stats.increment_count("b")
+    stats.set_initial_count("a")
+    stats.increment_many(["b", "b", "c"])
+    assert stats.stats == {"a": 3, "b": 3, "c": 1}
+    assert _buckets_consistent(stats)
+    # 频次变化后旧的空桶被移除
+    assert set(stats._buckets) == {1, 3}
+
+
+def test_get_top_k_orders_by_count_then_arrival():
+    stats = PaperStats()
+    stats.increment_many(["x", "y", "y", "z", "z"])
+    stats.set_initial_count("seed")
+    # 同频次按到达该频次的先后排列
+    assert stats.get_top_k(3) == [("y", 2), ("z", 2), ("seed", 2)]
+    assert stats.get_top_k(10) == [("y", 2), ("z", 2), ("seed", 2), ("x", 1)]
+    assert stats.get_top_k(0) == []
+
+
+def test_get_top_k_with_sparse_counts():
+    stats = PaperStats()
+    stats.increment_many(["hub"] * 5000)
+    stats.increment_many(["a", "b"])
+    assert stats.get_top_k(2) == [("hub", 5000), ("a", 1)]
+
+
+def test_add_edges_records_graph_and_counts():
+    stats = PaperStats(record_graph=True)
+    stats.set_initial_count("s")
+    stats.add_edges("s", references=["r1", "r2"], citations=["c1", "r1"])
+    assert stats.stats == {"s": 2, "r1": 2, "r2": 1, "c1": 1}
+    assert len(stats.graph) == 4
+
+
+def test_clear():
+    stats = PaperStats(record_graph=True)
+    stats.add_edges("s", ["r"], [])
+    stats.clear()
+    assert len(stats) == 0
+    assert stats.get_top_k(5) == []
+    assert len(stats.graph) == 0
\ No newline at end of file
@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from utils.prompt_packer import PromptPacker, allocate, drop_empty, estimate_tokens, key_sentences
+
+
+def _abstract(topic: str, sentences: int) -> str:
+    return " ".join(f"Sentence {i} studies {topic} with method number {i} on benchmark data." for i in range(sentences))
+
+
+def _render(paper, abstract):
+    return json.dumps({"paperId": paper["paperId"], "title": paper["title"], "abstract": abstract})
+
+
+PAPERS = [{"paperId": f"p{i}", "title": f"Paper {i}", "abstract": _abstract("graph reasoning", 20)} for i in range(6)]
+
+
+def test_allocate_water_filling():
+    # 第一篇只需要 10，剩余预算在另外两篇之间平分
+    assert allocate([10, 100, 100], [1, 1, 1], 150) == [10, 70, 70]
+    # 预算充足时全部满足
+    assert allocate([10, 20, 30], [3, 2, 1], 1000) == [10, 20, 30]
+    # 权重越高分到的越多
+    high, low = allocate([100, 100], [2, 1], 90)
+    assert high == 60 and low == 30
+
+
+def test_allocate_never_exceeds_budget_or_need():
+    needs, weights = [5, 80, 0, 40, 300], [1, 0.7, 0.6, 0.5, 0.4]
+    for available in (0, 10, 100, 200, 1000):
+        allot = allocate(needs, weights, available)
+        assert sum(allot) <= available
+        assert all(0 <= a <= need for a, need in zip(allot, needs))
+    assert allocate(needs, weights, -5) == [0] * len(needs)
+
+
+def test_key_sentences_respects_budget_and_keeps_order():
+    text = "Intro about transformers. Unrelated cooking tips here. Graph reasoning results improve. Closing remarks."
+    for budget in (8, 12, 16, 20):
+        packed = key_sentences(text, "graph reasoning", budget)
+        assert estimate_tokens(packed) <= budget
+        assert "Graph reasoning results improve." in packed
+    # 首句加分后与相关句一起保留，并按原文顺序拼接
+    assert key_sentences(text, "graph reasoning", 16) == "Intro about transformers. Graph reasoning results improve."
+    assert key_sentences("short text", "q", 100) == "short text"
+    assert key_sentences(text, "q", 0) == ""
+
+
+@pytest.mark.parametrize("budget", [400, 800, 1500])
+def test_pack_stays_within_budget(budget):
+    packer = PromptPacker(budget, min_abstract_tokens=10, decay=0.5)
+    blocks, stats = packer.pack(PAPERS, "graph reasoning", _render, overhead="system prompt")
+    assert len(blocks) == len(PAPERS)
+    assert stats["tokens"] <= budget
+    assert stats["abstract_tokens"] < stats["original_abstract_tokens"]
+    kept = [estimate_tokens(json.loads(block)["abstract"]) for block in blocks]
+    # 排名靠前的论文保留的摘要不少于靠后的论文
+    assert kept == sorted(kept, reverse=True)
+
+
+def test_pack_keeps_abstracts_when_budget_allows():
+    blocks, stats = PromptPacker(100000).pack(PAPERS, "graph reasoning", _render)
+    assert [json.loads(block)["abstract"] for block in blocks] == [p["abstract"] for p in PAPERS]
+    assert stats["abstract_tokens"] == stats["original_abstract_tokens"]
+
+
+def test_pack_gives_min_abstract_tokens_when_budget_exhausted():
+    blocks, _ = PromptPacker(10, min_abstract_tokens=15).pack(PAPERS[:2], "graph reasoning", _render)
+    for block in blocks:
+        abstract = json.loads(block)["abstract"]
+        assert 0 < estimate_tokens(abstract) <= 15
+
+
+def test_drop_empty():
+    assert drop_empty({"a": 1, "b": None, "c": "", "d": [], "e": {}, "f": 0}) == {"a": 1, "f": 0}
\ No newline at end of file
@@ -0,0 +1,108 @@
+import pytest
+
+from utils import resilience
+from utils.resilience import CircuitBreaker, CircuitOpenError, TokenBucket, backoff_delay, parse_retry_after
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(resilience.time, "monotonic", fake)
+    return fake
+
+
+def test_token_bucket_allows_burst_then_spaces_requests(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+    assert [bucket._reserve() for _ in range(3)] == [0, 0, 0]
+    # 令牌耗尽后每个请求按 1 / rate 排队
+    assert bucket._reserve() == pytest.approx(0.5)
+    assert bucket._reserve() == pytest.approx(1.0)
+    clock.now += 10
+    # 补充的令牌不超过 capacity
+    assert [bucket._reserve() for _ in range(3)] == [0, 0, 0]
+    assert bucket._reserve() == pytest.approx(0.5)
+
+
+def test_token_bucket_pause(clock):
+    bucket = TokenBucket(rate=100, capacity=10)
+    bucket.pause(5)
+    assert bucket._reserve() == pytest.approx(5)
+    clock.now += 5
+    assert bucket._reserve() == 0
+
+
+def test_circuit_opens_after_threshold(clock):
+    breaker = CircuitBreaker("test", failure_threshold=3, recovery_timeout=30)
+    for _ in range(2):
+        breaker.record_failure()
+        breaker.before_call()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and breaker.is_open
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_success_resets_failure_count(clock):
+    breaker = CircuitBreaker("test", failure_threshold=2, recovery_timeout=30)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_allows_single_probe(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.before_call()  # 探测请求
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    # 探测请求长时间无结果时允许重新探测
+    clock.now += 30
+    breaker.before_call()
+
+
+def test_half_open_probe_success_closes(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+
+
+def test_half_open_probe_failure_reopens(clock):
+    breaker = CircuitBreaker("test", failure_threshold=3, recovery_timeout=30)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 30
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 29
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_backoff_delay_is_capped():
+    for attempt in range(10):
+        assert 0 <= backoff_delay(attempt, base=0.5, cap=4) <= min(4, 0.5 * 2 ** attempt)
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("7") == 7
+    assert parse_retry_after(" -3 ") == 0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
\ No newline at end of file
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from utils.single_flight import SingleFlight, make_key
+
+
+def test_make_key_ignores_dict_order():
+    assert make_key("ns", {"a": 1, "b": 2}) == make_key("ns", {"b": 2, "a": 1})
+    assert make_key("ns", {"a": 1}) != make_key("other", {"a": 1})
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight("test")
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"value": 42}
+
+    async def run():
+        results = await asyncio.gather(*(flight.do("k", work) for _ in range(5)))
+        # 完成后不再保留进行中的调用，下一次调用重新执行
+        await flight.do("k", work)
+        return results
+
+    results = asyncio.run(run())
+    assert calls == 2
+    assert all(result is results[0] for result in results)
+
+
+def test_exception_is_shared():
+    flight = SingleFlight("test")
+    calls = 0
+
+    async def fail():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def run():
+        return await asyncio.gather(*(flight.do("k", fail) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert calls == 1
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_cancelling_one_waiter_keeps_task_for_others():
+    flight = SingleFlight("test")
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def run():
+        first = asyncio.create_task(flight.do("k", work))
+        second = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == "done"
+
+
+def test_cancelling_all_waiters_cancels_task():
+    flight = SingleFlight("test")
+    state = {}
+
+    async def work():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            state["cancelled"] = True
+            raise
+
+    async def run():
+        waiters = [asyncio.create_task(flight.do("k", work)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0)
+        return flight._loop_flights()
+
+    flights = asyncio.run(run())
+    assert state.get("cancelled")
+    assert flights == {}
\ No newline at end of file
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from config.settings import settings
+from tools.semantic_tools import SemanticScholarAPI, SemanticScholarError, response_archive
+from utils.telemetry import telemetry
+
+
+@pytest.fixture
+def fake_batch(monkeypatch):
+    """模拟流式 /batch：ID 以 "missing" 开头时返回 null，分片中出现 "boom" 时在该位置中断"""
+    monkeypatch.setattr(settings, "BATCH_CHUNK_SIZE", 2)
+    monkeypatch.setattr(settings, "METRICS_ENABLED", True)
+    monkeypatch.setattr(response_archive, "enabled", False)
+    telemetry.reset()
+
+    async def fake_request(method, endpoint, params=None, payload=None, on_item=None):
+        for index, pid in enumerate(payload["ids"]):
+            if pid.startswith("boom"):
+                raise SemanticScholarError("stream failed")
+            await on_item(index, None if pid.startswith("missing") else {"paperId": pid})
+        return len(payload["ids"])
+
+    monkeypatch.setattr(SemanticScholarAPI, "_request", staticmethod(fake_request))
+    yield
+    telemetry.reset()
+
+
+def _stream(paper_ids):
+    received = []
+
+    async def on_paper(paper):
+        received.append(paper["paperId"])
+
+    delivered = asyncio.run(SemanticScholarAPI.stream_batch_details(paper_ids, on_paper))
+    return delivered, received
+
+
+def _missing_counters():
+    return {dict(key)["reason"]: value
+            for key, value in telemetry._counters.get("s2_stream_missing_papers_total", {}).items()}
+
+
+def test_partial_chunk_failure_is_counted(fake_batch):
+    delivered, received = _stream(["a", "boom1", "b", "missing1", "c", "d"])
+    assert delivered == 4
+    assert received == ["a", "b", "c", "d"]
+    assert _missing_counters() == {"failed": 1, "not_found": 1}
+
+
+def test_complete_hop_records_no_missing_papers(fake_batch):
+    delivered, received = _stream(["a", "b", "c"])
+    assert delivered == 3
+    assert _missing_counters() == {}
+
+
+def test_all_chunks_failing_raises(fake_batch):
+    with pytest.raises(SemanticScholarError):
+        _stream(["boom1", "boom2"])
+    assert _missing_counters() == {"failed": 2}
\ No newline at end of file
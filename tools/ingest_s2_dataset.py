@@ -0,0 +1,136 @@
+"""
+将 Semantic Scholar 数据集 (https://api.semanticscholar.org/datasets) 的 gzip JSONL 分片导入本地论文库 (LocalCorpus)。
+逐行流式解压与解析，按 INGEST_BATCH_SIZE 条一个事务批量写入，内存占用与文件大小无关；
+每个事务同时记录该文件已处理的行数，中断后重新运行同一命令会跳过已导入的行继续导入。
+
+建议导入顺序：papers -> abstracts -> citations（摘要只会更新已导入的论文）。
+
+用法：python tools/ingest_s2_dataset.py papers "dumps/papers/*.gz" abstracts "dumps/abstracts/*.gz"
+      python tools/ingest_s2_dataset.py --dataset citations "dumps/citations/*.gz"
+"""
+import argparse
+import glob
+import gzip
+import io
+import itertools
+import json
+import os
+import sys
+import time
+from typing import Dict, Iterator, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import settings
+from utils.local_corpus import LocalCorpus
+from utils.logger import setup_logger
+
+logger = setup_logger("ingest_s2_dataset")
+
+DATASETS = ("papers", "abstracts", "citations")
+
+
+def open_dump(path: str) -> io.TextIOBase:
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def detect_dataset(record: Dict) -> str:
+    """根据记录的字段判断数据集类型"""
+    if "citingcorpusid" in record:
+        return "citations"
+    if "abstract" in record and "title" not in record:
+        return "abstracts"
+    return "papers"
+
+
+def _records(lines: Iterator[str]) -> Iterator[Dict]:
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            logger.warning(f"Skip malformed line: {e}")
+
+
+def ingest_file(corpus: LocalCorpus, path: str, dataset: str = "auto", batch_size: int = 5000,
+                restart: bool = False) -> int:
+    """
+    导入单个分片文件，返回本次写入的记录数。
+    已完整导入的文件直接跳过（restart=True 时从头重新导入）。
+    """
+    key = os.path.abspath(path)
+    done_lines, done = (0, False) if restart else corpus.get_progress(key)
+    if done:
+        logger.info(f"Skip {path}: already ingested ({done_lines} lines).")
+        return 0
+
+    conn = corpus.connect()
+    writers = {"papers": corpus.write_papers, "abstracts": corpus.write_abstracts, "citations": corpus.write_citations}
+    written, lines = 0, done_lines
+    start = time.monotonic()
+
+    with open_dump(path) as f:
+        # gzip 无法随机定位，续传时流式跳过已导入的行
+        remaining = itertools.islice(f, done_lines, None)
+        if done_lines:
+            logger.info(f"Resuming {path} from line {done_lines}.")
+        while True:
+            batch = list(itertools.islice(remaining, batch_size))
+            if not batch:
+                break
+            records = list(_records(batch))
+            if dataset == "auto" and records:
+                dataset = detect_dataset(records[0])
+                logger.info(f"Detected dataset type '{dataset}' for {path}")
+            lines += len(batch)
+            # 数据与断点在同一事务中提交，保证续传位置与已写入数据一致
+            with conn:
+                if records:
+                    written += writers[dataset](conn, records)
+                corpus.set_progress(conn, key, lines)
+            logger.info(f"{os.path.basename(path)}: {lines} lines, {written} written, "
+                        f"{lines / max(time.monotonic() - start, 1e-9):.0f} lines/s")
+
+    with conn:
+        corpus.set_progress(conn, key, lines, done=True)
+    return written
+
+
+def expand_inputs(items: List[str], default_dataset: str) -> List[tuple]:
+    """解析命令行参数：数据集名称之后的路径（glob）都归属于该数据集"""
+    dataset, inputs = default_dataset, []
+    for item in items:
+        if item in DATASETS:
+            dataset = item
+            continue
+        paths = sorted(glob.glob(item)) or [item]
+        inputs.extend((dataset, path) for path in paths)
+    return inputs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest Semantic Scholar dataset dumps into the local corpus")
+    parser.add_argument("inputs", nargs="+", help="数据集名称 (papers/abstracts/citations) 与文件路径或 glob 模式")
+    parser.add_argument("--dataset", choices=DATASETS + ("auto",), default="auto",
+                        help="未指定数据集名称时使用的类型，auto 根据首条记录判断")
+    parser.add_argument("--db", default=settings.LOCAL_CORPUS_PATH, help="本地论文库路径")
+    parser.add_argument("--batch-size", type=int, default=settings.INGEST_BATCH_SIZE)
+    parser.add_argument("--restart", action="store_true", help="忽略断点，从头重新导入")
+    args = parser.parse_args(argv)
+
+    corpus = LocalCorpus(args.db)
+    total = 0
+    for dataset, path in expand_inputs(args.inputs, args.dataset):
+        if not os.path.exists(path):
+            logger.error(f"Input not found: {path}")
+            continue
+        total += ingest_file(corpus, path, dataset, args.batch_size, args.restart)
+    logger.info(f"Ingestion finished: {total} records written to {args.db}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,41 @@
+import asyncio
+from typing import Dict, List
+from utils.local_corpus import LocalCorpus, local_corpus
+from utils.telemetry import span
+from utils.logger import setup_logger
+
+logger = setup_logger("local_corpus_tools")
+
+
+class LocalCorpusProvider:
+    """
+    基于本地导入语料 (LocalCorpus) 的检索实现，接口与 SemanticScholarAPI 对应，
+    RETRIEVAL_PROVIDER=local 时由 RetrievalAgent 使用，不再请求 ai4scholar。
+    SQLite 查询在线程中执行，避免阻塞事件循环。
+    """
+
+    def __init__(self, corpus: LocalCorpus = local_corpus):
+        self.corpus = corpus
+
+    async def search_papers(self, query: str, limit: int = 10, offset: int = 0) -> List[Dict]:
+        with span("local_corpus", op="search") as s:
+            papers = await asyncio.to_thread(self.corpus.search, query, limit, offset)
+            s.record(items=len(papers))
+        logger.info(f"Local corpus search returned {len(papers)} papers for: {query}")
+        return papers
+
+    async def match_title(self, title: str) -> Dict:
+        with span("local_corpus", op="match"):
+            paper = await asyncio.to_thread(self.corpus.match_title, title)
+        return paper or {}
+
+    async def get_batch_details(self, paper_ids: List[str], include_edges: bool = True) -> List[Dict]:
+        paper_ids = list(dict.fromkeys(pid for pid in paper_ids if pid))
+        if not paper_ids:
+            return []
+        with span("local_corpus", op="batch") as s:
+            papers = await asyncio.to_thread(self.corpus.get_papers, paper_ids, include_edges)
+            s.record(items=len(papers))
+        if len(papers) < len(paper_ids):
+            logger.info(f"Local corpus found {len(papers)}/{len(paper_ids)} requested papers")
+        return papers
\ No newline at end of file
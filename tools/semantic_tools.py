@@ -1,18 +1,160 @@
+import asyncio
+import datetime
+import hashlib
+import heapq
 import json
-from typing import List, Dict
-import os
-import time
-import requests
+import math
+import random
+from typing import List, Dict, Optional, Any, Tuple, Set, Callable, Awaitable
+import httpx
 from langchain_core.tools import tool
 
 from config.settings import settings
+from utils.http_client import get_async_client
+from utils.redis_client import get_async_redis
+from utils.response_archive import response_archive
+from utils.concurrency import s2_limiter
+from utils.json_stream import iter_array_items
+from utils.single_flight import SingleFlight, make_key
+from utils.telemetry import span, telemetry
+from utils.resilience import TokenBucket, CircuitBreaker, CircuitOpenError, backoff_delay, parse_retry_after
 from utils.logger import setup_logger
 
 logger = setup_logger("semantic_tools")
 
+# 检索接口返回的基础字段
+SEARCH_FIELDS = "title,authors,year,abstract,citationCount,venue,openAccessPdf,url,referenceCount,influentialCitationCount,publicationDate"
+# 批量详情接口额外请求引用和被引用字段
+BATCH_FIELDS = SEARCH_FIELDS + ",citations,references"
+# bounded 扩展模式：引用列表字段、对应的计数字段，以及分页接口条目中论文所在的键
+EDGE_FIELDS = ("citations", "references")
+_EDGE_COUNT_KEYS = {"citations": "citationCount", "references": "referenceCount"}
+_EDGE_ITEM_KEYS = {"citations": "citingPaper", "references": "citedPaper"}
+# /{paper_id}/citations|references 单页最大条数
+EDGE_PAGE_LIMIT = 1000
+
+# 上游过载或暂时不可用时可重试的状态码（429 单独处理：不计入熔断失败）
+_RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# 进程内共享的限流器与熔断器：所有会话的 ai4scholar 请求共用 API Key 配额
+_rate_limiter = TokenBucket(settings.S2_RATE_LIMIT, settings.S2_RATE_BURST)
+_circuit_breaker = CircuitBreaker("semantic_scholar", settings.S2_BREAKER_THRESHOLD, settings.S2_BREAKER_RECOVERY)
+# 多个会话同时发起相同的请求（以规范化后的请求参数为 Key）时只向上游发送一次
+_flight = SingleFlight("semantic_scholar")
+
+
+class SemanticScholarError(Exception):
+    """ai4scholar 请求最终失败（重试耗尽、熔断或不可重试的错误），与“未找到论文”区分开"""
+
+
+def sample_edges(paper_id: str, field: str, items: List[Dict], cap: int, half_life: float = 0.0,
+                 current_year: Optional[int] = None) -> List[Dict]:
+    """
+    将引用列表截断到 cap 条。
+    half_life <= 0 时按接口返回顺序截取；否则按权重 0.5 ** (论文年龄 / half_life) 做不放回加权抽样
+    (Efraimidis-Spirakis)，越新的论文越容易被保留，缺少年份的论文按 2 个半衰期计算。
+    随机数以 (论文ID, 字段) 为种子，同一输入的抽样结果固定，保留原列表中的相对顺序。
+    """
+    if len(items) <= cap:
+        return items
+    if half_life <= 0:
+        return items[:cap]
+    current_year = current_year or datetime.date.today().year
+    rng = random.Random(f"{paper_id}:{field}")
+    keyed = []
+    for index, item in enumerate(items):
+        year = item.get("year")
+        age = max(0, current_year - year) if isinstance(year, int) else 2 * half_life
+        weight = max(0.5 ** (age / half_life), 1e-12)
+        keyed.append((math.log(1.0 - rng.random()) / weight, index))
+    keep = sorted(index for _, index in heapq.nlargest(cap, keyed))
+    return [items[index] for index in keep]
+
+
+class SemanticScholarCache:
+    """
+    Semantic Scholar 响应的 Redis 读穿缓存。
+    - 检索类请求 (/search, /search/match) 以规范化后的查询参数为 Key；
+    - 批量详情 (/batch) 以「字段集合 + 论文ID」为 Key 逐篇缓存，批量请求可部分命中缓存。
+    Redis 不可用时只记录日志，不影响正常请求。
+    """
+    KEY_PREFIX = "s2cache"
+
+    @staticmethod
+    def _digest(text: str) -> str:
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """规范化查询：忽略大小写与多余空白"""
+        return " ".join((query or "").lower().split())
+
+    @classmethod
+    def request_key(cls, endpoint: str, params: Dict[str, Any]) -> str:
+        normalized = {k: cls.normalize_query(v) if k == "query" else v for k, v in params.items()}
+        raw = json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+        return f"{cls.KEY_PREFIX}:{endpoint}:{cls._digest(raw)}"
+
+    @classmethod
+    def paper_key(cls, fields: str, paper_id: str) -> str:
+        return f"{cls.KEY_PREFIX}:paper:{cls._digest(fields)[:12]}:{paper_id}"
+
+    @staticmethod
+    async def get_json(key: str) -> Optional[Any]:
+        if not settings.S2_CACHE_ENABLED:
+            return None
+        try:
+            raw = await get_async_redis().get(key)
+        except Exception as e:
+            logger.error(f"S2 cache read error: {e}")
+            return None
+        # Key 形如 s2cache:{endpoint}:{digest}，按接口统计命中率
+        telemetry.cache_result(f"s2_{key.split(':')[1]}", hits=int(bool(raw)), misses=int(not raw))
+        return json.loads(raw) if raw else None
+
+    @staticmethod
+    async def set_json(key: str, value: Any, ttl: int):
+        if not settings.S2_CACHE_ENABLED:
+            return
+        try:
+            await get_async_redis().set(key, json.dumps(value, ensure_ascii=False), ex=ttl)
+        except Exception as e:
+            logger.error(f"S2 cache write error: {e}")
+
+    @classmethod
+    async def get_papers(cls, fields: str, paper_ids: List[str]) -> Dict[str, Dict]:
+        """批量读取论文缓存，返回命中的 {paper_id: paper}"""
+        if not settings.S2_CACHE_ENABLED or not paper_ids:
+            return {}
+        try:
+            raws = await get_async_redis().mget([cls.paper_key(fields, pid) for pid in paper_ids])
+        except Exception as e:
+            logger.error(f"S2 cache read error: {e}")
+            return {}
+        papers = {pid: json.loads(raw) for pid, raw in zip(paper_ids, raws) if raw}
+        telemetry.cache_result("s2_paper", hits=len(papers), misses=len(paper_ids) - len(papers))
+        return papers
+
+    @classmethod
+    async def set_papers(cls, fields: str, papers: Dict[str, Dict]):
+        """按请求时使用的论文ID逐篇写入缓存"""
+        if not settings.S2_CACHE_ENABLED or not papers:
+            return
+        try:
+            with span("redis_pipeline", op="s2_cache_papers") as trace:
+                pipeline = get_async_redis().pipeline(transaction=False)
+                for pid, paper in papers.items():
+                    value = json.dumps(paper, ensure_ascii=False)
+                    pipeline.set(cls.paper_key(fields, pid), value, ex=settings.S2_CACHE_PAPER_TTL)
+                    trace.record(payload_bytes=len(value))
+                trace.record(commands=len(papers))
+                await pipeline.execute()
+        except Exception as e:
+            logger.error(f"S2 cache write error: {e}")
+
 
 class SemanticScholarAPI:
-    """可以直接调用的内部帮助类，处理 HTTP 请求"""
+    """可以直接调用的内部帮助类，处理 HTTP 请求（请求失败时抛出 SemanticScholarError）"""
 
     @staticmethod
     def _get_headers():
@@ -26,92 +168,438 @@ class SemanticScholarAPI:
         return headers
 
     @staticmethod
-    def search_papers(query: str, limit: int = 10, offset: int = 0) -> List[Dict]:
-        url = f"{settings.API_BASE_URL}/search"
+    async def _request(method: str, endpoint: str, params: Optional[Dict] = None,
+                       payload: Optional[Dict] = None, metric_endpoint: Optional[str] = None,
+                       on_item: Optional[Callable[[int, Any], Awaitable[None]]] = None) -> Optional[Any]:
+        """
+        发送一次 ai4scholar 请求并返回解析后的 JSON；404 (未找到) 返回 None。
+        - 每次尝试前从共享令牌桶获取令牌；
+        - 429 / 5xx / 网络错误按指数退避 + 抖动重试，响应带 Retry-After 时至少等待该时长，
+          429 还会暂停令牌桶，让其它并发请求一起退避；
+        - 5xx / 网络错误计入熔断器，熔断打开期间直接失败。
+        重试耗尽或遇到不可重试的错误时抛出 SemanticScholarError。
+        metric_endpoint: 指标中使用的接口名（路径含论文ID时传入模板，避免标签基数过大），默认为 endpoint
+        on_item: 传入时以流式方式读取响应体（顶层须为 JSON 数组），每解析出一个元素即调用 on_item(index, item)，
+                 返回元素个数；开始读取响应体后的网络或解析错误不再重试（部分元素已被处理），直接抛出 SemanticScholarError
+        """
+        url = f"{settings.API_BASE_URL}{endpoint}"
+        metric_endpoint = metric_endpoint or endpoint
+        try:
+            _circuit_breaker.before_call()
+        except CircuitOpenError as e:
+            raise SemanticScholarError(f"Semantic Scholar is unavailable ({e})") from e
+
+        # 每次请求（含重试）记录为一个 span：耗时、尝试次数、响应体大小与最终状态码
+        with span("s2_request", endpoint=metric_endpoint) as trace:
+            max_retries = max(0, settings.S2_MAX_RETRIES)
+            last_error = ""
+            for attempt in range(max_retries + 1):
+                await _rate_limiter.acquire()
+                retry_after = None
+                throttled = False
+                try:
+                    client = get_async_client()
+                    async with s2_limiter:
+                        if on_item is None:
+                            response = await client.request(method, url, params=params, json=payload,
+                                                            headers=SemanticScholarAPI._get_headers())
+                        else:
+                            request = client.build_request(method, url, params=params, json=payload,
+                                                           headers=SemanticScholarAPI._get_headers())
+                            response = await client.send(request, stream=True)
+                            if response.status_code == 200:
+                                _circuit_breaker.record_success()
+                                trace.set_label(http_status=200)
+                                trace.record(attempts=1)
+                                try:
+                                    return await SemanticScholarAPI._consume_stream(endpoint, response, on_item, trace)
+                                finally:
+                                    await response.aclose()
+                            await response.aread()
+                    trace.record(attempts=1, response_bytes=len(response.content))
+                except httpx.TransportError as e:
+                    trace.record(attempts=1)
+                    last_error = f"{type(e).__name__}: {e}"
+                    _circuit_breaker.record_failure()
+                else:
+                    status = response.status_code
+                    trace.set_label(http_status=status)
+                    if status not in _RETRYABLE_STATUS:
+                        _circuit_breaker.record_success()
+                        if status == 404:
+                            return None
+                        if status >= 400:
+                            raise SemanticScholarError(f"Semantic Scholar {endpoint} returned HTTP {status}: {response.text[:200]}")
+                        try:
+                            return response.json()
+                        except ValueError as e:
+                            raise SemanticScholarError(f"Invalid JSON from Semantic Scholar {endpoint}: {e}") from e
+
+                    last_error = f"HTTP {status}"
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    throttled = status == 429
+                    if throttled:
+                        # 配额限流说明上游可用，不计入熔断失败
+                        _circuit_breaker.record_success()
+                    else:
+                        _circuit_breaker.record_failure()
+
+                if attempt >= max_retries or _circuit_breaker.is_open:
+                    break
+                delay = backoff_delay(attempt, settings.S2_BACKOFF_BASE, settings.S2_BACKOFF_MAX)
+                if retry_after is not None:
+                    if retry_after > settings.S2_BACKOFF_MAX:
+                        logger.warning(f"S2 {endpoint} asked to retry after {retry_after:.0f}s, giving up.")
+                        break
+                    delay = max(delay, retry_after)
+                    if throttled:
+                        _rate_limiter.pause(retry_after)
+                telemetry.inc("s2_retries_total", endpoint=metric_endpoint, reason="throttled" if throttled else "error")
+                logger.warning(f"S2 {endpoint} request failed ({last_error}), retrying in {delay:.1f}s "
+                               f"(attempt {attempt + 1}/{max_retries})")
+                await asyncio.sleep(delay)
+
+            raise SemanticScholarError(f"Semantic Scholar {endpoint} request failed: {last_error}")
+
+    @staticmethod
+    async def _consume_stream(endpoint: str, response: httpx.Response,
+                              on_item: Callable[[int, Any], Awaitable[None]], trace) -> int:
+        """增量解析流式响应体中的 JSON 数组，逐个元素交给 on_item 处理，返回元素个数"""
+        received = 0
+
+        async def chunks():
+            nonlocal received
+            async for chunk in response.aiter_bytes():
+                received += len(chunk)
+                yield chunk
+
+        items = iter_array_items(chunks())
+        count = 0
+        try:
+            while True:
+                # 只有读取与解析响应体的错误视为上游失败；on_item 自身抛出的异常原样向上抛出
+                try:
+                    item = await items.__anext__()
+                except StopAsyncIteration:
+                    break
+                except (httpx.TransportError, json.JSONDecodeError) as e:
+                    raise SemanticScholarError(f"Semantic Scholar {endpoint} stream failed after {count} items: "
+                                               f"{type(e).__name__}: {e}") from e
+                await on_item(count, item)
+                count += 1
+        finally:
+            await items.aclose()
+            trace.record(response_bytes=received)
+        return count
+
+    @staticmethod
+    async def search_papers(query: str, limit: int = 10, offset: int = 0) -> List[Dict]:
         params = {
             "query": query,
             "limit": limit,
             "offset": offset,
             # 根据需求文档返回示例，通常不需要额外指定fields，但为了保险起见，
             # 若API支持，最好指定需要 abstract, title, year, citationCount 等
-            "fields": "title,authors,year,abstract,citationCount,venue,openAccessPdf,url,referenceCount,influentialCitationCount,publicationDate"
+            "fields": SEARCH_FIELDS
         }
-        try:
-            response = requests.get(url, params=params, headers=SemanticScholarAPI._get_headers())
-            response.raise_for_status()
-            data = response.json()
 
-            # 将搜索结果保存到 JSON 文件
-            try:
-                if not os.path.exists(settings.DATA_DIR):
-                    os.makedirs(settings.DATA_DIR)
+        cache_key = SemanticScholarCache.request_key("search", params)
+        cached = await SemanticScholarCache.get_json(cache_key)
+        if cached is not None:
+            logger.info(f"S2 cache hit for search: {query}")
+            return cached
 
-                timestamp = int(time.time())
-                # 文件名区分 search_papers
-                file_name = f"search_papers_{timestamp}.json"
-                file_path = os.path.join(settings.DATA_DIR, file_name)
+        async def fetch() -> List[Dict]:
+            data = await SemanticScholarAPI._request("GET", "/search", params=params) or {}
 
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, ensure_ascii=False, indent=4)
+            # 将搜索结果提交到后台归档（压缩写入，不阻塞请求）
+            response_archive.record("search_papers", params, data)
 
-                logger.info(f"[Debug] Search results saved to: {file_path}")
-            except Exception as save_err:
-                logger.error(f"[Debug] Failed to save search results: {save_err}")
+            papers = data.get("data") or []
+            await SemanticScholarCache.set_json(cache_key, papers, settings.S2_CACHE_SEARCH_TTL)
+            return papers
 
-            return data.get("data", [])
-        except Exception as e:
-            logger.error(f"Error searching papers: {e}")
-            return []
+        return await _flight.do(cache_key, fetch)
 
     @staticmethod
-    def get_batch_details(paper_ids: List[str]) -> List[Dict]:
+    async def get_batch_details(paper_ids: List[str], fields: str = BATCH_FIELDS) -> List[Dict]:
         """
         批量获取论文详情。
+        先按论文ID读取缓存，只有未命中的 ID 才会请求 API；
+        未命中的 ID 列表按 BATCH_CHUNK_SIZE 切分为多个 /batch 请求并发发出（受 BATCH_MAX_CONCURRENCY 限制），
+        避免超出接口的 ID 数量上限，也避免单个响应过大。
+        返回结果按请求 ID 的顺序排列，接口未找到的论文会被跳过。
+        部分分片失败时跳过这些分片；全部请求都失败时抛出 SemanticScholarError。
+        fields: 请求的字段，默认包含引用与被引列表；只需元数据时传 SEARCH_FIELDS 以减小响应体积。
+        """
+        paper_ids = list(dict.fromkeys(pid for pid in paper_ids if pid))
+        papers = await SemanticScholarAPI.get_batch_map(paper_ids, fields)
+        return [papers[pid] for pid in paper_ids if pid in papers]
+
+    @staticmethod
+    async def get_batch_map(paper_ids: List[str], fields: str = BATCH_FIELDS) -> Dict[str, Dict]:
+        """
+        同 get_batch_details，但返回 {请求的论文ID: 论文详情}。
+        请求的 ID 可以是别名（DOI:xxx / CorpusId:xxx / ARXIV:xxx），与返回论文的 paperId 不一定相同，
+        需要把结果对应回请求 ID 时使用。
+        """
+        paper_ids = list(dict.fromkeys(pid for pid in paper_ids if pid))
+        cached = await SemanticScholarCache.get_papers(fields, paper_ids)
+        missing_ids = [pid for pid in paper_ids if pid not in cached]
+        if cached:
+            logger.info(f"S2 cache hit for {len(cached)}/{len(paper_ids)} batch papers")
+
+        fetched: Dict[str, Dict] = {}
+        if missing_ids:
+            chunk_size = max(1, settings.BATCH_CHUNK_SIZE)
+            chunks = [missing_ids[i:i + chunk_size] for i in range(0, len(missing_ids), chunk_size)]
+            semaphore = asyncio.Semaphore(max(1, settings.BATCH_MAX_CONCURRENCY))
+
+            async def fetch(chunk: List[str]) -> Dict[str, Dict]:
+                async with semaphore:
+                    # 相同字段 + 相同 ID 集合的并发分片请求合并为一次
+                    return await _flight.do(make_key("batch", fields, sorted(chunk)),
+                                            lambda: SemanticScholarAPI._fetch_batch_chunk(chunk, fields))
+
+            if len(chunks) > 1:
+                logger.info(f"Splitting batch request of {len(missing_ids)} ids into {len(chunks)} chunks")
+            errors = []
+            for chunk_result in await asyncio.gather(*(fetch(chunk) for chunk in chunks), return_exceptions=True):
+                if isinstance(chunk_result, SemanticScholarError):
+                    errors.append(chunk_result)
+                elif isinstance(chunk_result, BaseException):
+                    raise chunk_result
+                else:
+                    fetched.update(chunk_result)
+            if errors:
+                logger.error(f"{len(errors)}/{len(chunks)} batch chunks failed: {errors[0]}")
+                if len(errors) == len(chunks) and not cached:
+                    raise errors[0]
+            await SemanticScholarCache.set_papers(fields, fetched)
+
+        results = {}
+        for pid in paper_ids:
+            paper = cached.get(pid) or fetched.get(pid)
+            if paper:
+                results[pid] = paper
+        return results
+
+    @staticmethod
+    async def stream_batch_details(paper_ids: List[str], on_paper: Callable[[Dict], Awaitable[None]],
+                                   fields: str = BATCH_FIELDS) -> int:
+        """
+        流式批量获取论文详情：/batch 响应体边接收边解析，每解析出一篇论文即调用 on_paper(paper)，
+        调用方处理完后即可丢弃该论文，内存占用与单篇论文成正比，而不是整个响应。
+        分片与并发方式同 get_batch_details；流式请求不读写 S2 响应缓存，也不做请求合并。
+        归档队列会在内存中保留待写入的记录，因此不归档完整论文，每个分片结束后只归档
+        交付论文的 ID 与引用数量（batch_details_stream）。
+        返回交给 on_paper 的论文数；全部分片都失败时抛出 SemanticScholarError。
+        分片中途失败时已交付的论文保留，未交付的论文按原因（failed / not_found）计入
+        s2_stream_missing_papers_total 并记录日志，部分失败的扩展跳不会被静默掩盖。
         """
-        url = f"{settings.API_BASE_URL}/batch"
-        # 显式请求引用和被引用字段
+        paper_ids = list(dict.fromkeys(pid for pid in paper_ids if pid))
+        if not paper_ids:
+            return 0
+        chunk_size = max(1, settings.BATCH_CHUNK_SIZE)
+        chunks = [paper_ids[i:i + chunk_size] for i in range(0, len(paper_ids), chunk_size)]
+        semaphore = asyncio.Semaphore(max(1, settings.BATCH_MAX_CONCURRENCY))
+        # 每个分片已交付的请求位置，用于统计缺失的论文
+        delivered: List[Set[int]] = [set() for _ in chunks]
+
+        async def fetch(chunk_index: int, chunk: List[str]):
+            summaries = []
+
+            async def on_item(index: int, paper: Optional[Dict]):
+                # /batch 按请求顺序返回，未找到的论文对应位置为 null
+                if paper and index < len(chunk):
+                    summaries.append({"paperId": paper.get("paperId"),
+                                      **{field: len(paper.get(field) or []) for field in EDGE_FIELDS}})
+                    await on_paper(paper)
+                    delivered[chunk_index].add(index)
+
+            try:
+                async with semaphore:
+                    await SemanticScholarAPI._request("POST", "/batch", params={"fields": fields},
+                                                      payload={"ids": chunk}, on_item=on_item)
+            finally:
+                response_archive.record("batch_details_stream", {"fields": fields, "ids": chunk}, summaries)
+
+        results = await asyncio.gather(*(fetch(i, chunk) for i, chunk in enumerate(chunks)), return_exceptions=True)
+        errors = []
+        missing = {"failed": 0, "not_found": 0}
+        for chunk, chunk_delivered, chunk_result in zip(chunks, delivered, results):
+            if isinstance(chunk_result, SemanticScholarError):
+                errors.append(chunk_result)
+                missing["failed"] += len(chunk) - len(chunk_delivered)
+            elif isinstance(chunk_result, BaseException):
+                raise chunk_result
+            else:
+                missing["not_found"] += len(chunk) - len(chunk_delivered)
+        total = sum(len(chunk_delivered) for chunk_delivered in delivered)
+        for reason, count in missing.items():
+            if count:
+                telemetry.inc("s2_stream_missing_papers_total", count, reason=reason)
+        if errors:
+            logger.error(f"{len(errors)}/{len(chunks)} streamed batch chunks failed: {errors[0]}")
+            if len(errors) == len(chunks) and not total:
+                raise errors[0]
+        if missing["failed"] or missing["not_found"]:
+            logger.warning(f"Streamed batch delivered {total}/{len(paper_ids)} papers "
+                           f"({missing['failed']} lost to failed chunks, {missing['not_found']} not found).")
+        return total
+
+    @staticmethod
+    async def _fetch_batch_chunk(paper_ids: List[str], fields: str) -> Dict[str, Dict]:
+        """单次 /batch 请求，返回 {请求的论文ID: 论文详情}"""
         params = {
-            "fields": "title,authors,year,abstract,citationCount,venue,openAccessPdf,url,referenceCount,influentialCitationCount,publicationDate,citations,references"
+            "fields": fields
         }
         # Body 中包含 ids
         payload = {"ids": paper_ids}
 
-        try:
-            response = requests.post(url, params=params, json=payload, headers=SemanticScholarAPI._get_headers())
-            response.raise_for_status()
+        result = await SemanticScholarAPI._request("POST", "/batch", params=params, payload=payload) or []
 
-            result = response.json()
+        # 将 API返回结果提交到后台归档（压缩写入，不阻塞请求）
+        response_archive.record("batch_details", {**params, **payload}, result)
 
-            # 将 API返回结果保存到JSON文件
-            try:
-                # 确保 data 目录存在 (settings.DATA_DIR 已经在 config 中定义)
-                if not os.path.exists(settings.DATA_DIR):
-                    os.makedirs(settings.DATA_DIR)
+        papers = result if isinstance(result, list) else result.get("data", [])
+        # /batch 按请求顺序返回，未找到的论文对应位置为 null
+        return {pid: paper for pid, paper in zip(paper_ids, papers) if paper}
+
+    @staticmethod
+    async def get_citation_edges(paper_ids: List[str], max_citations: int, max_references: int,
+                                 half_life: float = 0.0, scan_limit: int = 2000) -> List[Dict]:
+        """
+        bounded 扩展模式：获取论文的引用关系，每篇论文保留的被引 / 参考文献数不超过上限，
+        响应体积与解析耗时不随论文的知名度增长。
+        1. /batch 只请求 citationCount、referenceCount；
+        2. 数量不超过上限的列表通过 /batch 请求，嵌套字段只带论文ID（按年份抽样时另带 year）；
+        3. 超过上限的列表改为分页请求 /{paper_id}/citations|references：按年份抽样时最多读取 scan_limit 条，
+           否则只读取上限条数；最后统一经 sample_edges 截断到上限。
+        返回 [{"paperId", "citations": [...], "references": [...]}]，引用字段格式与 get_batch_details 一致；
+        结果按请求 ID 对应（/batch 按请求顺序返回），以别名请求的论文同样会返回，paperId 为 S2 的论文ID。
+        """
+        paper_ids = list(dict.fromkeys(pid for pid in paper_ids if pid))
+        if not paper_ids:
+            return []
+        caps = {"citations": max_citations, "references": max_references}
+        sub_fields = "paperId,year" if half_life > 0 else "paperId"
 
-                # 生成带有时间戳的文件名，防止覆盖
-                timestamp = int(time.time())
-                file_name = f"batch_details_{timestamp}.json"
-                file_path = os.path.join(settings.DATA_DIR, file_name)
+        counted = await SemanticScholarAPI.get_batch_map(paper_ids, fields=",".join(_EDGE_COUNT_KEYS.values()))
+        # 以请求的 ID 为 Key（可能是别名），返回的 paperId 只用于分页请求与输出
+        edges: Dict[str, Dict] = {}
+        inline_groups: Dict[Tuple[str, ...], List[str]] = {}
+        paged: List[Tuple[str, str]] = []
+        for pid in paper_ids:
+            paper = counted.get(pid)
+            if not paper:
+                continue
+            edges[pid] = {"paperId": paper.get("paperId") or pid, "citations": [], "references": []}
+            inline = tuple(field for field in EDGE_FIELDS if (paper.get(_EDGE_COUNT_KEYS[field]) or 0) <= caps[field])
+            if inline:
+                inline_groups.setdefault(inline, []).append(pid)
+            paged.extend((pid, field) for field in EDGE_FIELDS if field not in inline)
 
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump(result, f, ensure_ascii=False, indent=4)
+        async def fetch_inline(fields: Tuple[str, ...], ids: List[str]) -> Dict[str, Dict]:
+            nested = ",".join(f"{field}.{sub}" for field in fields for sub in sub_fields.split(","))
+            return await SemanticScholarAPI.get_batch_map(ids, fields=nested)
 
-                logger.info(f"[Debug] Batch details saved to: {file_path}")
-            except Exception as save_err:
-                logger.error(f"[Debug] Failed to save batch details: {save_err}")
+        async def fetch_paged(pid: str, field: str) -> List[Dict]:
+            scan = max(scan_limit, caps[field]) if half_life > 0 else caps[field]
+            return await SemanticScholarAPI._fetch_edge_pages(edges[pid]["paperId"], field, scan, sub_fields)
 
-            if isinstance(result, list):
-                return result
-            return result.get("data", [])
-        except Exception as e:
-            logger.error(f"Error getting batch details: {e}")
-            return []
+        inline_results, paged_results = await asyncio.gather(
+            asyncio.gather(*(fetch_inline(fields, ids) for fields, ids in inline_groups.items()), return_exceptions=True),
+            asyncio.gather(*(fetch_paged(pid, field) for pid, field in paged), return_exceptions=True))
+
+        # 任一请求失败时只丢弃对应的列表（记为空），其余引用关系照常返回
+        for (fields, ids), papers in zip(inline_groups.items(), inline_results):
+            if isinstance(papers, SemanticScholarError):
+                logger.error(f"Inline {'/'.join(fields)} fetch failed for {len(ids)} papers: {papers}")
+                continue
+            if isinstance(papers, BaseException):
+                raise papers
+            for pid, paper in papers.items():
+                entry = edges.get(pid)
+                if entry is None:
+                    continue
+                for field in EDGE_FIELDS:
+                    if field in paper:
+                        entry[field] = [item for item in paper[field] or [] if item and item.get("paperId")]
+        for (pid, field), items in zip(paged, paged_results):
+            if isinstance(items, SemanticScholarError):
+                logger.error(f"Paged {field} fetch failed for {pid}: {items}")
+            elif isinstance(items, BaseException):
+                raise items
+            else:
+                edges[pid][field] = items
+
+        truncated = 0
+        for entry in edges.values():
+            for field in EDGE_FIELDS:
+                items = entry[field]
+                entry[field] = sample_edges(entry["paperId"], field, items, caps[field], half_life)
+                truncated += len(items) - len(entry[field])
+        if truncated:
+            telemetry.inc("s2_edges_truncated_total", truncated)
+        logger.info(f"Bounded edge fetch: {len(edges)} papers, {len(paged)} lists paged, {truncated} edges dropped by caps")
+        return [edges[pid] for pid in paper_ids if pid in edges]
+
+    @staticmethod
+    async def _fetch_edge_pages(paper_id: str, field: str, scan_limit: int, sub_fields: str) -> List[Dict]:
+        """分页读取单篇论文的被引 (/citations) 或参考文献 (/references) 列表，最多 scan_limit 条"""
+        cache_key = SemanticScholarCache.request_key(
+            "edges", {"paperId": paper_id, "field": field, "fields": sub_fields, "scan": scan_limit})
+        cached = await SemanticScholarCache.get_json(cache_key)
+        if cached is not None:
+            return cached
+
+        async def fetch() -> List[Dict]:
+            item_key = _EDGE_ITEM_KEYS[field]
+            items, offset = [], 0
+            while len(items) < scan_limit:
+                params = {"fields": sub_fields, "offset": offset, "limit": min(EDGE_PAGE_LIMIT, scan_limit - len(items))}
+                data = await SemanticScholarAPI._request("GET", f"/{paper_id}/{field}", params=params,
+                                                         metric_endpoint=f"/{{paper_id}}/{field}") or {}
+                response_archive.record("paper_edges", {"paperId": paper_id, "field": field, **params}, data)
+                page = data.get("data") or []
+                items.extend(entry[item_key] for entry in page
+                             if entry and entry.get(item_key) and entry[item_key].get("paperId"))
+                if not page or data.get("next") is None:
+                    break
+                offset = data["next"]
+            await SemanticScholarCache.set_json(cache_key, items, settings.S2_CACHE_PAPER_TTL)
+            return items
+
+        return await _flight.do(cache_key, fetch)
+
+    @staticmethod
+    async def match_title(title: str) -> Dict:
+        """根据标题精确匹配单篇论文 (/search/match)"""
+        params = {"query": title}
+
+        cache_key = SemanticScholarCache.request_key("match", params)
+        cached = await SemanticScholarCache.get_json(cache_key)
+        if cached is not None:
+            logger.info(f"S2 cache hit for title match: {title}")
+            return cached
+
+        async def fetch() -> Dict:
+            # 标题无匹配时接口返回 404
+            result = await SemanticScholarAPI._request("GET", "/search/match", params=params) or {}
+            data = result.get("data") or []
+            paper = data[0] if data else {}
+            if paper:
+                await SemanticScholarCache.set_json(cache_key, paper, settings.S2_CACHE_SEARCH_TTL)
+            return paper
+
+        return await _flight.do(cache_key, fetch)
 
 
 # --- LangChain Tools ---
 
 @tool
-def tool_search_by_keyword(query: str, limit: int = 10) -> List[Dict]:
+async def tool_search_by_keyword(query: str, limit: int = 10) -> List[Dict]:
     """
     根据关键字检索论文 (Initial Retrieval)。
     Args:
@@ -121,16 +609,17 @@ def tool_search_by_keyword(query: str, limit: int = 10) -> List[Dict]:
         包含论文基础信息的列表 (JSON格式)
     """
     logger.info(f"Executing tool_search_by_keyword with query: {query}")
-    return SemanticScholarAPI.search_papers(query, limit=limit)
+    return await SemanticScholarAPI.search_papers(query, limit=limit)
 
 
 @tool
-def tool_search_batch_details(paper_ids: List[str]) -> List[Dict]:
+async def tool_search_batch_details(paper_ids: List[str], include_edges: bool = True) -> List[Dict]:
     """
     根据多个论文ID批量检索详细信息 (含参考文献和引用文献)。
     用于构建引用图谱。
     Args:
         paper_ids: 论文ID列表，例如 ['id1', 'id2']
+        include_edges: 是否返回 references 和 citations，只需元数据时设为 False
     Returns:
         包含详细信息(含 references 和 citations)的论文列表
     """
@@ -138,21 +627,29 @@ def tool_search_batch_details(paper_ids: List[str]) -> List[Dict]:
     if not paper_ids:
         return []
 
-    return SemanticScholarAPI.get_batch_details(paper_ids)
+    fields = BATCH_FIELDS if include_edges else SEARCH_FIELDS
+    return await SemanticScholarAPI.get_batch_details(paper_ids, fields=fields)
+
+
+@tool
+async def tool_fetch_citation_edges(paper_ids: List[str]) -> List[Dict]:
+    """
+    根据多个论文ID获取有上限的引用关系（只含论文ID），用于 bounded 模式下的引用图谱扩展。
+    单篇论文的被引 / 参考文献数分别不超过 EXPANSION_MAX_CITATIONS / EXPANSION_MAX_REFERENCES。
+    Args:
+        paper_ids: 论文ID列表
+    Returns:
+        [{"paperId", "citations": [{"paperId"}...], "references": [{"paperId"}...]}]
+    """
+    logger.info(f"Executing tool_fetch_citation_edges for {len(paper_ids)} papers")
+    return await SemanticScholarAPI.get_citation_edges(
+        paper_ids, settings.EXPANSION_MAX_CITATIONS, settings.EXPANSION_MAX_REFERENCES,
+        half_life=settings.EXPANSION_RECENCY_HALF_LIFE, scan_limit=settings.EXPANSION_EDGE_SCAN_LIMIT)
 
 
 @tool
-def tool_search_by_title(title: str) -> Dict:
+async def tool_search_by_title(title: str) -> Dict:
     """
     根据论文标题精确检索论文。
     """
-    url = f"{settings.API_BASE_URL}/search/match"
-    params = {"query": title}
-    try:
-        response = requests.get(url, params=params, headers=SemanticScholarAPI._get_headers())
-        response.raise_for_status()
-        data = response.json().get("data", [])
-        return data[0] if data else {}
-    except Exception as e:
-        logger.error(f"Error searching by title: {e}")
-        return {}
\ No newline at end of file
+    return await SemanticScholarAPI.match_title(title)
\ No newline at end of file
@@ -0,0 +1,97 @@
+import re
+
+CITATION_START = "[Response_Start]"
+CITATION_END = "[Response_End]"
+
+# 正则表达式匹配 [Response_Start]...[Response_End]
+# 捕获组: 1=ID, 2=Year, 3=URL, 4=Author
+_CITATION_PATTERN = re.compile(r"\[Response_Start\](.*?)\|(.*?)\|(.*?)\|(.*?)\[Response_End\]")
+
+# 流式解析时单个引用标记的最大长度，超过后视为格式异常，按原文输出，避免无限缓冲
+_MAX_CITATION_LENGTH = 1000
+
+
+def _replace_citation(match) -> str:
+    try:
+        # 提取字段
+        # paper_id = match.group(1)
+        year = match.group(2).strip()
+        url = match.group(3).strip()
+        author = match.group(4).strip()
+
+        # 构造学术引用格式 (Author et al. Year)
+        citation_text = f"({author} et al. {year})"
+
+        # 构造 Markdown 链接: [显示文本](链接地址)
+        return f"[{citation_text}]({url})"
+    except Exception:
+        # 如果解析失败，返回原文本或空串，防止崩溃
+        return ""
+
+
+def process_citations(text: str) -> str:
+    """
+    后处理函数：将 LLM 生成的引用标记替换为 Chainlit 可渲染的 Markdown 超链接。
+
+    原始格式: [Response_Start]PaperID|Year|URL|FirstAuthor[Response_End]
+    目标格式: [(FirstAuthor et al. Year)](URL)
+    """
+    return _CITATION_PATTERN.sub(_replace_citation, text)
+
+
+class CitationStreamRewriter:
+    """
+    流式引用标记改写器：逐块输入 LLM 输出的 token，返回可以立即发送给前端的文本。
+    遇到未闭合的 [Response_Start]…[Response_End] 片段（或结尾处可能是标记开头的字符）时先缓冲，
+    直到片段完整后再整体替换为 Markdown 链接，保证前端不会看到半截的标记。
+    """
+
+    def __init__(self):
+        self._buffer = ""
+
+    @staticmethod
+    def _partial_start_length(text: str) -> int:
+        """text 结尾与 CITATION_START 开头重合的最大长度（可能是被截断的标记）"""
+        for length in range(min(len(text), len(CITATION_START) - 1), 0, -1):
+            if CITATION_START.startswith(text[-length:]):
+                return length
+        return 0
+
+    def feed(self, chunk: str) -> str:
+        """输入一段新 token，返回当前可以安全输出的文本（可能为空字符串）"""
+        self._buffer += chunk
+        output = []
+
+        while self._buffer:
+            start = self._buffer.find(CITATION_START)
+            if start == -1:
+                # 没有完整的开始标记：输出除可能的半截标记以外的全部内容
+                keep = self._partial_start_length(self._buffer)
+                output.append(self._buffer[:len(self._buffer) - keep])
+                self._buffer = self._buffer[len(self._buffer) - keep:]
+                break
+
+            # 开始标记之前的普通文本可直接输出
+            output.append(self._buffer[:start])
+            self._buffer = self._buffer[start:]
+
+            end = self._buffer.find(CITATION_END)
+            if end == -1:
+                if len(self._buffer) > _MAX_CITATION_LENGTH:
+                    # 标记异常过长，放弃等待，按原文输出开始标记并继续处理后续内容
+                    output.append(CITATION_START)
+                    self._buffer = self._buffer[len(CITATION_START):]
+                    continue
+                break
+
+            span_end = end + len(CITATION_END)
+            output.append(process_citations(self._buffer[:span_end]))
+            self._buffer = self._buffer[span_end:]
+
+        return "".join(output)
+
+    def flush(self) -> str:
+        """流结束时输出剩余缓冲内容"""
+        remaining = process_citations(self._buffer)
+        self._buffer = ""
+        return remaining
\ No newline at end of file
@@ -0,0 +1,40 @@
+import asyncio
+import weakref
+from typing import Callable
+from config.settings import settings
+
+
+class LoopSemaphore:
+    """
+    进程级并发上限：每个事件循环一个 asyncio.Semaphore（信号量绑定在创建它的事件循环上）。
+    上限在当前事件循环首次使用时读取，因此批量运行等入口可以在启动前修改 settings 调整上限；
+    上限 <= 0 表示不限制。
+    """
+
+    def __init__(self, name: str, limit: Callable[[], int]):
+        self.name = name
+        self._limit = limit
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+    def _semaphore(self):
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            limit = self._limit()
+            self._semaphores[loop] = asyncio.Semaphore(limit) if limit > 0 else None
+        return self._semaphores[loop]
+
+    async def __aenter__(self):
+        semaphore = self._semaphore()
+        if semaphore is not None:
+            await semaphore.acquire()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        semaphore = self._semaphore()
+        if semaphore is not None:
+            semaphore.release()
+
+
+# 同时进行的 LLM 调用数（所有 Agent 共享，含流式报告生成）
+llm_limiter = LoopSemaphore("llm", lambda: settings.LLM_MAX_CONCURRENCY)
+# 同时进行的 Semantic Scholar HTTP 请求数（不含退避等待）
+s2_limiter = LoopSemaphore("semantic_scholar", lambda: settings.S2_MAX_CONCURRENCY)
\ No newline at end of file
@@ -0,0 +1,116 @@
+from array import array
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+
+class CitationGraph:
+    """
+    单次会话扩展得到的引用子图（边表）。
+    节点按首次出现顺序编号，边以 int32 数组追加存储 (source 引用 target)，
+    扩展阶段只做 O(1) 追加，评分时再一次性构建稀疏矩阵。
+    """
+
+    def __init__(self):
+        self.index: Dict[str, int] = {}
+        self.nodes: List[str] = []
+        self.seeds: Dict[int, None] = {}
+        self._src = array("i")
+        self._dst = array("i")
+
+    def __len__(self) -> int:
+        return len(self._src)
+
+    def _node(self, paper_id: str) -> int:
+        idx = self.index.get(paper_id)
+        if idx is None:
+            idx = self.index[paper_id] = len(self.nodes)
+            self.nodes.append(paper_id)
+        return idx
+
+    def add_seed(self, paper_id: str):
+        self.seeds[self._node(paper_id)] = None
+
+    def add_edges(self, paper_id: str, references: List[str], citations: List[str]):
+        """paper_id 引用 references 中的论文，citations 中的论文引用 paper_id"""
+        center = self._node(paper_id)
+        for ref in references:
+            self._src.append(center)
+            self._dst.append(self._node(ref))
+        for cite in citations:
+            self._src.append(self._node(cite))
+            self._dst.append(center)
+
+    def snapshot(self) -> Tuple[List[str], List[int], np.ndarray, np.ndarray]:
+        """复制当前的节点与边（扩展仍在进行时，评分可在其它线程中基于快照计算）"""
+        return (list(self.nodes), list(self.seeds),
+                np.frombuffer(self._src, dtype=np.int32).copy(), np.frombuffer(self._dst, dtype=np.int32).copy())
+
+
+def score_snapshot(nodes: List[str], seeds: List[int], src: np.ndarray, dst: np.ndarray,
+                   weights: Dict[str, float], alpha: float = 0.85, max_iter: int = 50,
+                   tol: float = 1e-6, top_k: Optional[int] = None) -> List[Tuple[str, float]]:
+    """
+    基于稀疏邻接矩阵的候选评分，A[i, j] = 1 表示 i 引用 j：
+    - pagerank:   以种子论文为重启分布的个性化 PageRank（在无向化的 A + A^T 上迭代）
+    - cocitation: 与种子论文被同一批论文共同引用的次数，(A^T A) 种子列之和
+    - coupling:   与种子论文共享参考文献的数量，(A A^T) 种子列之和
+    三项分别按最大值归一化后按 weights 线性组合。
+
+    Returns:
+        [(paper_id, score), ...]，按得分从高到低排列，仅包含得分大于 0 的论文
+    """
+    from scipy import sparse  # 可选依赖，仅 CANDIDATE_MODE=graph 时需要
+
+    n = len(nodes)
+    if n == 0 or len(src) == 0 or not seeds:
+        return []
+
+    adjacency = sparse.csr_matrix((np.ones(len(src), dtype=np.float64), (src, dst)), shape=(n, n))
+    adjacency.data[:] = 1.0  # 合并重复边
+    seed_vec = np.zeros(n)
+    seed_vec[seeds] = 1.0
+
+    components = {}
+    if weights.get("pagerank"):
+        undirected = (adjacency + adjacency.T).tocsr()
+        undirected.data[:] = 1.0
+        degree = np.asarray(undirected.sum(axis=1)).ravel()
+        dangling = degree == 0
+        inv_degree = np.divide(1.0, degree, out=np.zeros(n), where=~dangling)
+        transition_t = (sparse.diags(inv_degree) @ undirected).T.tocsr()
+
+        restart = seed_vec / seed_vec.sum()
+        rank = restart.copy()
+        for _ in range(max_iter):
+            # 悬挂节点的概率质量回到种子分布
+            updated = alpha * (transition_t @ rank) + (alpha * rank[dangling].sum() + 1 - alpha) * restart
+            converged = np.abs(updated - rank).sum() < tol
+            rank = updated
+            if converged:
+                break
+        components["pagerank"] = rank
+    if weights.get("cocitation"):
+        components["cocitation"] = adjacency.T @ (adjacency @ seed_vec)
+    if weights.get("coupling"):
+        components["coupling"] = adjacency @ (adjacency.T @ seed_vec)
+
+    combined = np.zeros(n)
+    for name, values in components.items():
+        peak = values.max()
+        if peak > 0:
+            combined += weights[name] * values / peak
+
+    order = np.argsort(-combined, kind="stable")
+    if top_k:
+        order = order[:top_k]
+    return [(nodes[i], float(combined[i])) for i in order if combined[i] > 0]
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """解析 "pagerank:0.6,cocitation:0.2,coupling:0.2" 形式的权重配置"""
+    weights = {}
+    for part in spec.split(","):
+        name, _, value = part.partition(":")
+        if name.strip():
+            weights[name.strip()] = float(value or 1)
+    return weights
\ No newline at end of file
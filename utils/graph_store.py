@@ -0,0 +1,146 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+from config.settings import settings
+from utils.logger import setup_logger
+
+logger = setup_logger("graph_store")
+
+# 邻接表编码格式标记（首字节）
+_FORMAT_PACKED_HEX = b"\x01"  # S2 paperId 均为 40 位十六进制，压缩为 20 字节定长拼接
+_FORMAT_JSON = b"\x02"  # 含非标准 ID 时退回 JSON 数组
+
+_S2_ID_LENGTH = 40
+_PACKED_ID_BYTES = _S2_ID_LENGTH // 2
+
+# SQLite 单条语句的参数数量上限为 999，批量查询时按此分片
+_QUERY_CHUNK_SIZE = 500
+
+EDGE_FIELDS = ("references", "citations")
+
+
+def pack_ids(paper_ids: List[str]) -> bytes:
+    try:
+        if all(len(pid) == _S2_ID_LENGTH for pid in paper_ids):
+            return _FORMAT_PACKED_HEX + b"".join(bytes.fromhex(pid) for pid in paper_ids)
+    except ValueError:
+        pass
+    return _FORMAT_JSON + json.dumps(paper_ids, separators=(",", ":")).encode("utf-8")
+
+
+def unpack_ids(data: bytes) -> List[str]:
+    if not data:
+        return []
+    header, body = data[:1], data[1:]
+    if header == _FORMAT_PACKED_HEX:
+        return [body[i:i + _PACKED_ID_BYTES].hex() for i in range(0, len(body), _PACKED_ID_BYTES)]
+    return json.loads(body)
+
+
+class CitationGraphStore:
+    """
+    本地持久化引用图谱 (SQLite，WAL + mmap)。
+    每篇论文一行：参考文献与被引文献 ID 列表分别以紧凑二进制存储，并记录抓取时间 fetched_at。
+    扩展阶段先查询本地图谱，只有不存在或超过 GRAPH_STORE_MAX_AGE 的论文才需要重新请求 /batch，
+    重新抓取后整行覆盖，实现按节点的增量刷新。
+    SQLite 连接按线程创建，异步接口通过 asyncio.to_thread 执行，避免阻塞事件循环。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={settings.GRAPH_STORE_MMAP_MB * 1024 * 1024}")
+            self._local.conn = conn
+            with self._init_lock:
+                if not self._initialized:
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS neighborhoods ("
+                        " paper_id TEXT PRIMARY KEY,"
+                        " fetched_at REAL NOT NULL,"
+                        " refs BLOB,"
+                        " cites BLOB"
+                        ") WITHOUT ROWID")
+                    conn.execute("CREATE INDEX IF NOT EXISTS idx_neighborhoods_fetched_at ON neighborhoods(fetched_at)")
+                    conn.commit()
+                    self._initialized = True
+        return conn
+
+    def get_fresh(self, paper_ids: List[str], max_age: Optional[float] = None) -> Dict[str, Dict[str, List[str]]]:
+        """
+        读取本地图谱中未过期的邻接表，返回 {paper_id: {"references": [...], "citations": [...]}}。
+        不存在或已过期的论文不会出现在结果中。
+        """
+        max_age = settings.GRAPH_STORE_MAX_AGE if max_age is None else max_age
+        min_fetched_at = time.time() - max_age
+        conn = self._connect()
+        result = {}
+        for i in range(0, len(paper_ids), _QUERY_CHUNK_SIZE):
+            chunk = paper_ids[i:i + _QUERY_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT paper_id, refs, cites FROM neighborhoods WHERE paper_id IN ({placeholders}) AND fetched_at >= ?",
+                (*chunk, min_fetched_at))
+            for paper_id, refs, cites in rows:
+                result[paper_id] = {"references": unpack_ids(refs), "citations": unpack_ids(cites)}
+        return result
+
+    def put_neighborhoods(self, neighborhoods: Dict[str, Dict[str, List[str]]]):
+        """写入（覆盖）论文的邻接表，并将抓取时间更新为当前时间"""
+        if not neighborhoods:
+            return
+        now = time.time()
+        rows = [(pid, now, pack_ids(edges.get("references") or []), pack_ids(edges.get("citations") or []))
+                for pid, edges in neighborhoods.items()]
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT INTO neighborhoods (paper_id, fetched_at, refs, cites) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(paper_id) DO UPDATE SET fetched_at=excluded.fetched_at, refs=excluded.refs, cites=excluded.cites",
+                rows)
+
+    def prune(self, max_age: Optional[float] = None) -> int:
+        """删除超过 max_age 未刷新的节点，返回删除的行数"""
+        max_age = settings.GRAPH_STORE_MAX_AGE if max_age is None else max_age
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute("DELETE FROM neighborhoods WHERE fetched_at < ?", (time.time() - max_age,))
+        return cursor.rowcount
+
+    def count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM neighborhoods").fetchone()[0]
+
+    @staticmethod
+    def neighborhoods_from_papers(papers: Iterable[Dict]) -> Dict[str, Dict[str, List[str]]]:
+        """从 /batch 返回的论文（含 references / citations）中提取邻接表"""
+        neighborhoods = {}
+        for paper in papers:
+            if not paper or not paper.get("paperId"):
+                continue
+            neighborhoods[paper["paperId"]] = {
+                field: [item.get("paperId") for item in (paper.get(field) or []) if item and item.get("paperId")]
+                for field in EDGE_FIELDS
+            }
+        return neighborhoods
+
+    async def aget_fresh(self, paper_ids: List[str], max_age: Optional[float] = None) -> Dict[str, Dict[str, List[str]]]:
+        return await asyncio.to_thread(self.get_fresh, paper_ids, max_age)
+
+    async def aput_neighborhoods(self, neighborhoods: Dict[str, Dict[str, List[str]]]):
+        await asyncio.to_thread(self.put_neighborhoods, neighborhoods)
+
+
+graph_store = CitationGraphStore(settings.GRAPH_STORE_PATH)
\ No newline at end of file
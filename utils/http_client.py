@@ -0,0 +1,52 @@
+import asyncio
+import weakref
+import httpx
+from config.settings import settings
+from utils.logger import setup_logger
+
+logger = setup_logger("http_client")
+
+# 每个事件循环持有一个共享的连接池客户端（httpx 的连接绑定在创建它的事件循环上）
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def _http2_available() -> bool:
+    """HTTP/2 依赖可选的 h2 包，未安装时自动降级为 HTTP/1.1 keep-alive"""
+    if not settings.HTTP2_ENABLED:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """
+    获取当前事件循环共享的异步 HTTP 客户端。
+    所有会话复用同一个连接池，避免每次请求都重新建立 TLS 连接。
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        http2 = _http2_available()
+        client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_POOL_SIZE,
+                max_keepalive_connections=settings.HTTP_POOL_SIZE,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(settings.HTTP_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT)
+        )
+        _clients[loop] = client
+        logger.info(f"Created shared HTTP client (pool={settings.HTTP_POOL_SIZE}, http2={http2})")
+    return client
+
+
+async def close_async_client():
+    """关闭当前事件循环的共享客户端（进程退出或批处理结束时调用）"""
+    loop = asyncio.get_running_loop()
+    client = _clients.pop(loop, None)
+    if client is not None and not client.is_closed:
+        await client.aclose()
\ No newline at end of file
@@ -0,0 +1,121 @@
+import codecs
+import json
+from typing import Any, AsyncIterator, List
+
+_WHITESPACE = " \t\r\n"
+
+
+class _RawDecodeArrayParser:
+    """
+    基于 json.JSONDecoder.raw_decode 的顶层数组增量解析器（元素解码使用标准库的 C 扫描器）。
+    每收到一块数据就尝试解码缓冲区中已完整到达的元素；某个元素解码失败（数据尚未到齐）时，
+    新到的数据块先暂存在列表中，等待解码的数据长度翻倍或数据结束后才拼接到缓冲区并重试，
+    单个元素很大、分成许多块到达时，拼接与解析的总代价仍为线性。
+    数字与 true / false / null 只有在其后出现 "," 或 "]" 时才被接受（"1." / "1e" 之后可能还有数据），
+    元素之间缺少分隔符时报错。
+    """
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._pending: List[str] = []  # 尚未拼接到缓冲区的数据块
+        self._pending_length = 0
+        self._pos = 0
+        self._started = False
+        self._finished = False
+        self._expect_value = True  # False 表示上一个元素之后需要 "," 或 "]"
+        self._has_items = False
+        self._retry_at = 0
+
+    def _error(self, message: str, pos: int) -> json.JSONDecodeError:
+        return json.JSONDecodeError(message, self._buffer, pos)
+
+    def feed(self, chunk: bytes, final: bool = False) -> List[Any]:
+        text = self._text_decoder.decode(chunk, final)
+        if text:
+            self._pending.append(text)
+            self._pending_length += len(text)
+        if len(self._buffer) + self._pending_length < self._retry_at and not final:
+            return []
+        if self._pending:
+            self._buffer += "".join(self._pending)
+            self._pending.clear()
+            self._pending_length = 0
+        self._retry_at = 0
+        items = []
+        while not self._finished:
+            pos = self._skip(self._pos)
+            if pos >= len(self._buffer):
+                break
+            char = self._buffer[pos]
+            if not self._started:
+                if char != "[":
+                    raise self._error("Expected a JSON array", pos)
+                self._started, self._pos = True, pos + 1
+                continue
+            if not self._expect_value:
+                if char == ",":
+                    self._expect_value, self._pos = True, pos + 1
+                    continue
+                if char == "]":
+                    self._finished, self._pos = True, pos + 1
+                    break
+                raise self._error("Expecting ',' delimiter", pos)
+            if char == "]" and not self._has_items:
+                self._finished, self._pos = True, pos + 1
+                break
+            try:
+                item, end = self._decoder.raw_decode(self._buffer, pos)
+            except json.JSONDecodeError:
+                if final:
+                    raise
+                self._retry_at = 2 * len(self._buffer)
+                break
+            if char not in '{["' and (end == len(self._buffer) or self._buffer[end] not in _WHITESPACE + ",]"):
+                # 数字等标量之后紧跟的不是分隔符：可能还没有到齐（如 "1." / "1e"），等待后续数据
+                if final:
+                    raise self._error("Invalid JSON value", pos)
+                break
+            items.append(item)
+            self._pos, self._expect_value, self._has_items = end, False, True
+        # 丢弃已解析的部分，缓冲区只保留未完成的元素
+        self._buffer = self._buffer[self._pos:]
+        self._retry_at = max(0, self._retry_at - self._pos)
+        self._pos = 0
+        if final and not self._finished:
+            raise self._error("Truncated JSON array", len(self._buffer))
+        return items
+
+    def _skip(self, pos: int) -> int:
+        while pos < len(self._buffer) and self._buffer[pos] in _WHITESPACE:
+            pos += 1
+        return pos
+
+
+async def iter_array_items(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    """
+    从字节流中逐个产出顶层 JSON 数组的元素，内存占用与单个元素的大小成正比，而不是整个响应。
+    解析错误（包括数据不完整）抛出 json.JSONDecodeError。
+    响应体为对象（例如 {"data": [...]}）时无法流式解析，整体解码后产出 data 中的元素。
+    """
+    stream = chunks.__aiter__()
+    head = b""
+    async for chunk in stream:
+        head += chunk
+        if head.lstrip():
+            break
+    if head.lstrip()[:1] == b"{":
+        body = head + b"".join([chunk async for chunk in stream])
+        for item in json.loads(body).get("data") or []:
+            yield item
+        return
+
+    parser = _RawDecodeArrayParser()
+    for item in parser.feed(head):
+        yield item
+    async for chunk in stream:
+        for item in parser.feed(chunk):
+            yield item
+    for item in parser.feed(b"", final=True):
+        yield item
\ No newline at end of file
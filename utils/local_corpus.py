@@ -0,0 +1,302 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Optional, Tuple
+from config.settings import settings
+from utils import paper_codec
+from utils.logger import setup_logger
+
+logger = setup_logger("local_corpus")
+
+# 嵌套引用列表的上限，与 /batch 接口返回的 references / citations 数量上限保持一致
+MAX_NESTED_EDGES = 1000
+
+# SQLite 单条语句的参数数量上限为 999，批量查询时按此分片
+_QUERY_CHUNK_SIZE = 500
+
+# 标题匹配的最低相似度（归一化后的 SequenceMatcher ratio）
+_TITLE_MATCH_THRESHOLD = 0.9
+
+# 数据集 externalids 字段名 -> API 论文ID前缀
+_EXTERNAL_ID_PREFIXES = {
+    "DOI": "DOI", "ArXiv": "ARXIV", "PubMed": "PMID", "PubMedCentral": "PMCID", "MAG": "MAG", "ACL": "ACL",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS papers (
+    corpus_id INTEGER PRIMARY KEY,
+    paper_id TEXT UNIQUE,
+    title TEXT,
+    abstract TEXT,
+    meta BLOB
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5(
+    title, abstract, content='papers', content_rowid='corpus_id'
+);
+CREATE TRIGGER IF NOT EXISTS papers_ai AFTER INSERT ON papers BEGIN
+    INSERT INTO papers_fts(rowid, title, abstract) VALUES (new.corpus_id, new.title, new.abstract);
+END;
+CREATE TRIGGER IF NOT EXISTS papers_ad AFTER DELETE ON papers BEGIN
+    INSERT INTO papers_fts(papers_fts, rowid, title, abstract) VALUES ('delete', old.corpus_id, old.title, old.abstract);
+END;
+CREATE TRIGGER IF NOT EXISTS papers_au AFTER UPDATE ON papers BEGIN
+    INSERT INTO papers_fts(papers_fts, rowid, title, abstract) VALUES ('delete', old.corpus_id, old.title, old.abstract);
+    INSERT INTO papers_fts(rowid, title, abstract) VALUES (new.corpus_id, new.title, new.abstract);
+END;
+CREATE TABLE IF NOT EXISTS external_ids (
+    external_id TEXT PRIMARY KEY,
+    corpus_id INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS citations (
+    citing INTEGER NOT NULL,
+    cited INTEGER NOT NULL,
+    PRIMARY KEY (citing, cited)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_citations_cited ON citations(cited, citing);
+CREATE TABLE IF NOT EXISTS ingest_progress (
+    path TEXT PRIMARY KEY,
+    lines INTEGER NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL
+);
+"""
+
+
+def _field(record: Dict, *names):
+    """兼容数据集（全小写字段）与 API（驼峰字段）两种格式"""
+    for name in names:
+        value = record.get(name)
+        if value is not None:
+            return value
+    return None
+
+
+def normalize_external_id(paper_id: str) -> str:
+    """DOI:10.1/ABC 与 doi:10.1/abc 视为同一 ID"""
+    prefix, _, value = paper_id.partition(":")
+    return f"{prefix.upper()}:{value.strip().lower()}"
+
+
+def normalize_title(title: str) -> str:
+    return " ".join(re.findall(r"\w+", (title or "").lower()))
+
+
+def fts_query(query: str) -> str:
+    """
+    将检索式（可能包含 S2 风格的引号短语与 OR/AND）转换为 FTS5 查询：
+    短语保留为整体，其余词逐个加引号后以 OR 连接，由 bm25 按匹配程度排序。
+    """
+    terms = []
+    for phrase, word in re.findall(r'"([^"]+)"|(\w+)', query or ""):
+        if phrase:
+            words = re.findall(r"\w+", phrase)
+            if words:
+                terms.append('"' + " ".join(words) + '"')
+        elif word.upper() not in ("OR", "AND", "NOT"):
+            terms.append(f'"{word}"')
+    return " OR ".join(dict.fromkeys(terms))
+
+
+class LocalCorpus:
+    """
+    由 Semantic Scholar 数据集 (papers / abstracts / citations) 导入的本地论文库 (SQLite + FTS5)。
+    - papers:       元数据（paper_codec 编码）+ 标题 / 摘要，标题与摘要建立 FTS5 全文索引用于关键词检索
+    - external_ids: DOI / ARXIV / PMID 等外部 ID 到 corpus_id 的映射
+    - citations:    引用边 (citing -> cited)，两个方向均有索引
+    - ingest_progress: 每个导入文件已处理的行数，用于中断后续传
+    导入由 tools/ingest_s2_dataset.py 完成，查询由 LocalCorpusProvider 在线程中调用。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=60)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={settings.GRAPH_STORE_MMAP_MB * 1024 * 1024}")
+            self._local.conn = conn
+            with self._init_lock:
+                if not self._initialized:
+                    conn.executescript(_SCHEMA)
+                    self._initialized = True
+        return conn
+
+    # ------------------------------------------------------------------
+    # 导入
+    # ------------------------------------------------------------------
+    @staticmethod
+    def paper_row(record: Dict) -> Optional[Tuple[int, str, str, Optional[str], bytes, List[Tuple[str, int]]]]:
+        """将数据集中的一条论文记录转换为 (corpus_id, paper_id, title, abstract, meta, external_ids)"""
+        corpus_id = _field(record, "corpusid", "corpusId")
+        url = _field(record, "url") or ""
+        paper_id = _field(record, "paperId") or (url.rstrip("/").rsplit("/", 1)[-1] if "/paper/" in url else None)
+        if corpus_id is None or not paper_id:
+            return None
+        corpus_id = int(corpus_id)
+
+        external = _field(record, "externalids", "externalIds") or {}
+        external_ids = [(normalize_external_id(f"{prefix}:{external[name]}"), corpus_id)
+                        for name, prefix in _EXTERNAL_ID_PREFIXES.items() if external.get(name)]
+
+        open_access = _field(record, "openAccessPdf")
+        meta = {
+            "paperId": paper_id,
+            "corpusId": corpus_id,
+            "externalIds": external or None,
+            "url": url or f"https://www.semanticscholar.org/paper/{paper_id}",
+            "title": _field(record, "title"),
+            "venue": _field(record, "venue"),
+            "year": _field(record, "year"),
+            "publicationDate": _field(record, "publicationdate", "publicationDate"),
+            "citationCount": _field(record, "citationcount", "citationCount") or 0,
+            "referenceCount": _field(record, "referencecount", "referenceCount") or 0,
+            "influentialCitationCount": _field(record, "influentialcitationcount", "influentialCitationCount") or 0,
+            "openAccessPdf": open_access,
+            "authors": [{"authorId": a.get("authorId"), "name": a.get("name")}
+                        for a in (_field(record, "authors") or []) if a],
+        }
+        return corpus_id, paper_id, meta["title"], _field(record, "abstract"), paper_codec.encode(meta), external_ids
+
+    def write_papers(self, conn: sqlite3.Connection, records: Iterable[Dict]) -> int:
+        papers, external_ids = [], []
+        for record in records:
+            row = self.paper_row(record)
+            if row:
+                papers.append(row[:5])
+                external_ids.extend(row[5])
+        conn.executemany(
+            "INSERT INTO papers (corpus_id, paper_id, title, abstract, meta) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(corpus_id) DO UPDATE SET paper_id=excluded.paper_id, title=excluded.title, "
+            "abstract=COALESCE(excluded.abstract, papers.abstract), meta=excluded.meta", papers)
+        conn.executemany("INSERT OR REPLACE INTO external_ids (external_id, corpus_id) VALUES (?, ?)", external_ids)
+        return len(papers)
+
+    @staticmethod
+    def write_abstracts(conn: sqlite3.Connection, records: Iterable[Dict]) -> int:
+        rows = [(r["abstract"], int(r["corpusid"])) for r in records if r.get("abstract") and r.get("corpusid")]
+        conn.executemany("UPDATE papers SET abstract = ? WHERE corpus_id = ?", rows)
+        return len(rows)
+
+    @staticmethod
+    def write_citations(conn: sqlite3.Connection, records: Iterable[Dict]) -> int:
+        rows = [(int(r["citingcorpusid"]), int(r["citedcorpusid"])) for r in records
+                if r.get("citingcorpusid") and r.get("citedcorpusid")]
+        conn.executemany("INSERT OR IGNORE INTO citations (citing, cited) VALUES (?, ?)", rows)
+        return len(rows)
+
+    def get_progress(self, path: str) -> Tuple[int, bool]:
+        row = self.connect().execute("SELECT lines, done FROM ingest_progress WHERE path = ?", (path,)).fetchone()
+        return (row[0], bool(row[1])) if row else (0, False)
+
+    @staticmethod
+    def set_progress(conn: sqlite3.Connection, path: str, lines: int, done: bool = False):
+        conn.execute(
+            "INSERT INTO ingest_progress (path, lines, done, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(path) DO UPDATE SET lines=excluded.lines, done=excluded.done, updated_at=excluded.updated_at",
+            (path, lines, int(done), time.time()))
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+    def _load(self, rows) -> Dict[int, Dict]:
+        papers = {}
+        for corpus_id, abstract, meta in rows:
+            paper = paper_codec.decode(meta)
+            paper["abstract"] = abstract
+            papers[corpus_id] = paper
+        return papers
+
+    def search(self, query: str, limit: int = 10, offset: int = 0) -> List[Dict]:
+        match = fts_query(query)
+        if not match:
+            return []
+        rows = self.connect().execute(
+            "SELECT p.corpus_id, p.abstract, p.meta FROM papers_fts f JOIN papers p ON p.corpus_id = f.rowid "
+            "WHERE papers_fts MATCH ? ORDER BY bm25(papers_fts, 2.0, 1.0) LIMIT ? OFFSET ?",
+            (match, limit, offset)).fetchall()
+        return list(self._load(rows).values())
+
+    def match_title(self, title: str) -> Optional[Dict]:
+        target = normalize_title(title)
+        if not target:
+            return None
+        match = '"' + target + '"'
+        rows = self.connect().execute(
+            "SELECT p.corpus_id, p.abstract, p.meta FROM papers_fts f JOIN papers p ON p.corpus_id = f.rowid "
+            "WHERE papers_fts MATCH ? ORDER BY bm25(papers_fts, 2.0, 1.0) LIMIT 20",
+            (f"title : {match}",)).fetchall()
+        best, best_ratio = None, 0.0
+        for paper in self._load(rows).values():
+            ratio = SequenceMatcher(None, target, normalize_title(paper.get("title"))).ratio()
+            if ratio > best_ratio:
+                best, best_ratio = paper, ratio
+        return best if best_ratio >= _TITLE_MATCH_THRESHOLD else None
+
+    def resolve_ids(self, paper_ids: List[str]) -> Dict[str, int]:
+        """将请求的论文ID（S2 paperId / CorpusId:xxx / DOI:xxx / ARXIV:xxx ...）解析为 corpus_id"""
+        conn = self.connect()
+        resolved, hashes, externals = {}, [], {}
+        for pid in paper_ids:
+            prefix, sep, value = pid.partition(":")
+            if not sep:
+                hashes.append(pid)
+            elif prefix.lower() == "corpusid" and value.strip().isdigit():
+                resolved[pid] = int(value)
+            else:
+                externals[normalize_external_id(pid)] = pid
+
+        for i in range(0, len(hashes), _QUERY_CHUNK_SIZE):
+            chunk = hashes[i:i + _QUERY_CHUNK_SIZE]
+            rows = conn.execute(f"SELECT paper_id, corpus_id FROM papers WHERE paper_id IN ({','.join('?' * len(chunk))})",
+                                chunk)
+            resolved.update(rows)
+        keys = list(externals)
+        for i in range(0, len(keys), _QUERY_CHUNK_SIZE):
+            chunk = keys[i:i + _QUERY_CHUNK_SIZE]
+            rows = conn.execute(
+                f"SELECT external_id, corpus_id FROM external_ids WHERE external_id IN ({','.join('?' * len(chunk))})", chunk)
+            for external_id, corpus_id in rows:
+                resolved[externals[external_id]] = corpus_id
+        return resolved
+
+    def _neighbors(self, corpus_id: int, direction: str) -> List[Dict]:
+        own, other = ("citing", "cited") if direction == "references" else ("cited", "citing")
+        rows = self.connect().execute(
+            f"SELECT p.paper_id, p.title FROM citations c JOIN papers p ON p.corpus_id = c.{other} "
+            f"WHERE c.{own} = ? LIMIT ?", (corpus_id, MAX_NESTED_EDGES))
+        return [{"paperId": paper_id, "title": title} for paper_id, title in rows]
+
+    def get_papers(self, paper_ids: List[str], include_edges: bool = True) -> List[Dict]:
+        """按请求顺序返回论文详情（与 /batch 一致，include_edges 时附带 references / citations），未收录的论文被跳过"""
+        resolved = self.resolve_ids(paper_ids)
+        corpus_ids = list(dict.fromkeys(resolved.values()))
+        conn = self.connect()
+        papers: Dict[int, Dict] = {}
+        for i in range(0, len(corpus_ids), _QUERY_CHUNK_SIZE):
+            chunk = corpus_ids[i:i + _QUERY_CHUNK_SIZE]
+            papers.update(self._load(conn.execute(
+                f"SELECT corpus_id, abstract, meta FROM papers WHERE corpus_id IN ({','.join('?' * len(chunk))})", chunk)))
+
+        results = []
+        for pid in paper_ids:
+            paper = papers.get(resolved.get(pid))
+            if not paper:
+                continue
+            if include_edges and "references" not in paper:
+                paper["references"] = self._neighbors(paper["corpusId"], "references")
+                paper["citations"] = self._neighbors(paper["corpusId"], "citations")
+            results.append(paper)
+        return results
+
+
+local_corpus = LocalCorpus(settings.LOCAL_CORPUS_PATH)
\ No newline at end of file
@@ -0,0 +1,37 @@
+import json
+import zlib
+from typing import Any
+
+try:
+    import msgpack
+except ImportError:  # msgpack 为可选依赖，未安装时使用紧凑 JSON
+    msgpack = None
+
+# 编码格式标记（首字节），便于后续更换编码而不影响旧数据的读取
+_FORMAT_MSGPACK_ZLIB = b"\x01"
+_FORMAT_JSON_ZLIB = b"\x02"
+
+# zlib 压缩等级（兼顾压缩率与 CPU 开销）
+_COMPRESS_LEVEL = 6
+
+
+def encode(obj: Any) -> bytes:
+    """将对象编码为紧凑的二进制格式：msgpack（或紧凑 JSON）+ zlib 压缩"""
+    if msgpack is not None:
+        return _FORMAT_MSGPACK_ZLIB + zlib.compress(msgpack.packb(obj, use_bin_type=True), _COMPRESS_LEVEL)
+    raw = json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return _FORMAT_JSON_ZLIB + zlib.compress(raw, _COMPRESS_LEVEL)
+
+
+def decode(data: bytes) -> Any:
+    """解码 encode 生成的数据；兼容旧版本直接写入的 JSON 文本"""
+    if not data:
+        return None
+    header, body = data[:1], data[1:]
+    if header == _FORMAT_MSGPACK_ZLIB:
+        if msgpack is None:
+            raise RuntimeError("msgpack is required to decode this record")
+        return msgpack.unpackb(zlib.decompress(body), raw=False)
+    if header == _FORMAT_JSON_ZLIB:
+        return json.loads(zlib.decompress(body))
+    return json.loads(data)
\ No newline at end of file
@@ -0,0 +1,93 @@
+import heapq
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+from utils.graph_scoring import CitationGraph
+
+
+class PaperStats:
+    """
+    单次检索会话的论文频次统计。
+    每次 SearchWorkflow.run 创建独立实例并逐层传递给各 Agent，
+    不同用户的并发查询互不干扰；同一次运行只在一个协程中更新，因此无需加锁。
+
+    内部按频次分桶 (count -> 有序的 paper_id 集合)，get_top_k 只需按频次从高到低遍历非空的桶，
+    读取代价为 O(B + k log B)（B 为不同频次的个数，远小于论文数），无需全量排序。
+    record_graph=True 时同时记录引用边 (graph)，供图评分模式 (CANDIDATE_MODE=graph) 选取候选。
+    """
+
+    def __init__(self, record_graph: bool = False):
+        """
+        初始化会话数据结构
+        stats:    paper_id (str) -> count (int)
+        _buckets: count (int) -> {paper_id: None}（利用 dict 保持插入顺序）
+        graph:    扩展得到的引用子图，未开启记录时为 None
+        """
+        self.stats: Dict[str, int] = {}
+        self._buckets: Dict[int, Dict[str, None]] = {}
+        self.graph: Optional[CitationGraph] = CitationGraph() if record_graph else None
+
+    def __len__(self) -> int:
+        return len(self.stats)
+
+    def _add(self, paper_id: str, amount: int):
+        """将 paper_id 的频次增加 amount，并把它移动到新的频次桶"""
+        old = self.stats.get(paper_id, 0)
+        new = old + amount
+        self.stats[paper_id] = new
+
+        if old:
+            bucket = self._buckets[old]
+            del bucket[paper_id]
+            if not bucket:
+                del self._buckets[old]
+        self._buckets.setdefault(new, {})[paper_id] = None
+
+    def get_count(self, paper_id: str) -> int:
+        return self.stats.get(paper_id, 0)
+
+    def increment_count(self, paper_id: str):
+        """如果存在则+1，不存在则初始化为1"""
+        self._add(paper_id, 1)
+
+    def increment_many(self, paper_ids: Iterable[str], amount: int = 1):
+        """
+        批量累加频次（一篇论文的全部引用/被引 ID 一次调用完成）。
+        列表中重复出现的 ID 会按出现次数累加，与逐条调用 increment_count 的结果一致。
+        """
+        for paper_id, times in Counter(paper_ids).items():
+            if paper_id:
+                self._add(paper_id, times * amount)
+
+    def add_edges(self, paper_id: str, references: List[str], citations: List[str]):
+        """累加一篇论文全部引用/被引 ID 的频次，开启图记录时同时记录引用边"""
+        self.increment_many([*references, *citations])
+        if self.graph is not None and paper_id:
+            self.graph.add_edges(paper_id, references, citations)
+
+    def set_initial_count(self, paper_id: str):
+        """用于种子搜索，如果不存在则置为2，如果已存在则+2"""
+        # 种子论文的初始默认频次给2，以防止因为其它论文出现频次较高而把种子论文的排序给挤下去
+        self._add(paper_id, 2)
+        if self.graph is not None:
+            self.graph.add_seed(paper_id)
+
+    def get_top_k(self, k: int = 10) -> List[Tuple[str, int]]:
+        """获取频次最高的 Top-K 论文ID（按频次从高到低）"""
+        result: List[Tuple[str, int]] = []
+        # 只遍历非空的频次桶（频次可能跨越很大的空档，例如某篇论文被引用数千次）
+        counts = [-count for count in self._buckets]
+        heapq.heapify(counts)
+        while counts and len(result) < k:
+            count = -heapq.heappop(counts)
+            for paper_id in self._buckets[count]:
+                result.append((paper_id, count))
+                if len(result) >= k:
+                    break
+        return result
+
+    def clear(self):
+        """清空状态"""
+        self.stats.clear()
+        self._buckets.clear()
+        if self.graph is not None:
+            self.graph = CitationGraph()
\ No newline at end of file
@@ -0,0 +1,94 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Sequence, Tuple
+from utils.logger import setup_logger
+from utils.telemetry import span
+
+logger = setup_logger("pipeline")
+
+
+class StagePipeline:
+    """
+    轻量级异步阶段依赖图。
+    每个阶段声明其依赖的阶段，运行时所有阶段同时创建为 Task，依赖完成后立即开始，
+    没有依赖关系的阶段自然并行。阶段函数以依赖阶段的结果作为位置参数。
+    阶段内部也可以通过 get() 按需等待其它阶段（软依赖），或通过 cancel() 取消不再需要的阶段。
+    运行结束后记录每个阶段的开始/结束时间，并可计算关键路径。
+    """
+
+    def __init__(self, name: str = "pipeline"):
+        self.name = name
+        self._stages: Dict[str, Tuple[Callable[..., Awaitable[Any]], Tuple[str, ...]]] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.timings: Dict[str, Tuple[float, float]] = {}
+        self._t0 = 0.0
+
+    def add_stage(self, name: str, func: Callable[..., Awaitable[Any]], deps: Sequence[str] = ()):
+        for dep in deps:
+            if dep not in self._stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dep}'")
+        self._stages[name] = (func, tuple(deps))
+
+    def has_stage(self, name: str) -> bool:
+        return name in self._stages
+
+    async def get(self, name: str) -> Any:
+        """等待并返回某个阶段的结果（不会因调用方被取消而取消该阶段）"""
+        return await asyncio.shield(self._tasks[name])
+
+    def cancel(self, name: str):
+        """取消尚未完成的阶段"""
+        task = self._tasks.get(name)
+        if task and not task.done():
+            task.cancel()
+
+    async def _run_stage(self, name: str) -> Any:
+        func, deps = self._stages[name]
+        dep_results = [await self._tasks[dep] for dep in deps]
+        start = time.monotonic() - self._t0
+        try:
+            with span("stage", pipeline=self.name, stage=name):
+                return await func(*dep_results)
+        finally:
+            self.timings[name] = (start, time.monotonic() - self._t0)
+
+    async def run(self, target: str) -> Any:
+        """运行流水线直到 target 阶段完成，返回其结果；任一阶段抛出的异常原样向上抛出"""
+        self._t0 = time.monotonic()
+        self.timings.clear()
+        self._tasks = {
+            name: asyncio.create_task(self._run_stage(name), name=f"{self.name}:{name}")
+            for name in self._stages
+        }
+        try:
+            return await self._tasks[target]
+        finally:
+            for task in self._tasks.values():
+                if not task.done():
+                    task.cancel()
+            # 回收所有阶段，避免出现未获取的异常
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    def critical_path(self, target: str) -> List[str]:
+        """从 target 沿着“最晚完成的依赖”回溯，得到决定总耗时的关键路径"""
+        if target not in self.timings:
+            return []
+        path = [target]
+        current = target
+        while True:
+            deps = [d for d in self._stages[current][1] if d in self.timings]
+            if not deps:
+                break
+            current = max(deps, key=lambda d: self.timings[d][1])
+            path.append(current)
+        return list(reversed(path))
+
+    def format_timings(self, target: str) -> str:
+        """格式化阶段耗时表（按开始时间排序）与关键路径"""
+        lines = [f"[{self.name}] Stage timings (seconds):"]
+        for name, (start, end) in sorted(self.timings.items(), key=lambda item: item[1][0]):
+            lines.append(f"  {name:<20} start={start:7.3f}  end={end:7.3f}  duration={end - start:7.3f}")
+        path = self.critical_path(target)
+        if path:
+            lines.append(f"  Critical path: {' -> '.join(path)}")
+        return "\n".join(lines)
\ No newline at end of file
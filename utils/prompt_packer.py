@@ -0,0 +1,170 @@
+import math
+import re
+from typing import Callable, Dict, List, Sequence, Tuple
+from utils import relevance
+from utils.telemetry import COUNT_BUCKETS, telemetry
+from utils.logger import setup_logger
+
+logger = setup_logger("prompt_packer")
+
+_CJK_RE = re.compile(r"[一-鿿　-〿＀-￯]")
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?。！？;；])\s+|(?<=[。！？；])")
+
+# tiktoken 为可选依赖：安装且编码表可用时精确计数，否则使用字符估算
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:  # 未安装或无法下载编码表
+            logger.info(f"tiktoken unavailable ({type(e).__name__}), using character-based token estimate.")
+    return _encoding
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    估算文本的 Token 数。
+    无 tiktoken 时：中文等全角字符按 1 字 1 Token，其余按约 4 个字符 1 Token 计算（对 Qwen 分词器偏保守）。
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    """按单词截断到 max_tokens 以内（用于单句就超出预算的情况），省略号计入预算"""
+    words = text.split()
+
+    def cut(count: int) -> str:
+        return " ".join(words[:count]) + (" ..." if count < len(words) else "")
+
+    lo, hi = 0, len(words)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if estimate_tokens(cut(mid)) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return cut(lo) if lo or estimate_tokens(cut(0)) <= max_tokens else ""
+
+
+def key_sentences(text: str, query: str, max_tokens: int) -> str:
+    """
+    抽取式压缩：按与查询的词重叠度（首句额外加分，通常概括全文）为句子打分，
+    在 max_tokens 内贪心选取得分最高的句子，并按原文顺序拼接。
+    """
+    if not text or max_tokens <= 0:
+        return ""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    sentences = [s.strip() for s in _SENTENCE_SPLIT_RE.split(text) if s and s.strip()]
+    query_terms = set(relevance.tokenize(query))
+    scored = []
+    for index, sentence in enumerate(sentences):
+        terms = relevance.tokenize(sentence)
+        overlap = len(query_terms.intersection(terms)) / math.sqrt(len(terms) or 1)
+        scored.append((overlap + (0.5 if index == 0 else 0.0), index, sentence))
+
+    selected, used = [], 0
+    for _, index, sentence in sorted(scored, key=lambda item: (-item[0], item[1])):
+        # 拼接用的空格按 1 个 Token 计入，保证拼接后的文本不超出预算
+        cost = estimate_tokens(sentence) + (1 if selected else 0)
+        if used + cost <= max_tokens:
+            selected.append((index, sentence))
+            used += cost
+    if not selected:
+        best = max(scored, key=lambda item: (item[0], -item[1]))[2]
+        return _truncate(best, max_tokens)
+    return " ".join(sentence for _, sentence in sorted(selected))
+
+
+def allocate(needs: Sequence[int], weights: Sequence[float], available: int) -> List[int]:
+    """
+    按权重分配 Token 预算（water-filling）：需求小于份额的论文只取所需，
+    剩余预算按权重重新分给其它论文，直到预算用完或所有需求都被满足。
+    """
+    allot = [0] * len(needs)
+    active = [i for i, need in enumerate(needs) if need > 0]
+    remaining = max(0, available)
+    while active and remaining > 0:
+        weight_sum = sum(weights[i] for i in active)
+        shares = {i: remaining * weights[i] / weight_sum for i in active}
+        satisfied = [i for i in active if needs[i] <= shares[i]]
+        if not satisfied:
+            for i in active:
+                allot[i] = int(shares[i])
+            break
+        for i in satisfied:
+            allot[i] = needs[i]
+            remaining -= needs[i]
+        active = [i for i in active if i not in satisfied]
+    return allot
+
+
+class PromptPacker:
+    """
+    在给定的 Token 预算内打包论文列表的 Prompt 文本。
+    每篇论文的固定字段（ID、标题等）原样保留，剩余预算按排名权重 1 / (rank + 1)^decay 分配给摘要，
+    超出分配的摘要通过 key_sentences 抽取关键句压缩；排名越靠前的论文保留的摘要越完整。
+    """
+
+    def __init__(self, budget: int, min_abstract_tokens: int = 40, decay: float = 0.5):
+        self.budget = budget
+        self.min_abstract_tokens = min_abstract_tokens
+        self.decay = decay
+
+    def pack(self, papers: Sequence[Dict], query: str, render: Callable[[Dict, str], str],
+             overhead: str = "") -> Tuple[List[str], Dict[str, int]]:
+        """
+        Args:
+            papers: 按排名排列的论文
+            query: 关键句抽取使用的查询（调研主题）
+            render: render(paper, abstract) -> 该论文在 Prompt 中的文本
+            overhead: Prompt 中除论文外的其它文本（系统提示词等），计入预算
+
+        Returns:
+            (每篇论文渲染后的文本, 统计信息 {"tokens", "abstract_tokens", "original_abstract_tokens", "budget"})
+        """
+        abstracts = [paper.get("abstract") or "" for paper in papers]
+        fixed = sum(estimate_tokens(render(paper, "")) for paper in papers) + estimate_tokens(overhead)
+        needs = [estimate_tokens(abstract) for abstract in abstracts]
+        weights = [1 / (rank + 1) ** self.decay for rank in range(len(papers))]
+        allot = allocate(needs, weights, self.budget - fixed)
+
+        blocks, abstract_tokens = [], 0
+        for paper, abstract, need, tokens in zip(papers, abstracts, needs, allot):
+            tokens = max(tokens, min(need, self.min_abstract_tokens))
+            packed = abstract if need <= tokens else key_sentences(abstract, query, tokens)
+            abstract_tokens += estimate_tokens(packed)
+            blocks.append(render(paper, packed))
+
+        stats = {
+            "tokens": fixed + abstract_tokens,
+            "abstract_tokens": abstract_tokens,
+            "original_abstract_tokens": sum(needs),
+            "budget": self.budget,
+        }
+        return blocks, stats
+
+
+def drop_empty(fields: Dict) -> Dict:
+    """去掉值为空的字段（None / 空字符串 / 空列表），减少无信息量的 Token"""
+    return {key: value for key, value in fields.items() if value not in (None, "", [], {})}
+
+
+def record_packing(agent: str, stats: Dict[str, int]):
+    """记录打包结果（日志 + prompt_packed_tokens 指标）"""
+    telemetry.observe("prompt_packed_tokens", stats["tokens"], buckets=COUNT_BUCKETS, agent=agent)
+    logger.info(f"{agent} prompt packed: {stats['tokens']} tokens (budget {stats['budget']}), abstracts "
+                f"{stats['abstract_tokens']}/{stats['original_abstract_tokens']} tokens kept")
\ No newline at end of file
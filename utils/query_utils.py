@@ -0,0 +1,12 @@
+import hashlib
+import unicodedata
+
+
+def normalize_query(query: str) -> str:
+    """规范化查询（全角转半角、小写、合并空白），用于规则匹配与缓存 Key"""
+    return " ".join(unicodedata.normalize("NFKC", query or "").lower().split())
+
+
+def query_digest(query: str) -> str:
+    """规范化查询的 SHA1 摘要，用作 Redis 缓存 Key 的一部分"""
+    return hashlib.sha1(normalize_query(query).encode("utf-8")).hexdigest()
\ No newline at end of file
@@ -0,0 +1,36 @@
+import asyncio
+import weakref
+import redis.asyncio as aioredis
+from config.settings import settings
+
+# 每个事件循环持有一个共享的异步 Redis 连接池（连接绑定在创建它的事件循环上）
+# 注意：返回的是原始 bytes（decode_responses=False），以便同时存放 JSON 文本与二进制编码数据
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aioredis.Redis]" = weakref.WeakKeyDictionary()
+
+
+def get_async_redis() -> aioredis.Redis:
+    """获取当前事件循环共享的异步 Redis 客户端"""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        # 连接数达到上限时阻塞等待空闲连接，而不是直接抛错
+        pool = aioredis.BlockingConnectionPool(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            password=settings.REDIS_PASSWORD,
+            db=settings.REDIS_DB,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            timeout=settings.REDIS_POOL_TIMEOUT,
+            decode_responses=False
+        )
+        client = aioredis.Redis(connection_pool=pool)
+        _clients[loop] = client
+    return client
+
+
+async def close_async_redis():
+    """关闭当前事件循环的共享 Redis 客户端"""
+    loop = asyncio.get_running_loop()
+    client = _clients.pop(loop, None)
+    if client is not None:
+        await client.aclose(close_connection_pool=True)
\ No newline at end of file
@@ -0,0 +1,79 @@
+import re
+from collections import Counter
+from typing import Dict, List, Sequence
+import numpy as np
+
+# 英文按单词切分，中文按单字切分
+_TOKEN_RE = re.compile(r"[a-z0-9]+|[一-鿿]")
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "of", "on",
+    "or", "that", "the", "this", "to", "with", "we", "our", "via", "using", "based", "towards",
+}
+
+
+def _stem(token: str) -> str:
+    """极简词干化：去掉英文复数 s（agents -> agent），不处理 ss 结尾"""
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    return [_stem(t) for t in _TOKEN_RE.findall((text or "").lower()) if t not in _STOPWORDS]
+
+
+def paper_text(paper: Dict) -> str:
+    """参与相关性计算的文本：标题 + 摘要（标题重复一次以提高权重）"""
+    title = paper.get("title") or ""
+    return f"{title} {title} {paper.get('abstract') or ''}"
+
+
+def bm25_scores(query: str, documents: Sequence[str], k1: float = 1.5, b: float = 0.75) -> np.ndarray:
+    """
+    计算每篇文档相对查询的 BM25 分数。
+    只为查询中出现的词建立词频矩阵 (n_docs x n_terms)，打分过程完全向量化。
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    n_docs = len(documents)
+    if not terms or n_docs == 0:
+        return np.zeros(n_docs)
+
+    term_index = {t: i for i, t in enumerate(terms)}
+    tf = np.zeros((n_docs, len(terms)))
+    doc_len = np.zeros(n_docs)
+    for row, doc in enumerate(documents):
+        tokens = tokenize(doc)
+        doc_len[row] = len(tokens)
+        for token, count in Counter(tokens).items():
+            col = term_index.get(token)
+            if col is not None:
+                tf[row, col] = count
+
+    df = np.count_nonzero(tf, axis=0)
+    idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+    avgdl = doc_len.mean() or 1.0
+    norm = k1 * (1 - b + b * doc_len / avgdl)
+    return (tf * (k1 + 1) / (tf + norm[:, None])) @ idf
+
+
+def rerank(query: str, papers: Sequence[Dict], frequencies: Sequence[int], relevance_weight: float) -> List[int]:
+    """
+    结合 BM25 相关性与引用频次对候选论文重新排序。
+    两项分数分别归一化到 [0, 1]（频次取 log 以削弱枢纽论文的影响）后按权重线性组合。
+
+    Returns:
+        按综合得分从高到低排列的论文下标列表
+    """
+    if not papers:
+        return []
+
+    relevance = bm25_scores(query, [paper_text(p) for p in papers])
+    freq = np.log1p(np.asarray(frequencies, dtype=float))
+
+    if relevance.max() > 0:
+        relevance = relevance / relevance.max()
+    if freq.max() > 0:
+        freq = freq / freq.max()
+
+    combined = relevance_weight * relevance + (1 - relevance_weight) * freq
+    return np.argsort(-combined, kind="stable").tolist()
\ No newline at end of file
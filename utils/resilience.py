@@ -0,0 +1,141 @@
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+from utils.logger import setup_logger
+
+logger = setup_logger("resilience")
+
+
+class TokenBucket:
+    """
+    令牌桶限流器（进程内共享）。
+    rate 为每秒补充的令牌数，capacity 为允许的突发请求数；rate <= 0 表示不限流。
+    获取令牌时直接“预支”，令牌不足时计算需要等待的时间后 sleep，不持有锁等待，
+    因此可以在多个事件循环/会话之间共享同一个实例。
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """预支一个令牌，返回调用方需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._paused_until - now)
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        """上游要求限流（如 429 + Retry-After）时，让所有后续请求至少等待 seconds 秒"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，请求被直接拒绝"""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"Circuit '{name}' is open, retry in {retry_in:.0f}s")
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    熔断器：连续失败 failure_threshold 次后打开，recovery_timeout 秒内的请求直接失败；
+    超时后进入半开状态，只放行一个探测请求，成功则关闭，失败则重新打开。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, recovery_timeout: float):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_timeout = recovery_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_started: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at >= self.recovery_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def before_call(self):
+        """请求前调用，熔断打开时抛出 CircuitOpenError"""
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return
+            now = time.monotonic()
+            if state == self.HALF_OPEN:
+                # 半开状态只放行一个探测请求（探测请求长时间无结果时允许重新探测）
+                if self._probe_started is None or now - self._probe_started >= self.recovery_timeout:
+                    self._probe_started = now
+                    return
+                raise CircuitOpenError(self.name, self.recovery_timeout - (now - self._probe_started))
+            raise CircuitOpenError(self.name, self.recovery_timeout - (now - self._opened_at))
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info(f"Circuit '{self.name}' closed.")
+            self._failures = 0
+            self._opened_at = None
+            self._probe_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_started = None
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning(f"Circuit '{self.name}' opened after {self._failures} consecutive failures.")
+                self._opened_at = time.monotonic()
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == self.OPEN
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """指数退避 + 全抖动：在 [0, min(cap, base * 2^attempt)] 内随机取值，避免并发请求同时重试"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 响应头（秒数或 HTTP 日期），返回需要等待的秒数"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
\ No newline at end of file
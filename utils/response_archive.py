@@ -0,0 +1,172 @@
+import atexit
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+from config.settings import settings
+from utils.logger import setup_logger
+
+logger = setup_logger("response_archive")
+
+# 队列结束标记
+_STOP = object()
+
+
+class ResponseArchive:
+    """
+    API 响应归档（调试用）。
+    请求线程只负责把记录放入队列，由后台线程序列化为紧凑 JSONL 并压缩写入 (gzip / zstd)，
+    不阻塞事件循环。归档文件按大小/时间轮转，并按保留天数与总大小上限清理旧文件。
+    队列写满时直接丢弃记录，保证请求路径不受磁盘速度影响。
+    """
+
+    FILE_PREFIX = "responses_"
+
+    def __init__(self):
+        self.enabled = settings.RESPONSE_ARCHIVE_ENABLED
+        self.directory = settings.RESPONSE_ARCHIVE_DIR
+        self.codec = settings.RESPONSE_ARCHIVE_CODEC
+        self.max_file_bytes = settings.RESPONSE_ARCHIVE_MAX_FILE_MB * 1024 * 1024
+        self.rotate_seconds = settings.RESPONSE_ARCHIVE_ROTATE_SECONDS
+        self.retention_seconds = settings.RESPONSE_ARCHIVE_RETENTION_DAYS * 86400
+        self.max_total_bytes = settings.RESPONSE_ARCHIVE_MAX_TOTAL_MB * 1024 * 1024
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=settings.RESPONSE_ARCHIVE_QUEUE_SIZE)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._dropped = 0
+
+        # 当前写入中的文件
+        self._raw = None
+        self._writer = None
+        self._opened_at = 0.0
+
+    def record(self, kind: str, request: Dict[str, Any], response: Any):
+        """
+        提交一条归档记录（非阻塞）。
+        Args:
+            kind: 记录类型，例如 'search_papers' / 'batch_details'
+            request: 请求参数
+            response: 原始响应数据
+        """
+        if not self.enabled:
+            return
+        self._ensure_started()
+        try:
+            self._queue.put_nowait({"ts": time.time(), "kind": kind, "request": request, "response": response})
+        except queue.Full:
+            self._dropped += 1
+            if self._dropped % 100 == 1:
+                logger.warning(f"[Archive] Queue full, dropped {self._dropped} records so far.")
+
+    def close(self, timeout: float = 10):
+        """写完队列中剩余记录并关闭当前文件（进程退出时自动调用）"""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    # --- 后台线程 ---
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self._thread = threading.Thread(target=self._run, name="response-archive", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                self._close_file()
+                return
+            try:
+                self._write(item)
+                # 队列空闲时刷新压缩缓冲区，尽量减少进程异常退出时丢失的数据
+                if self._queue.empty() and self._writer is not None:
+                    self._writer.flush()
+            except Exception as e:
+                logger.error(f"[Archive] Failed to write record: {e}")
+
+    def _write(self, item: Dict[str, Any]):
+        line = json.dumps(item, ensure_ascii=False, separators=(",", ":")) + "\n"
+        if self._writer is None or self._should_rotate():
+            self._rotate()
+        self._writer.write(line.encode("utf-8"))
+
+    def _should_rotate(self) -> bool:
+        return (self._raw.tell() >= self.max_file_bytes
+                or time.time() - self._opened_at >= self.rotate_seconds)
+
+    def _open_writer(self, path: str):
+        raw = open(path, "wb")
+        if self.codec == "zstd":
+            import zstandard
+            return raw, zstandard.ZstdCompressor(level=3).stream_writer(raw, closefd=False)
+        return raw, gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6)
+
+    def _rotate(self):
+        self._close_file()
+        if self.codec == "zstd":
+            try:
+                import zstandard  # noqa: F401
+            except ImportError:
+                logger.warning("[Archive] zstandard is not installed, falling back to gzip.")
+                self.codec = "gzip"
+        suffix = ".jsonl.zst" if self.codec == "zstd" else ".jsonl.gz"
+        # 文件名包含时间、进程号与随机串，多进程/同一秒内写入也不会互相覆盖
+        file_name = f"{self.FILE_PREFIX}{time.strftime('%Y%m%d-%H%M%S')}_{os.getpid()}_{uuid.uuid4().hex[:8]}{suffix}"
+        path = os.path.join(self.directory, file_name)
+        self._raw, self._writer = self._open_writer(path)
+        self._opened_at = time.time()
+        logger.info(f"[Archive] Writing responses to: {path}")
+        self._prune()
+
+    def _close_file(self):
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            finally:
+                self._raw.close()
+        self._raw = None
+        self._writer = None
+
+    def _prune(self):
+        """删除超过保留期限的归档，并在总大小超限时从最旧的文件开始删除"""
+        files = []
+        for name in os.listdir(self.directory):
+            if not name.startswith(self.FILE_PREFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+
+        files.sort()
+        now = time.time()
+        total = sum(size for _, size, _ in files)
+        current = self._raw.name if self._raw is not None else None
+        for mtime, size, path in files:
+            if path == current:
+                continue
+            if now - mtime > self.retention_seconds or total > self.max_total_bytes:
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError as e:
+                    logger.error(f"[Archive] Failed to remove {path}: {e}")
+
+
+# 导出进程级归档实例
+response_archive = ResponseArchive()
+atexit.register(response_archive.close)
\ No newline at end of file
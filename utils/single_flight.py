@@ -0,0 +1,79 @@
+import asyncio
+import hashlib
+import json
+import weakref
+from typing import Any, Awaitable, Callable, Dict
+from utils.concurrency import llm_limiter
+from utils.logger import setup_logger
+
+logger = setup_logger("single_flight")
+
+
+def make_key(*parts: Any) -> str:
+    """由请求参数生成合并 Key（参数需可 JSON 序列化，字典按键排序）"""
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    进程内请求合并 (single-flight)：相同 Key 的并发调用共享同一个进行中的任务，
+    只有第一个调用真正执行，其余调用等待同一个结果（或同一个异常）。
+    任务完成后立即移除，不做结果缓存（缓存由 Redis 层负责）。
+    共享结果会返回给多个调用方，调用方应将其视为只读。
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        # 任务绑定在创建它的事件循环上，因此按事件循环分别记录进行中的调用
+        self._flights: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, _Flight]]" = weakref.WeakKeyDictionary()
+
+    def _loop_flights(self) -> Dict[str, _Flight]:
+        loop = asyncio.get_running_loop()
+        flights = self._flights.get(loop)
+        if flights is None:
+            flights = self._flights[loop] = {}
+        return flights
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        flights = self._loop_flights()
+        flight = flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(func()))
+            flights[key] = flight
+            flight.task.add_done_callback(lambda _, k=key, f=flight: flights.pop(k, None) if flights.get(k) is f else None)
+        else:
+            logger.info(f"Single-flight [{self.name}] joined in-flight call {key[:12]}")
+
+        flight.waiters += 1
+        try:
+            # shield：某个调用方被取消时不影响其它等待同一结果的调用方
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            # 所有调用方都已取消时，取消底层任务，避免无人等待的上游请求继续执行
+            if flight.waiters == 1 and not flight.task.done():
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+
+# 各 Agent 的 LLM 链共享一个合并层
+_llm_flight = SingleFlight("llm")
+
+
+async def coalesced_ainvoke(namespace: str, chain, inputs: Dict[str, Any]) -> Any:
+    """以 (namespace, 输入) 为 Key 合并并发的相同 LLM 链调用（实际调用受 LLM_MAX_CONCURRENCY 限制）"""
+    async def invoke() -> Any:
+        async with llm_limiter:
+            return await chain.ainvoke(inputs)
+
+    return await _llm_flight.do(make_key(namespace, inputs), invoke)
\ No newline at end of file
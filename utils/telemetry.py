@@ -0,0 +1,294 @@
+import asyncio
+import atexit
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from langchain_core.callbacks import AsyncCallbackHandler
+from config.settings import settings
+from utils.logger import setup_logger
+
+logger = setup_logger("telemetry")
+
+METRIC_PREFIX = "academic_agent_"
+
+# 直方图分桶：耗时（秒）、字节数、数量
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+COUNT_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class _Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.series: Dict[LabelKey, List[float]] = {}  # [每个分桶的计数..., +Inf 计数, sum]
+
+    def observe(self, key: LabelKey, value: float):
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = [0.0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self, name: str) -> List[str]:
+        lines = [f"# TYPE {name} histogram"]
+        for key, series in sorted(self.series.items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(key, ('le', repr(float(bound))))} {cumulative:g}")
+            cumulative += series[len(self.buckets)]
+            lines.append(f"{name}_bucket{_format_labels(key, ('le', '+Inf'))} {cumulative:g}")
+            lines.append(f"{name}_sum{_format_labels(key)} {series[-1]:g}")
+            lines.append(f"{name}_count{_format_labels(key)} {cumulative:g}")
+        return lines
+
+
+class Telemetry:
+    """
+    进程内指标注册表：直方图 + 计数器，可渲染为 Prometheus 文本格式。
+    同时保留最近的 span 记录（结构化字段），便于排查单次请求。
+    """
+
+    def __init__(self, recent_spans: int = 1000):
+        self._histograms: Dict[str, _Histogram] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._lock = threading.Lock()
+        self.recent_spans: "deque[Dict[str, Any]]" = deque(maxlen=recent_spans)
+
+    def observe(self, name: str, value: float, buckets: Sequence[float] = DURATION_BUCKETS, **labels):
+        if not settings.METRICS_ENABLED:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = _Histogram(buckets)
+            histogram.observe(_label_key(labels), value)
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        if not settings.METRICS_ENABLED:
+            return
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            key = _label_key(labels)
+            series[key] = series.get(key, 0) + amount
+
+    def cache_result(self, cache: str, hits: int, misses: int = 0):
+        """记录缓存命中/未命中次数"""
+        if hits:
+            self.inc("cache_requests_total", hits, cache=cache, result="hit")
+        if misses:
+            self.inc("cache_requests_total", misses, cache=cache, result="miss")
+
+    def record_span(self, record: Dict[str, Any]):
+        labels = {"span": record["name"], "status": record["status"], **record["labels"]}
+        self.observe("span_duration_seconds", record["duration"], **labels)
+        for key, value in record["values"].items():
+            buckets = BYTES_BUCKETS if key.endswith(("_bytes", "_chars")) else COUNT_BUCKETS
+            self.observe(f"span_{key}", value, buckets=buckets, span=record["name"], **record["labels"])
+        self.recent_spans.append(record)
+        if settings.TELEMETRY_LOG_SPANS:
+            logger.info(json.dumps(record, ensure_ascii=False, default=str))
+
+    def render_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                full_name = METRIC_PREFIX + name
+                lines.append(f"# TYPE {full_name} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{full_name}{_format_labels(key)} {value:g}")
+            for name, histogram in sorted(self._histograms.items()):
+                lines.extend(histogram.render(METRIC_PREFIX + name))
+        return "\n".join(lines) + "\n"
+
+    def write_file(self, path: Optional[str] = None):
+        """原子写入 Prometheus 文本文件（可供 node_exporter textfile collector 采集）"""
+        path = path or settings.METRICS_FILE
+        if not path or not settings.METRICS_ENABLED:
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(self.render_prometheus())
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Failed to write metrics file {path}: {e}")
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self.recent_spans.clear()
+
+
+telemetry = Telemetry()
+atexit.register(telemetry.write_file)
+
+
+def start_metrics_server(host: str, port: int, path: str = "/metrics"):
+    """在后台线程中启动只提供 Prometheus 指标的 HTTP 服务（与应用服务的端口分开），端口被占用时记录错误并返回 None"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != path:
+                self.send_error(404)
+                return
+            body = telemetry.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    try:
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as e:
+        logger.error(f"Failed to start metrics server on {host}:{port}: {e}")
+        return None
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info(f"Metrics served at http://{host}:{server.server_address[1]}{path}")
+    return server
+
+
+class Span:
+    """一次被追踪的操作：labels 为低基数的维度（进入指标标签），values 为数值型测量（进入直方图）"""
+
+    __slots__ = ("name", "labels", "values", "trace_id", "span_id", "parent_id")
+
+    def __init__(self, name: str, labels: Dict[str, Any], parent: Optional["Span"]):
+        self.name = name
+        self.labels = labels
+        self.values: Dict[str, float] = {}
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+
+    def set_label(self, **labels):
+        self.labels.update(labels)
+
+    def record(self, **values: float):
+        """记录数值测量（如 payload_bytes、items、tokens），同名测量会累加"""
+        for key, value in values.items():
+            if value is not None:
+                self.values[key] = self.values.get(key, 0) + value
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+@contextmanager
+def span(name: str, **labels) -> Iterator[Span]:
+    """
+    追踪一段操作的耗时，可用于同步或异步代码（with span(...) 包裹 await 调用）。
+    嵌套调用自动继承 trace_id，异常时 status=error 并继续抛出。
+    """
+    parent = _current_span.get()
+    current = Span(name, labels, parent)
+    token = _current_span.set(current)
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield current
+    except BaseException as e:
+        status = "cancelled" if isinstance(e, asyncio.CancelledError) else "error"
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        _current_span.reset(token)
+        telemetry.record_span({
+            "trace_id": current.trace_id, "span_id": current.span_id, "parent_id": current.parent_id,
+            "name": name, "status": status, "duration": duration,
+            "labels": current.labels, "values": current.values, "ts": time.time(),
+        })
+
+
+class LLMTelemetryCallback(AsyncCallbackHandler):
+    """
+    LangChain 回调：记录每次 LLM 调用的耗时、输入输出字符数与 Token 用量（按 Agent 区分）。
+    Token 用量优先读取消息的 usage_metadata，其次读取 llm_output 中的 token_usage（DashScope 格式）。
+    """
+
+    def __init__(self, agent: str):
+        self.agent = agent
+        self._starts: Dict[Any, Tuple[float, int]] = {}
+
+    async def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        prompt_chars = sum(len(str(m.content)) for batch in messages for m in batch)
+        self._starts[run_id] = (time.perf_counter(), prompt_chars)
+
+    async def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._starts[run_id] = (time.perf_counter(), sum(len(p) for p in prompts))
+
+    @staticmethod
+    def _token_usage(response) -> Tuple[int, int]:
+        prompt_tokens = completion_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+        if not prompt_tokens and not completion_tokens:
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            prompt_tokens = usage.get("input_tokens") or usage.get("prompt_tokens") or 0
+            completion_tokens = usage.get("output_tokens") or usage.get("completion_tokens") or 0
+        return prompt_tokens, completion_tokens
+
+    async def on_llm_end(self, response, *, run_id, **kwargs):
+        start, prompt_chars = self._starts.pop(run_id, (None, 0))
+        self._record(start, prompt_chars, response, "ok")
+
+    async def on_llm_error(self, error, *, run_id, **kwargs):
+        start, prompt_chars = self._starts.pop(run_id, (None, 0))
+        self._record(start, prompt_chars, None, "error")
+
+    def _record(self, start: Optional[float], prompt_chars: int, response, status: str):
+        if start is None:
+            return
+        duration = time.perf_counter() - start
+        completion_chars = 0
+        prompt_tokens = completion_tokens = 0
+        if response is not None:
+            completion_chars = sum(len(g.text or "") for gens in response.generations for g in gens)
+            prompt_tokens, completion_tokens = self._token_usage(response)
+
+        parent = _current_span.get()
+        values = {"prompt_chars": prompt_chars, "completion_chars": completion_chars}
+        if prompt_tokens or completion_tokens:
+            values.update(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+            telemetry.inc("llm_tokens_total", prompt_tokens, agent=self.agent, type="prompt")
+            telemetry.inc("llm_tokens_total", completion_tokens, agent=self.agent, type="completion")
+        telemetry.record_span({
+            "trace_id": parent.trace_id if parent else None, "span_id": uuid.uuid4().hex[:16],
+            "parent_id": parent.span_id if parent else None,
+            "name": "llm", "status": status, "duration": duration,
+            "labels": {"agent": self.agent}, "values": values, "ts": time.time(),
+        })
\ No newline at end of file